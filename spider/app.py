@@ -1,14 +1,53 @@
 import logging
+import os
 import shutil
-import sys
-from typing import List, Optional
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional
 
+from spider.crawler.budgets import BudgetFrontier
+from spider.crawler.checkpoint import Checkpoint
+from spider.crawler.content_store import ContentStore
+from spider.crawler.content_type_filter import ContentTypeFilter
+from spider.crawler.coordinator import open_frontier
+from spider.crawler.frontier import Frontier
+from spider.crawler.metrics import Metrics, PrometheusFileWriter
+from spider.crawler.output_manifest import OutputManifest
+from spider.crawler.priority_frontier import PriorityFrontier
+from spider.crawler.profiler import Profiler
+from spider.crawler.scheduler import HostScheduler
+from spider.crawler.seen_set import create_seen_set, exact_seen_set
+from spider.crawler.url_filter import UrlFilter
+from spider.crawler.validator_store import ValidatorStore
+from spider.handlers.pdf_extraction_pool import PdfExtractionPool
+from spider.storage.archiving_storage import ArchivingStorage
+from spider.storage.metered_storage import MeteredStorage
+from spider.storage.queued_storage import QueuedStorage
+from spider.storage.sharded_storage import ShardedStorage
+from spider.storage.storage import DirectoryStorage
 from spider.utils import file_utils
-from spider.utils.download_utils import get_pages, pdf_content_type, zip_content_type
+from spider.utils.async_download_utils import get_pages_async
+from spider.utils.cassette_utils import Cassette
+from spider.utils.distributed_download_utils import get_pages_distributed
+from spider.utils.download_utils import bs4_html_parser, create_handlers, get_pages, lxml_html_parser, \
+    pdf_content_type, zip_content_type
 from spider.utils.logging_utils import configure_logging
-from spider.utils.zip_utils import zip_dir
+from spider.utils.pipeline_download_utils import get_pages_pipeline
+from spider.utils.session_utils import SessionManager
+from spider.utils.zip_utils import ZipArchiver, zip_dir
 
-sys.setrecursionlimit(100000)
+sync_engine = "sync"
+async_engine = "async"
+pipeline_engine = "pipeline"
+directory_storage = "directory"
+sharded_storage = "sharded"
+final_archive = "final"
+incremental_archive = "incremental"
+record_mode = "record"
+replay_mode = "replay"
+breadth_first_order = "breadth-first"
+best_first_order = "best-first"
 
 
 class App(object):
@@ -22,10 +61,103 @@ class App(object):
                  exclude_prefixes: List[str] = None,
                  exclude_contains: List[str] = None,
                  include_contains: List[str] = None,
-                 exclude_content_types: List[str] = None):
+                 exclude_content_types: List[str] = None,
+                 engine: str = sync_engine,
+                 concurrency: int = 64,
+                 pool_connections: int = 10,
+                 pool_maxsize: Optional[int] = None,
+                 frontier_memory_limit: int = 100000,
+                 checkpoint_file: Optional[str] = None,
+                 checkpoint_interval: float = 60.0,
+                 resume: bool = False,
+                 host_rate: Optional[float] = None,
+                 host_burst: int = 1,
+                 host_concurrency: Optional[int] = None,
+                 respect_robots: bool = False,
+                 seen_set: str = exact_seen_set,
+                 seen_set_capacity: int = 1 << 20,
+                 seen_set_error_rate: float = 0.001,
+                 max_sizes: Dict[str, int] = None,
+                 pdf_workers: int = 0,
+                 pdf_pages_per_task: int = 20,
+                 pdf_timeout: float = 600.0,
+                 pdf_max_pages: int = 0,
+                 persist_pdf: bool = True,
+                 zip_max_depth: int = 2,
+                 zip_max_member_size: Optional[int] = 100 * 1024 * 1024,
+                 zip_max_total_size: Optional[int] = 1024 * 1024 * 1024,
+                 zip_max_ratio: Optional[float] = 100.0,
+                 html_parser: str = bs4_html_parser,
+                 dedup_content: bool = False,
+                 validators_file: Optional[str] = None,
+                 recrawl: bool = False,
+                 storage: str = directory_storage,
+                 shard_size: int = 256 * 1024 * 1024,
+                 archive: str = final_archive,
+                 archive_workers: int = 4,
+                 archive_store_compressed: bool = True,
+                 metrics_file: Optional[str] = None,
+                 metrics_interval: float = 15.0,
+                 metrics_per_host: bool = True,
+                 cassette_dir: Optional[str] = None,
+                 cassette_mode: str = record_mode,
+                 profile_every: int = 0,
+                 profile_slower_than: Optional[float] = None,
+                 profile_stages: List[str] = None,
+                 profile_memory: bool = False,
+                 profile_dir: str = "logs/profiles",
+                 pipeline_workers: Dict[str, int] = None,
+                 pipeline_writers: int = 2,
+                 pipeline_queue_size: int = 100,
+                 frontier_url: Optional[str] = None,
+                 node: Optional[str] = None,
+                 node_index: int = 0,
+                 nodes: int = 1,
+                 lease_size: int = 100,
+                 lease_time: float = 300.0,
+                 crawl_order: str = breadth_first_order,
+                 score_depth_weight: float = 1.0,
+                 score_inlink_weight: float = 1.0,
+                 score_include_weight: float = 1.0,
+                 scorer: Callable[[str, int, int], float] = None,
+                 max_pages: Optional[int] = None,
+                 max_pages_per_host: Optional[int] = None,
+                 max_pages_per_depth: Dict[int, int] = None,
+                 exclude_by_extension: bool = False,
+                 exclude_by_probe: bool = False,
+                 probe_timeout: float = 10.0):
+        if engine not in (sync_engine, async_engine, pipeline_engine):
+            raise ValueError("Unknown engine: {}".format(engine))
+        if storage not in (directory_storage, sharded_storage):
+            raise ValueError("Unknown storage: {}".format(storage))
+        if archive not in (final_archive, incremental_archive):
+            raise ValueError("Unknown archive mode: {}".format(archive))
+        if cassette_mode not in (record_mode, replay_mode):
+            raise ValueError("Unknown cassette mode: {}".format(cassette_mode))
+        if cassette_mode == replay_mode and not (cassette_dir and os.path.isdir(cassette_dir)):
+            raise ValueError("Replay requires recorded cassette dir")
+        if html_parser not in (bs4_html_parser, lxml_html_parser):
+            raise ValueError("Unknown html parser: {}".format(html_parser))
+        if resume and not checkpoint_file:
+            raise ValueError("Resume requires checkpoint file")
+        if recrawl and not validators_file:
+            raise ValueError("Recrawl requires validators file")
+        if frontier_url and engine != sync_engine:
+            raise ValueError("Distributed crawl requires sync engine")
+        if frontier_url and checkpoint_file:
+            raise ValueError("Distributed crawl keeps its state in shared frontier, checkpoint is not supported")
+        if not 0 <= node_index < nodes:
+            raise ValueError("Node index has to be between 0 and {}".format(nodes - 1))
+        if crawl_order not in (breadth_first_order, best_first_order):
+            raise ValueError("Unknown crawl order: {}".format(crawl_order))
+        budgets = max_pages is not None or max_pages_per_host is not None or bool(max_pages_per_depth)
+        if frontier_url and (crawl_order == best_first_order or budgets):
+            raise ValueError("Distributed crawl supports breadth-first order without budgets only")
 
         self.__max_depth = max_depth
-        self.__setup(max_depth, output_dir)
+        self.__resume = resume and os.path.isfile(checkpoint_file)
+        self.__recrawl = recrawl and os.path.isfile(validators_file)
+        self.__setup(output_dir, checkpoint_file, self.__resume, validators_file, self.__recrawl, storage)
 
         self.__logger = logging.getLogger(__name__)
         self.__url = url
@@ -33,8 +165,58 @@ class App(object):
         self.__exclude_contains = exclude_contains if exclude_contains else []
         self.__exclude_content_types = exclude_content_types if exclude_content_types else []
         self.__include_contains = include_contains if include_contains else []
+        self.__crawl_order = crawl_order
+        if crawl_order == best_first_order:
+            self.__priority_frontier = PriorityFrontier(self.__include_contains, score_depth_weight,
+                                                        score_inlink_weight, score_include_weight, scorer,
+                                                        max_pages, max_pages_per_host, max_pages_per_depth)
+        else:
+            self.__priority_frontier = None
+        self.__max_pages = max_pages
+        self.__max_pages_per_host = max_pages_per_host
+        self.__max_pages_per_depth = max_pages_per_depth
+        self.__budgets = budgets
         self.__output_dir = output_dir
         self.__output_zip = output_zip
+        self.__engine = engine
+        self.__pipeline_workers = pipeline_workers
+        self.__pipeline_writers = pipeline_writers
+        self.__pipeline_queue_size = pipeline_queue_size
+        self.__frontier_url = frontier_url
+        self.__node = node if node else "{}-{}".format(socket.gethostname(), os.getpid())
+        self.__node_index = node_index
+        self.__nodes = nodes
+        self.__lease_size = lease_size
+        self.__lease_time = lease_time
+        self.__concurrency = concurrency
+        self.__frontier_memory_limit = frontier_memory_limit
+        self.__checkpoint_file = checkpoint_file
+        self.__checkpoint_interval = checkpoint_interval
+        self.__host_rate = host_rate
+        self.__host_burst = host_burst
+        self.__host_concurrency = host_concurrency
+        self.__respect_robots = respect_robots
+        self.__downloaded_urls = create_seen_set(seen_set, seen_set_capacity, seen_set_error_rate)
+        self.__seen_set = seen_set
+        # bodies are not limited unless limits are set
+        self.__max_sizes = max_sizes if max_sizes else {}
+        self.__pdf_workers = pdf_workers
+        self.__pdf_pages_per_task = pdf_pages_per_task
+        self.__pdf_timeout = pdf_timeout
+        self.__pdf_max_pages = pdf_max_pages
+        self.__persist_pdf = persist_pdf
+        self.__zip_limits = (zip_max_depth, zip_max_member_size, zip_max_total_size, zip_max_ratio)
+        self.__html_parser = html_parser
+        self.__dedup_content = dedup_content
+        self.__validators_file = validators_file
+        self.__storage = storage
+        self.__shard_size = shard_size
+        self.__archive = archive
+        self.__archive_workers = archive_workers
+        self.__archive_store_compressed = archive_store_compressed
+        self.__metrics = Metrics(per_host=metrics_per_host)
+        self.__metrics_file = metrics_file
+        self.__metrics_interval = metrics_interval
         if proxy_host:
             self.__proxies = {
                 'http': 'http://{}:{}@{}'.format(proxy_user, proxy_password, proxy_host),
@@ -43,28 +225,253 @@ class App(object):
         else:
             self.__proxies = None
 
+        # async and pipeline engines keep `concurrency` connections to the same host at the same time
+        if not pool_maxsize:
+            pool_maxsize = concurrency if engine in (async_engine, pipeline_engine) else 10
+        self.__cassette = Cassette(cassette_dir, shard_size) if cassette_dir else None
+        if profile_every > 0 or profile_slower_than is not None:
+            self.__profiler = Profiler(profile_dir, profile_stages, profile_every, profile_slower_than, profile_memory)
+        else:
+            self.__profiler = None
+        self.__session_manager = SessionManager(self.__proxies, pool_connections, pool_maxsize,
+                                                metrics=self.__metrics, cassette=self.__cassette,
+                                                replay=cassette_mode == replay_mode)
+        if exclude_by_extension or exclude_by_probe:
+            # links to excluded content types are dropped before they are downloaded
+            content_type_filter = ContentTypeFilter(self.__exclude_content_types, exclude_by_extension,
+                                                    exclude_by_probe, self.__session_manager.session,
+                                                    self.__proxies, probe_timeout)
+        else:
+            content_type_filter = None
+        # links to queued urls raise their score
+        self.__url_filter = UrlFilter(self.__include_contains, self.__exclude_prefixes, self.__exclude_contains,
+                                      self.__priority_frontier.link if self.__priority_frontier is not None else None,
+                                      content_type_filter)
+
+    @property
+    def metrics(self) -> Metrics:
+        """
+        :return: metrics of crawl, they can be read while crawl runs (e.g. from other thread)
+        """
+        return self.__metrics
+
+    def get_metrics(self) -> dict:
+        """
+        :return: current values of counters and histograms, see Metrics.snapshot
+        """
+        return self.__metrics.snapshot()
+
     def main(self):
-        get_pages({self.__url}, set(),
-                  self.__output_dir, 0,
-                  self.__exclude_prefixes,
-                  self.__exclude_contains,
-                  self.__exclude_content_types,
-                  self.__include_contains,
-                  self.__proxies,
-                  self.__max_depth)
-
-        # at the end we zip all downloaded files
-        zip_dir(self.__output_dir, self.__output_zip)
-
-    def __setup(self, max_depth: int, output_dir: str):
-        if sys.getrecursionlimit() < max_depth:
-            self.__logger.warning("Decrease max depth to: {}".format(sys.getrecursionlimit()))
-            self.__max_depth = sys.getrecursionlimit()
+        downloaded_urls = self.__downloaded_urls
+        with self.__open_metrics_writer(), self.__open_archiver() as archiver:
+            self.__crawl(downloaded_urls, archiver)
+            if archiver and os.path.isfile(self.__references_file()):
+                archiver.add_file(self.__references_file())
+            if archiver and os.path.isfile(self.__manifest_file()):
+                archiver.add_file(self.__manifest_file())
+
+        self.__url_filter.log_hits()
+
+        if self.__archive == final_archive:
+            # at the end we zip all downloaded files
+            zip_dir(self.__output_dir, self.__output_zip, self.__archive_workers, self.__archive_store_compressed)
+
+    def __crawl(self, downloaded_urls, archiver: Optional[ZipArchiver]):
+        # pdf pool and writer are closed last, so we wait for pdf files before output is zipped, storage is closed
+        # after them, because they still write into it
+        with self.__open_storage() as storage, self.__open_pdf_pool() as pdf_pool, \
+                ThreadPoolExecutor(1, "pdf-writer") as writer, \
+                self.__session_manager, self.__open_frontier() as frontier, \
+                self.__open_checkpoint() as checkpoint, self.__open_content_store() as content_store, \
+                self.__open_validators() as validators, OutputManifest(self.__manifest_file()) as manifest, \
+                self.__cassette or nullcontext(), \
+                self.__profiler or nullcontext():
+            storage = storage if storage else DirectoryStorage(self.__output_dir)
+            if archiver:
+                storage = ArchivingStorage(storage, archiver, self.__output_dir)
+                if self.__resume or self.__recrawl:
+                    storage.archive_existing()
+            storage = MeteredStorage(storage, self.__metrics)
+            if self.__engine == pipeline_engine:
+                # writes are the last stage of pipeline
+                storage = QueuedStorage(storage, self.__pipeline_writers, self.__pipeline_queue_size)
+            if self.__resume:
+                checkpoint.restore(frontier, downloaded_urls)
+            handlers = create_handlers(pdf_pool, self.__persist_pdf, writer, *self.__zip_limits,
+                                       html_parser=self.__html_parser, storage=storage, manifest=manifest)
+            if self.__crawl_order == best_first_order:
+                # small window, so url found later with higher score can still go before queued ones
+                scheduler = HostScheduler(self.__host_rate, self.__host_burst, self.__host_concurrency,
+                                          self.__respect_robots, self.__session_manager.session,
+                                          window=max(self.__concurrency, 1), depth_barrier=False)
+            else:
+                scheduler = HostScheduler(self.__host_rate, self.__host_burst, self.__host_concurrency,
+                                          self.__respect_robots, self.__session_manager.session,
+                                          window=max(self.__concurrency * 4, 1000))
+
+            if self.__frontier_url:
+                with open_frontier(self.__frontier_url, self.__nodes, self.__lease_time) as shared_frontier:
+                    get_pages_distributed(shared_frontier, self.__node, self.__node_index,
+                                          {self.__url}, downloaded_urls,
+                                          self.__output_dir,
+                                          self.__exclude_prefixes,
+                                          self.__exclude_contains,
+                                          self.__exclude_content_types,
+                                          self.__include_contains,
+                                          self.__proxies,
+                                          self.__max_depth,
+                                          self.__session_manager.session,
+                                          scheduler,
+                                          self.__url_filter,
+                                          self.__max_sizes,
+                                          handlers,
+                                          content_store,
+                                          validators,
+                                          self.__metrics,
+                                          self.__profiler,
+                                          manifest,
+                                          self.__lease_size)
+            elif self.__engine == async_engine:
+                get_pages_async({self.__url}, downloaded_urls,
+                                self.__output_dir, 0,
+                                self.__exclude_prefixes,
+                                self.__exclude_contains,
+                                self.__exclude_content_types,
+                                self.__include_contains,
+                                self.__proxies,
+                                self.__max_depth,
+                                self.__concurrency,
+                                self.__session_manager.session,
+                                frontier,
+                                checkpoint,
+                                scheduler,
+                                self.__url_filter,
+                                self.__max_sizes,
+                                handlers,
+                                content_store,
+                                validators,
+                                self.__metrics,
+                                self.__profiler,
+                                manifest)
+            elif self.__engine == pipeline_engine:
+                try:
+                    get_pages_pipeline({self.__url}, downloaded_urls,
+                                       self.__output_dir, 0,
+                                       self.__exclude_prefixes,
+                                       self.__exclude_contains,
+                                       self.__exclude_content_types,
+                                       self.__include_contains,
+                                       self.__proxies,
+                                       self.__max_depth,
+                                       self.__concurrency,
+                                       self.__session_manager.session,
+                                       frontier,
+                                       checkpoint,
+                                       scheduler,
+                                       self.__url_filter,
+                                       self.__max_sizes,
+                                       handlers,
+                                       content_store,
+                                       validators,
+                                       self.__metrics,
+                                       self.__profiler,
+                                       manifest,
+                                       self.__pipeline_workers,
+                                       self.__pipeline_queue_size)
+                finally:
+                    # queued records are written before pdf workers and storage are closed
+                    storage.close()
+            else:
+                get_pages({self.__url}, downloaded_urls,
+                          self.__output_dir, 0,
+                          self.__exclude_prefixes,
+                          self.__exclude_contains,
+                          self.__exclude_content_types,
+                          self.__include_contains,
+                          self.__proxies,
+                          self.__max_depth,
+                          self.__session_manager.session,
+                          frontier,
+                          checkpoint,
+                          scheduler,
+                          self.__url_filter,
+                          self.__max_sizes,
+                          handlers,
+                          content_store,
+                          validators,
+                          self.__metrics,
+                          self.__profiler,
+                          manifest)
+
+    def __open_frontier(self):
+        if self.__priority_frontier is not None:
+            return self.__priority_frontier
+        if self.__budgets:
+            return BudgetFrontier(self.__frontier_memory_limit, max_pages=self.__max_pages,
+                                  max_pages_per_host=self.__max_pages_per_host,
+                                  max_pages_per_depth=self.__max_pages_per_depth)
+        return Frontier(self.__frontier_memory_limit)
+
+    def __open_checkpoint(self):
+        if self.__checkpoint_file:
+            # compact seen sets are saved into checkpoint whole, exact set is saved incrementally as urls
+            seen = self.__downloaded_urls if self.__seen_set != exact_seen_set else None
+            return Checkpoint(self.__checkpoint_file, self.__checkpoint_interval, seen)
+        return nullcontext()
+
+    def __open_content_store(self):
+        if self.__dedup_content:
+            return ContentStore(self.__references_file())
+        return nullcontext()
+
+    def __manifest_file(self) -> str:
+        # url of every output name, existing manifest is kept on resume and recrawl
+        return "{}/manifest.tsv".format(self.__output_dir)
+
+    def __references_file(self) -> str:
+        return "{}/references.txt".format(self.__output_dir)
+
+    def __open_metrics_writer(self):
+        if self.__metrics_file:
+            return PrometheusFileWriter(self.__metrics, self.__metrics_file, self.__metrics_interval)
+        return nullcontext()
+
+    def __open_archiver(self):
+        if self.__archive == incremental_archive:
+            return ZipArchiver(self.__output_zip, self.__archive_workers, self.__archive_store_compressed)
+        return nullcontext()
+
+    def __open_validators(self):
+        if self.__validators_file:
+            return ValidatorStore(self.__validators_file)
+        return nullcontext()
+
+    def __open_storage(self):
+        if self.__storage == sharded_storage:
+            return ShardedStorage("{}/shards".format(self.__output_dir), self.__shard_size)
+        # handlers write files into output dir by default
+        return nullcontext()
+
+    def __open_pdf_pool(self):
+        if self.__pdf_workers > 0:
+            return PdfExtractionPool(self.__pdf_workers, self.__pdf_pages_per_task, self.__pdf_timeout,
+                                     self.__pdf_max_pages, self.__metrics)
+        return nullcontext()
 
+    def __setup(self, output_dir: str, checkpoint_file: Optional[str], resume: bool, validators_file: Optional[str],
+                recrawl: bool, storage: str):
         configure_logging()
 
-        # init output dir
-        shutil.rmtree(output_dir, ignore_errors=True)
+        # init output dir, on resume and recrawl we keep files downloaded before
+        if not resume and not recrawl:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        if not resume and checkpoint_file and os.path.isfile(checkpoint_file):
+            os.remove(checkpoint_file)
+        if not recrawl and validators_file and os.path.isfile(validators_file):
+            os.remove(validators_file)
+        if storage == sharded_storage:
+            file_utils.create_dir_if_not_exist(output_dir)
+            return
         # html
         file_utils.create_dir_if_not_exist("{}/html".format(output_dir))
         file_utils.create_dir_if_not_exist("{}/txt".format(output_dir))
@@ -73,7 +480,6 @@ class App(object):
         file_utils.create_dir_if_not_exist("{}/pdf2txt".format(output_dir))
         # zip
         file_utils.create_dir_if_not_exist("{}/zip".format(output_dir))
-        file_utils.create_dir_if_not_exist("{}/unzipped".format(output_dir))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,236 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import platform
+import queue
+import shutil
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from typing import List, Optional
+from urllib.parse import urlparse
+
+from spider.benchmark.site import SiteConfig, SiteServer
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, peak rss is not reported there
+    resource = None
+
+Scenario = namedtuple("Scenario", ["name", "site", "app_options"])
+Scenario.__doc__ = """
+Benchmark scenario: synthetic site and options of App which crawls it
+"""
+
+default_scenarios = [
+    Scenario("html", SiteConfig(pages=300, fan_out=6, depth=4), {}),
+    Scenario("html_async", SiteConfig(pages=300, fan_out=6, depth=4, latency=0.01, jitter=0.005),
+             {"engine": "async", "concurrency": 16}),
+    Scenario("mixed_pipeline", SiteConfig(pages=150, fan_out=5, depth=4, pdf_ratio=0.2, zip_ratio=0.1, latency=0.01),
+             {"engine": "pipeline", "concurrency": 16}),
+    Scenario("mixed", SiteConfig(pages=150, fan_out=5, depth=4, pdf_ratio=0.2, zip_ratio=0.1, error_rate=0.02), {}),
+    Scenario("lxml", SiteConfig(pages=300, fan_out=6, depth=4, page_size=32 * 1024), {"html_parser": "lxml"}),
+]
+
+# results where higher value is better, other compared results are better when lower
+higher_is_better = ("pages_per_second", "mb_per_second")
+compared_results = higher_is_better + ("peak_rss_mb",)
+# how often parent process checks that crawl process is still alive (in seconds)
+poll_interval = 1.0
+
+
+def crawl(url: str, app_options: dict, work_dir: str, results) -> None:
+    """
+    crawls synthetic site with App (runs in child process, so peak rss belongs to single crawl)
+    :param url: url of root page
+    :param app_options: options of App
+    :param work_dir: working directory of crawl (output, logs)
+    :param results: queue for results, exception of failed crawl is sent there too
+    :return: None
+    """
+    try:
+        # imported in child process, so parent process doesn't pay for it in peak rss
+        from spider.app import App
+
+        os.chdir(work_dir)
+        options = dict({"output_dir": "output", "output_zip": "output.zip",
+                        "include_contains": [urlparse(url).netloc]}, **app_options)
+        app = App(url=url, **options)
+        start = time.perf_counter()
+        app.main()
+        seconds = time.perf_counter() - start
+        results.put({"seconds": seconds, "metrics": app.get_metrics(), "peak_rss_mb": peak_rss_mb()})
+    except Exception as e:
+        try:
+            pickle.dumps(e)
+        except Exception:
+            # queue pickles in background thread, exception which can't be pickled would be lost there
+            e = RuntimeError(repr(e))
+        results.put(e)
+
+
+def wait_for_result(process, results) -> dict:
+    """
+    waits for result of crawl process
+    :param process: crawl process
+    :param results: queue for results
+    :return: result of crawl, exception of crawl is raised (RuntimeError if crawl process ended without result)
+    """
+    while True:
+        try:
+            result = results.get(timeout=poll_interval)
+            break
+        except queue.Empty:
+            if process.exitcode is None:
+                continue
+            try:
+                # result could be put into queue right before process ended
+                result = results.get(timeout=poll_interval)
+                break
+            except queue.Empty:
+                raise RuntimeError("Crawl process ended with exit code {} without result".format(process.exitcode))
+    process.join()
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    :return: peak resident memory of current process in MB, None if it is not known
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(scenario: Scenario, seconds: float, metrics: dict, peak_rss: Optional[float]) -> dict:
+    """
+    :param scenario: scenario
+    :param seconds: duration of crawl
+    :param metrics: metrics of crawl (App.get_metrics)
+    :param peak_rss: peak rss of crawl in MB
+    :return: results of single run
+    """
+    counters = metrics["counters"]
+    pages = sum(c["value"] for c in counters.get("spider_pages_total", []))
+    errors = sum(c["value"] for c in counters.get("spider_errors_total", []))
+    size = sum(c["value"] for c in counters.get("spider_bytes_total", []))
+    stages = {}
+    for histogram in metrics["histograms"].get("spider_stage_seconds", []):
+        stage = histogram["labels"]["stage"]
+        stages[stage] = stages.get(stage, 0.0) + histogram["sum"]
+    return {
+        "scenario": scenario.name,
+        "pages": pages,
+        "errors": errors,
+        "bytes": size,
+        "seconds": seconds,
+        "pages_per_second": pages / seconds if seconds else 0.0,
+        "mb_per_second": size / (1024 * 1024) / seconds if seconds else 0.0,
+        "peak_rss_mb": peak_rss,
+        "stages": stages,
+    }
+
+
+def run_scenario(scenario: Scenario, repeat: int = 1, work_dir: Optional[str] = None) -> dict:
+    """
+    runs scenario `repeat` times, every crawl runs in new process against the same site server
+    :param scenario: scenario
+    :param repeat: number of runs
+    :param work_dir: working directory of crawls, temporary directory by default
+    :return: results of run with median pages/s, all runs are in "runs"
+    """
+    context = multiprocessing.get_context("spawn")
+    runs = []
+    with SiteServer(scenario.site) as server:
+        for _ in range(max(repeat, 1)):
+            run_dir = tempfile.mkdtemp(prefix="spider-benchmark-", dir=work_dir)
+            try:
+                results = context.Queue()
+                process = context.Process(target=crawl, args=(server.url, scenario.app_options, run_dir, results))
+                process.start()
+                try:
+                    result = wait_for_result(process, results)
+                finally:
+                    if process.is_alive():
+                        process.terminate()
+                    process.join()
+                runs.append(summarize(scenario, result["seconds"], result["metrics"], result["peak_rss_mb"]))
+            finally:
+                shutil.rmtree(run_dir, ignore_errors=True)
+
+    runs.sort(key=lambda r: r["pages_per_second"])
+    median = dict(runs[len(runs) // 2])
+    median["runs"] = runs
+    return median
+
+
+def compare(results: List[dict], baseline: List[dict], tolerance: float = 0.1) -> List[str]:
+    """
+    compares results with baseline, scenarios missing in baseline are skipped
+    :param results: results of scenarios
+    :param baseline: results of scenarios from baseline
+    :param tolerance: allowed relative change, e.g. 0.1 means pages/s can be 10% lower
+    :return: description of every regression
+    """
+    baseline_by_name = {b["scenario"]: b for b in baseline}
+    regressions = []
+    for result in results:
+        base = baseline_by_name.get(result["scenario"])
+        if not base:
+            continue
+        for key in compared_results:
+            value, base_value = result.get(key), base.get(key)
+            if value is None or not base_value:
+                continue
+            if key in higher_is_better:
+                regression = value < base_value * (1 - tolerance)
+            else:
+                regression = value > base_value * (1 + tolerance)
+            if regression:
+                regressions.append("{}: {} is {:.3f}, baseline {:.3f}".format(result["scenario"], key, value,
+                                                                              base_value))
+    return regressions
+
+
+def main(args: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m spider.benchmark",
+                                     description="Crawl benchmark against local synthetic site")
+    parser.add_argument("--scenario", action="append", choices=[s.name for s in default_scenarios],
+                        help="scenario to run (all by default), can be repeated")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of every scenario, median is reported")
+    parser.add_argument("--output", help="results are written into this json file")
+    parser.add_argument("--baseline", help="json file with results of previous run, regressions fail the benchmark")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative change against baseline")
+    options = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.WARNING)
+    scenarios = [s for s in default_scenarios if not options.scenario or s.name in options.scenario]
+    results = []
+    for scenario in scenarios:
+        result = run_scenario(scenario, options.repeat)
+        results.append(result)
+        print("{scenario}: {pages} pages in {seconds:.2f}s, {pages_per_second:.1f} pages/s, "
+              "{mb_per_second:.2f} MB/s, peak rss {peak_rss_mb} MB".format(**result))
+
+    if options.output:
+        with open(options.output, "w", encoding="UTF-8") as f:
+            json.dump({"python": platform.python_version(), "results": results}, f, indent=2)
+
+    if options.baseline:
+        with open(options.baseline, "r", encoding="UTF-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, options.tolerance)
+        for regression in regressions:
+            print("REGRESSION {}".format(regression))
+        if regressions:
+            return 1
+    return 0
@@ -0,0 +1,248 @@
+import logging
+import random
+import threading
+import time
+import zipfile
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import List, Optional, Tuple
+
+SiteConfig = namedtuple("SiteConfig", ["pages", "fan_out", "depth", "page_size", "latency", "jitter", "error_rate",
+                                       "pdf_ratio", "zip_ratio", "seed"],
+                        defaults=[100, 5, 3, 8 * 1024, 0.0, 0.0, 0.0, 0.0, 0.0, 0])
+SiteConfig.__doc__ = """
+Synthetic site: html pages form a tree (every page has `fan_out` children up to `depth`), every page links back to
+root and its parent. Page links pdf file with probability `pdf_ratio` and zip file with probability `zip_ratio`.
+Every response waits `latency` +- `jitter` seconds, `error_rate` of urls answer with 500. Site is the same for the same
+`seed`
+"""
+
+html_path = "/page/{}.html"
+pdf_path = "/doc/{}.pdf"
+zip_path = "/archive/{}.zip"
+
+__words = ("lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do", "eiusmod",
+           "tempor", "incididunt", "ut", "labore", "et", "dolore", "magna", "aliqua", "crawler", "spider", "page")
+
+
+def make_text(rng: random.Random, size: int) -> str:
+    """
+    :param rng: random generator
+    :param size: approximate size in characters
+    :return: random words
+    """
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(__words)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+def make_pdf(text: str) -> bytes:
+    """
+    builds the smallest valid pdf with one page with text
+    :param text: text of page (ascii)
+    :return: pdf file
+    """
+    escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    stream = "BT /F1 12 Tf 72 712 Td ({}) Tj ET".format(escaped).encode("ascii", "replace")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length " + str(len(stream)).encode("ascii") + b" >>\nstream\n" + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf = BytesIO()
+    pdf.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(pdf.tell())
+        pdf.write("{} 0 obj\n".format(number).encode("ascii") + obj + b"\nendobj\n")
+    xref = pdf.tell()
+    pdf.write("xref\n0 {}\n0000000000 65535 f \n".format(len(objects) + 1).encode("ascii"))
+    for offset in offsets:
+        pdf.write("{:010d} 00000 n \n".format(offset).encode("ascii"))
+    pdf.write("trailer\n<< /Size {} /Root 1 0 R >>\nstartxref\n{}\n%%EOF\n".format(len(objects) + 1, xref)
+              .encode("ascii"))
+    return pdf.getvalue()
+
+
+class SyntheticSite(object):
+
+    def __init__(self, config: SiteConfig):
+        """
+        Generates pages of synthetic site on demand, the same path has always the same content
+        :param config: site config
+        """
+        super(SyntheticSite, self).__init__()
+        self.config = config
+        # pages of complete tree up to depth, but not more than `pages`
+        tree_size = sum(config.fan_out ** d for d in range(config.depth + 1))
+        self.size = max(min(config.pages, tree_size), 1)
+
+    def children(self, page: int) -> List[int]:
+        """
+        :param page: page number
+        :return: numbers of child pages
+        """
+        first = page * self.config.fan_out + 1
+        return [child for child in range(first, first + self.config.fan_out) if child < self.size]
+
+    def documents(self, page: int) -> Tuple[bool, bool]:
+        """
+        :param page: page number
+        :return: whether page links pdf file and zip file
+        """
+        rng = self.__rng("documents", page)
+        return rng.random() < self.config.pdf_ratio, rng.random() < self.config.zip_ratio
+
+    def is_error(self, path: str) -> bool:
+        """
+        :param path: path of url
+        :return: True if url answers with error
+        """
+        return self.config.error_rate > 0 and self.__rng("error", path).random() < self.config.error_rate
+
+    def delay(self) -> float:
+        """
+        :return: response delay in seconds
+        """
+        return max(self.config.latency + random.uniform(-self.config.jitter, self.config.jitter), 0.0)
+
+    def html(self, page: int) -> bytes:
+        """
+        :param page: page number
+        :return: html page
+        """
+        links = [html_path.format(child) for child in self.children(page)]
+        links += [html_path.format(0), html_path.format(max(page - 1, 0) // max(self.config.fan_out, 1))]
+        has_pdf, has_zip = self.documents(page)
+        if has_pdf:
+            links.append(pdf_path.format(page))
+        if has_zip:
+            links.append(zip_path.format(page))
+
+        rng = self.__rng("html", page)
+        anchors = "".join("<li><a href='{}'>{}</a></li>".format(link, make_text(rng, 16)) for link in links)
+        body = "".join("<p>{}</p>".format(make_text(rng, 200))
+                       for _ in range(max(self.config.page_size // 200, 1)))
+        return ("<html><head><title>Page {}</title><style>p {{margin: 0}}</style></head>"
+                "<body><h1>Page {}</h1><ul>{}</ul>{}</body></html>".format(page, page, anchors, body)).encode("UTF-8")
+
+    def pdf(self, page: int) -> bytes:
+        """
+        :param page: page number
+        :return: pdf file
+        """
+        return make_pdf(make_text(self.__rng("pdf", page), 200))
+
+    def zip(self, page: int) -> bytes:
+        """
+        :param page: page number
+        :return: zip file with html and txt member
+        """
+        rng = self.__rng("zip", page)
+        content = BytesIO()
+        with zipfile.ZipFile(content, "w", zipfile.ZIP_DEFLATED) as f:
+            f.writestr("index.html", "<html><body><p>{}</p></body></html>".format(make_text(rng, 500)))
+            f.writestr("notes.txt", make_text(rng, 500))
+        return content.getvalue()
+
+    def response(self, path: str) -> Tuple[int, Optional[str], bytes]:
+        """
+        :param path: path of url
+        :return: status, content type and body
+        """
+        if self.is_error(path):
+            return 500, "text/plain", b"synthetic error"
+        for template, content_type, build in ((html_path, "text/html; charset=utf-8", self.html),
+                                              (pdf_path, "application/pdf", self.pdf),
+                                              (zip_path, "application/zip", self.zip)):
+            prefix, suffix = template.split("{}")
+            if path.startswith(prefix) and path.endswith(suffix):
+                number = path[len(prefix):-len(suffix)]
+                if number.isdigit() and int(number) < self.size:
+                    return 200, content_type, build(int(number))
+        return 404, "text/plain", b"not found"
+
+    def __rng(self, kind: str, key) -> random.Random:
+        return random.Random("{}:{}:{}".format(self.config.seed, kind, key))
+
+
+class SiteServer(object):
+
+    def __init__(self, config: SiteConfig, host: str = "127.0.0.1", port: int = 0):
+        """
+        Local http server of synthetic site, every request is handled in its own thread
+        :param config: site config
+        :param host: host to listen on
+        :param port: port to listen on, any free port by default
+        """
+        super(SiteServer, self).__init__()
+        self._logger = logging.getLogger(__name__)
+        self.site = SyntheticSite(config)
+        self.requests = 0
+        self.__lock = threading.Lock()
+        self.__server = ThreadingHTTPServer((host, port), self.__handler())
+        self.__server.daemon_threads = True
+        self.__thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """
+        :return: url of root page
+        """
+        host, port = self.__server.server_address[:2]
+        return "http://{}:{}{}".format(host, port, html_path.format(0))
+
+    def start(self) -> None:
+        self.__thread = threading.Thread(target=self.__server.serve_forever, name="site-server", daemon=True)
+        self.__thread.start()
+
+    def close(self) -> None:
+        self.__server.shutdown()
+        self.__server.server_close()
+        if self.__thread:
+            self.__thread.join()
+            self.__thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __count(self) -> None:
+        with self.__lock:
+            self.requests += 1
+
+    def __handler(self):
+        site = self.site
+        count = self.__count
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            # noinspection PyPep8Naming
+            def do_GET(self):
+                count()
+                status, content_type, body = site.response(self.path.split("?")[0].split("#")[0])
+                delay = site.delay()
+                if delay:
+                    time.sleep(delay)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
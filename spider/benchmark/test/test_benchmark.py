@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import zipfile
+from io import BytesIO
+from unittest import TestCase
+from urllib.request import urlopen
+from urllib.error import HTTPError
+
+from spider.benchmark.runner import Scenario, compare, run_scenario, wait_for_result
+from spider.benchmark.site import SiteConfig, SiteServer, SyntheticSite, html_path, pdf_path, zip_path
+
+
+class TestSyntheticSite(TestCase):
+
+    def test_site_is_reproducible(self):
+        config = SiteConfig(pages=50, fan_out=3, depth=3, pdf_ratio=0.5, zip_ratio=0.5, error_rate=0.1, seed=7)
+        first, second = SyntheticSite(config), SyntheticSite(config)
+        for page in range(first.size):
+            path = html_path.format(page)
+            self.assertEqual(first.response(path), second.response(path))
+
+    def test_tree(self):
+        site = SyntheticSite(SiteConfig(pages=1000, fan_out=3, depth=2))
+        self.assertEqual(13, site.size)
+        self.assertEqual([1, 2, 3], site.children(0))
+        self.assertEqual([10, 11, 12], site.children(3))
+        self.assertEqual([], site.children(4))
+
+    def test_responses(self):
+        site = SyntheticSite(SiteConfig(pages=10, pdf_ratio=1.0, zip_ratio=1.0))
+        status, content_type, body = site.response(html_path.format(0))
+        self.assertEqual((200, "text/html; charset=utf-8"), (status, content_type))
+        self.assertIn(pdf_path.format(0).encode(), body)
+        self.assertIn(zip_path.format(0).encode(), body)
+
+        status, content_type, body = site.response(pdf_path.format(0))
+        self.assertEqual((200, "application/pdf"), (status, content_type))
+        self.assertTrue(body.startswith(b"%PDF"))
+
+        status, content_type, body = site.response(zip_path.format(0))
+        self.assertEqual((200, "application/zip"), (status, content_type))
+        with zipfile.ZipFile(BytesIO(body)) as f:
+            self.assertEqual(["index.html", "notes.txt"], f.namelist())
+
+        self.assertEqual(404, site.response(html_path.format(10))[0])
+        self.assertEqual(404, site.response("/other")[0])
+
+    def test_error_rate(self):
+        site = SyntheticSite(SiteConfig(pages=1000, fan_out=10, error_rate=0.2))
+        errors = sum(site.is_error(html_path.format(page)) for page in range(site.size))
+        self.assertTrue(100 < errors < 300, errors)
+
+    def test_server(self):
+        with SiteServer(SiteConfig(pages=3, error_rate=0.0)) as server:
+            with urlopen(server.url) as response:
+                self.assertEqual(200, response.status)
+                self.assertIn(b"Page 0", response.read())
+            with self.assertRaises(HTTPError):
+                urlopen(server.url.replace(html_path.format(0), html_path.format(3)))
+            self.assertEqual(2, server.requests)
+
+
+class TestRunner(TestCase):
+
+    def test_compare(self):
+        baseline = [{"scenario": "html", "pages_per_second": 100.0, "mb_per_second": 1.0, "peak_rss_mb": 50.0}]
+        result = {"scenario": "html", "pages_per_second": 95.0, "mb_per_second": 1.0, "peak_rss_mb": 52.0}
+        self.assertEqual([], compare([result], baseline, 0.1))
+
+        result = {"scenario": "html", "pages_per_second": 80.0, "mb_per_second": 1.0, "peak_rss_mb": 60.0}
+        regressions = compare([result], baseline, 0.1)
+        self.assertEqual(2, len(regressions))
+        self.assertTrue(regressions[0].startswith("html: pages_per_second"))
+        self.assertTrue(regressions[1].startswith("html: peak_rss_mb"))
+
+        self.assertEqual([], compare([dict(result, scenario="other")], baseline, 0.1))
+
+    def test_run_scenario(self):
+        work_dir = tempfile.mkdtemp()
+        try:
+            scenario = Scenario("tiny", SiteConfig(pages=7, fan_out=2, depth=2, page_size=1024), {})
+            result = run_scenario(scenario, repeat=1, work_dir=work_dir)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        self.assertEqual("tiny", result["scenario"])
+        self.assertEqual(7, result["pages"])
+        self.assertGreater(result["bytes"], 7 * 1024)
+        self.assertGreater(result["pages_per_second"], 0)
+        self.assertIn("download", result["stages"])
+        self.assertEqual(1, len(result["runs"]))
+
+    def test_failed_crawl(self):
+        work_dir = tempfile.mkdtemp()
+        try:
+            scenario = Scenario("bogus", SiteConfig(pages=7, fan_out=2, depth=2), {"engine": "bogus"})
+            with self.assertRaisesRegex(ValueError, "Unknown engine: bogus"):
+                run_scenario(scenario, repeat=1, work_dir=work_dir)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def test_crawl_process_ended_without_result(self):
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        process = context.Process(target=os._exit, args=(3,))
+        process.start()
+        with self.assertRaisesRegex(RuntimeError, "exit code 3"):
+            wait_for_result(process, results)
+        process.join()
@@ -0,0 +1,140 @@
+import logging
+import threading
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from spider.crawler.frontier import Frontier
+from spider.crawler.scheduler import HostScheduler
+
+
+class PageBudgets(object):
+
+    def __init__(self, max_pages: Optional[int] = None, max_pages_per_host: Optional[int] = None,
+                 max_pages_per_depth: Dict[int, int] = None):
+        """
+        Counts urls taken from frontier and tells which urls are over budget. Not thread safe, frontier holds its lock
+        :param max_pages: max number of urls taken from frontier, unlimited if not defined
+        :param max_pages_per_host: max number of urls of single host taken from frontier, unlimited if not defined
+        :param max_pages_per_depth: max number of urls taken from frontier by depth, unlimited for missing depth
+        """
+        super(PageBudgets, self).__init__()
+        self._ex_url_logger = logging.getLogger("spider.excluded.urls")
+        self.__max_pages = max_pages
+        self.__max_pages_per_host = max_pages_per_host
+        self.__max_pages_per_depth = max_pages_per_depth or {}
+        self.__pages = 0
+        self.__host_pages = Counter()
+        self.__depth_pages = Counter()
+
+    def allowed(self, url: str, depth: int) -> bool:
+        """
+        checks host and depth budget of url, dropped url is logged
+        :param url: url
+        :param depth: depth of url
+        :return: False when host or depth of url used its budget
+        """
+        depth_budget = self.__max_pages_per_depth.get(depth)
+        if self.__max_pages_per_host is not None and \
+                self.__host_pages[HostScheduler.host(url)] >= self.__max_pages_per_host:
+            self._ex_url_logger.info("Host budget is used, url is dropped: {}".format(url))
+            return False
+        if depth_budget is not None and self.__depth_pages[depth] >= depth_budget:
+            self._ex_url_logger.info("Budget of depth {} is used, url is dropped: {}".format(depth, url))
+            return False
+        return True
+
+    def take(self, url: str, depth: int) -> None:
+        """
+        counts url taken from frontier into budgets
+        :param url: url
+        :param depth: depth of url
+        :return: None
+        """
+        self.__pages += 1
+        self.__host_pages[HostScheduler.host(url)] += 1
+        self.__depth_pages[depth] += 1
+
+    @property
+    def exhausted(self) -> bool:
+        """
+        :return: True when global budget is used
+        """
+        return self.__max_pages is not None and self.__pages >= self.__max_pages
+
+    @property
+    def max_pages(self) -> Optional[int]:
+        return self.__max_pages
+
+    @property
+    def pages(self) -> int:
+        """
+        :return: number of urls taken from frontier
+        """
+        return self.__pages
+
+
+class BudgetFrontier(Frontier):
+
+    def __init__(self, memory_limit: int = 100000, spill_dir: Optional[str] = None, max_pages: Optional[int] = None,
+                 max_pages_per_host: Optional[int] = None, max_pages_per_depth: Dict[int, int] = None):
+        """
+        Frontier with budgets of PriorityFrontier: url of host (or depth) which used its budget is dropped, when
+        global budget is used, frontier is empty. Urls spill into sqlite file like in Frontier
+        :param memory_limit: max number of urls kept in memory
+        :param spill_dir: directory for spill file, system temp dir by default
+        :param max_pages: max number of urls taken from frontier, unlimited if not defined
+        :param max_pages_per_host: max number of urls of single host taken from frontier, unlimited if not defined
+        :param max_pages_per_depth: max number of urls taken from frontier by depth, unlimited for missing depth
+        """
+        super(BudgetFrontier, self).__init__(memory_limit, spill_dir)
+        self.__budgets = PageBudgets(max_pages, max_pages_per_host, max_pages_per_depth)
+        self.__exhausted = False
+        self.__lock = threading.RLock()
+
+    def push(self, url: str, depth: int) -> None:
+        with self.__lock:
+            if not self.__exhausted:
+                super(BudgetFrontier, self).push(url, depth)
+
+    def pop(self) -> Tuple[str, int]:
+        """
+        removes first url from queue, url counts into budgets
+        :return: url and its depth
+        """
+        with self.__lock:
+            self.__settle()
+            url, depth = super(BudgetFrontier, self).pop()
+            self.__budgets.take(url, depth)
+            return url, depth
+
+    def peek(self) -> Tuple[str, int]:
+        with self.__lock:
+            self.__settle()
+            return super(BudgetFrontier, self).peek()
+
+    @property
+    def pages(self) -> int:
+        """
+        :return: number of urls taken from frontier
+        """
+        return self.__budgets.pages
+
+    def __len__(self):
+        with self.__lock:
+            self.__settle()
+            return super(BudgetFrontier, self).__len__()
+
+    def __settle(self) -> None:
+        """
+        removes urls over budget from head of queue
+        """
+        if self.__budgets.exhausted and not self.__exhausted:
+            self.__exhausted = True
+            self._logger.info("Page budget {} is used, {} queued urls are dropped".format(
+                self.__budgets.max_pages, super(BudgetFrontier, self).__len__()))
+            self.close()
+        while super(BudgetFrontier, self).__len__() > 0:
+            url, depth = super(BudgetFrontier, self).peek()
+            if self.__budgets.allowed(url, depth):
+                return
+            super(BudgetFrontier, self).pop()
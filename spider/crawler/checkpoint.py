@@ -0,0 +1,130 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from spider.crawler.frontier import Frontier
+from spider.crawler.seen_set import SeenSet
+
+queued_status = "queued"
+done_status = "done"
+
+
+class Checkpoint(object):
+
+    def __init__(self, checkpoint_file: str, interval: float = 60.0, seen: Optional[SeenSet] = None):
+        """
+        Durable crawl state kept in sqlite file. Every url pushed into frontier is stored with its depth and status
+        (queued or done), so after restart we know which urls are seen and which are still waiting for download.
+        Changes are buffered and flushed every `interval` seconds in single transaction. With `seen` set, the set
+        is serialized into checkpoint with every flush and done urls are removed, so only urls waiting for download
+        are kept as strings
+        :param checkpoint_file: path to sqlite file
+        :param interval: how often (in seconds) buffered changes are flushed
+        :param seen: if defined, seen set of crawl saved into checkpoint instead of done urls
+        """
+        super(Checkpoint, self).__init__()
+        self._logger = logging.getLogger(__name__)
+        self.__checkpoint_file = checkpoint_file
+        self.__interval = interval
+        self.__seen = seen
+        self.__last_flush = time.monotonic()
+        self.__queued = []
+        self.__done = []
+        self.__lock = threading.Lock()
+
+        checkpoint_dir = os.path.dirname(checkpoint_file)
+        if checkpoint_dir:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+        self.__db = sqlite3.connect(checkpoint_file, check_same_thread=False)
+        self.__db.execute("CREATE TABLE IF NOT EXISTS urls "
+                          "(seq INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT UNIQUE, depth INTEGER, status TEXT)")
+        self.__db.execute("CREATE TABLE IF NOT EXISTS seen (id INTEGER PRIMARY KEY, kind TEXT, data BLOB)")
+        self.__db.commit()
+
+    def queued(self, url: str, depth: int) -> None:
+        """
+        marks url as pushed into frontier
+        :param url: url
+        :param depth: depth of url
+        :return: None
+        """
+        with self.__lock:
+            self.__queued.append((url, depth, queued_status))
+
+    def done(self, url: str) -> None:
+        """
+        marks url as downloaded
+        :param url: url
+        :return: None
+        """
+        with self.__lock:
+            self.__done.append((done_status, url))
+
+    def flush_if_due(self) -> None:
+        """
+        flushes buffered changes if interval passed since last flush
+        :return: None
+        """
+        if time.monotonic() - self.__last_flush >= self.__interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        writes buffered changes into checkpoint file
+        :return: None
+        """
+        with self.__lock:
+            queued, self.__queued = self.__queued, []
+            done, self.__done = self.__done, []
+            with self.__db:
+                self.__db.executemany("INSERT OR IGNORE INTO urls (url, depth, status) VALUES (?, ?, ?)", queued)
+                if self.__seen is not None:
+                    # every url pushed into frontier was added into seen set before, so done urls are in it
+                    self.__db.executemany("DELETE FROM urls WHERE url = ?", [(url,) for _, url in done])
+                    self.__db.execute("INSERT OR REPLACE INTO seen (id, kind, data) VALUES (0, ?, ?)",
+                                      (type(self.__seen).__name__, self.__seen.to_bytes()))
+                else:
+                    self.__db.executemany("UPDATE urls SET status = ? WHERE url = ?", done)
+            self.__last_flush = time.monotonic()
+        self._logger.info("Checkpoint saved, {} queued and {} done urls".format(len(queued), len(done)))
+
+    def restore(self, frontier: Frontier, downloaded_urls: set) -> int:
+        """
+        restores crawl state from checkpoint file
+        :param frontier: frontier for urls which are not downloaded yet
+        :param downloaded_urls: set for all seen urls, seen set saved into checkpoint is loaded into it
+        :return: number of urls pushed into frontier
+        """
+        row = self.__db.execute("SELECT kind, data FROM seen WHERE id = 0").fetchone()
+        if row:
+            kind, data = row
+            if type(downloaded_urls).__name__ != kind:
+                raise ValueError("Checkpoint has seen set {}, it can't be restored into {}".format(
+                    kind, type(downloaded_urls).__name__))
+            downloaded_urls.load(data)
+        restored = 0
+        for url, depth, status in self.__db.execute("SELECT url, depth, status FROM urls ORDER BY seq"):
+            downloaded_urls.add(url)
+            if status == queued_status:
+                frontier.push(url, depth)
+                restored += 1
+        self._logger.info("Restored {} seen urls, {} urls waiting for download".format(len(downloaded_urls),
+                                                                                     restored))
+        return restored
+
+    def close(self) -> None:
+        """
+        flushes buffered changes and closes checkpoint file
+        :return: None
+        """
+        self.flush()
+        self.__db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
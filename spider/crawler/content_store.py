@@ -0,0 +1,96 @@
+import logging
+import threading
+from typing import List, Optional, Tuple
+from urllib.parse import urlparse
+
+
+class ContentStore(object):
+
+    def __init__(self, references_file: Optional[str] = None):
+        """
+        Content-addressed index of downloaded bodies. Body is identified by its sha256 hash, so the same pdf or zip
+        file linked under different urls is extracted once. Later urls only get reference to output of the first
+        one. If server sends Content-MD5 or ETag, we can find duplicate before body is downloaded. Content is added
+        when its output is saved, so failed extraction is not referenced
+        :param references_file: if defined, references (url, output name, output name of the same content) are
+                                appended into this file as tab separated lines
+        """
+        super(ContentStore, self).__init__()
+        self._logger = logging.getLogger(__name__)
+        self.__references_file = references_file
+        self.__references = open(references_file, "a", encoding="UTF-8") if references_file else None
+        self.__outputs = {}
+        self.__lock = threading.Lock()
+
+    def find(self, url: str, headers, digest: Optional[str] = None) -> Optional[str]:
+        """
+        looks for content by response headers and hash of body
+        :param url: url
+        :param headers: response headers
+        :param digest: if defined, sha256 hex digest of body
+        :return: output name of the same content downloaded before, None if content is unknown
+        """
+        keys = self.__header_keys(url, headers)
+        if digest:
+            keys.append(("sha256", digest))
+        with self.__lock:
+            for key in keys:
+                if key in self.__outputs:
+                    return self.__outputs[key]
+        return None
+
+    def add(self, url: str, output_name: str, digest: str, headers=None) -> Optional[str]:
+        """
+        registers content whose output is saved
+        :param url: url
+        :param output_name: output name of url
+        :param digest: sha256 hex digest of body
+        :param headers: response headers, their Content-MD5 and ETag are registered too
+        :return: output name of the same content saved before (content isn't registered then, e.g. the same body
+                 was downloaded by other thread meanwhile), None if content is registered
+        """
+        key = ("sha256", digest)
+        with self.__lock:
+            original = self.__outputs.get(key)
+            if original:
+                return original
+            self.__outputs[key] = output_name
+            for header_key in self.__header_keys(url, headers) if headers else []:
+                self.__outputs.setdefault(header_key, output_name)
+        return None
+
+    def reference(self, url: str, output_name: str, original: str) -> None:
+        """
+        records that url has the same content as output `original`
+        :param url: url
+        :param output_name: output name of url
+        :param original: output name of the same content
+        :return: None
+        """
+        self._logger.info("Url {} has the same content as {}, skip it".format(url, original))
+        if self.__references:
+            with self.__lock:
+                self.__references.write("{}\t{}\t{}\n".format(url, output_name, original))
+
+    def close(self) -> None:
+        if self.__references:
+            self.__references.close()
+            self.__references = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @staticmethod
+    def __header_keys(url: str, headers) -> List[Tuple[str, ...]]:
+        keys = []
+        content_md5 = headers.get("content-md5")
+        if content_md5:
+            keys.append(("content-md5", content_md5.strip()))
+        etag = headers.get("etag")
+        # weak etags don't promise byte-identical content, etags are unique only within one host
+        if etag and not etag.startswith("W/"):
+            keys.append(("etag", urlparse(url).netloc, etag.strip()))
+        return keys
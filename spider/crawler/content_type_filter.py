@@ -0,0 +1,96 @@
+import logging
+import mimetypes
+import re
+import threading
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlparse
+
+import requests
+
+__digits = re.compile(r"\d+")
+
+
+def url_pattern(url: str) -> str:
+    """
+    pattern of url for cached probes: numbers are replaced by N, query values are dropped. File name is kept (also
+    without extension), pages and downloads often share directory (e.g. /docs/overview and /docs/report-download)
+    :param url: url
+    :return: pattern, e.g. some.url/files/N/report?id for http://some.url/files/2020/report?id=5
+    """
+    parsed = urlparse(url)
+    query = "&".join(sorted({key for key, _ in parse_qsl(parsed.query, keep_blank_values=True)}))
+    return "{}{}{}".format(parsed.netloc, __digits.sub("N", parsed.path), "?" + query if query else "")
+
+
+def guess_content_type(url: str) -> Optional[str]:
+    """
+    :param url: url
+    :return: content type by extension of url path, None if extension is not known
+    """
+    path = urlparse(url).path
+    return mimetypes.guess_type(path)[0] if "." in path.rpartition("/")[2] else None
+
+
+class ContentTypeFilter(object):
+
+    def __init__(self, exclude_content_types: List[str], by_extension: bool = True, probe: bool = False,
+                 session: requests.Session = None, proxies: dict = None, timeout: float = 10.0):
+        """
+        Guesses content type of link before it is downloaded, so links to excluded content types are not downloaded
+        at all. Content type is guessed by extension of url path; url without known extension can be probed by HEAD
+        request. Result of probe is cached for pattern of url (see url_pattern), so only the first url of pattern is
+        probed. Url whose content type is not known is allowed
+        :param exclude_content_types: excluded content types
+        :param by_extension: if True, content type is guessed by extension
+        :param probe: if True, url without known extension is probed by HEAD request
+        :param session: http session for probes
+        :param proxies: proxies for probes
+        :param timeout: timeout of probe in seconds
+        """
+        super(ContentTypeFilter, self).__init__()
+        self._logger = logging.getLogger(__name__)
+        self.__exclude_content_types = exclude_content_types
+        self.__by_extension = by_extension
+        self.__probe = probe
+        self.__session = session
+        self.__proxies = proxies
+        self.__timeout = timeout
+        # content type by url pattern, None when probe failed
+        self.__probes: Dict[str, Optional[str]] = {}
+        self.__lock = threading.Lock()
+
+    def excluded(self, url: str) -> Optional[str]:
+        """
+        :param url: url
+        :return: excluded content type of url, None if url is allowed
+        """
+        if not self.__exclude_content_types:
+            return None
+        content_type = guess_content_type(url) if self.__by_extension else None
+        if content_type is None and self.__probe:
+            content_type = self.probe(url)
+        if content_type is None:
+            return None
+        return next((excluded for excluded in self.__exclude_content_types if excluded in content_type), None)
+
+    def probe(self, url: str) -> Optional[str]:
+        """
+        :param url: url
+        :return: content type from HEAD response of url (or of other url of the same pattern), None if it failed
+        """
+        pattern = url_pattern(url)
+        with self.__lock:
+            if pattern in self.__probes:
+                return self.__probes[pattern]
+        http = self.__session if self.__session else requests
+        content_type = None
+        try:
+            response = http.head(url, proxies=self.__proxies, allow_redirects=True, timeout=self.__timeout)
+            if response.ok:
+                content_type = response.headers.get("content-type")
+        except requests.RequestException as e:
+            self._logger.warning("Probe of {} failed: {}".format(url, e))
+        self._logger.info("Content type of '{}' is {}".format(pattern, content_type))
+        with self.__lock:
+            self.__probes[pattern] = content_type
+        return content_type
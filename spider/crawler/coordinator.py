@@ -0,0 +1,220 @@
+import argparse
+import json
+import logging
+import socket
+import socketserver
+import threading
+from typing import Iterable, List, Tuple, Union
+from urllib.parse import urlparse
+
+from spider.crawler.shared_frontier import SharedFrontier
+
+default_coordinator_port = 8765
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """
+    serves requests of single node, one json object per line
+    """
+
+    def handle(self) -> None:
+        frontier: SharedFrontier = self.server.frontier
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            # noinspection PyBroadException
+            try:
+                request = json.loads(line.decode("UTF-8"))
+                op = request.get("op")
+                if op == "add":
+                    response = {"added": frontier.add(request["urls"], request["depth"])}
+                elif op == "lease":
+                    response = {"urls": frontier.lease(request["node"], request["shard"], request["count"])}
+                elif op == "complete":
+                    frontier.complete(request["node"], request["url"], request["links"], request["depth"])
+                    response = {}
+                elif op == "release":
+                    response = {"released": frontier.release(request["node"])}
+                elif op == "pending":
+                    response = {"pending": frontier.pending()}
+                elif op == "shards":
+                    response = {"shards": frontier.shards}
+                else:
+                    response = {"error": "Unknown operation: {}".format(op)}
+            except Exception as e:
+                response = {"error": "{}: {}".format(type(e).__name__, e)}
+            self.wfile.write(json.dumps(response).encode("UTF-8") + b"\n")
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class CoordinatorServer(object):
+
+    def __init__(self, frontier: SharedFrontier, host: str = "0.0.0.0", port: int = default_coordinator_port):
+        """
+        Small TCP server which shares frontier with crawl nodes (RemoteFrontier), so nodes don't need shared volume.
+        Protocol is one json object per line, request has operation ("op") and arguments of SharedFrontier method
+        :param frontier: frontier of crawl
+        :param host: listening address
+        :param port: listening port (0 means any free port)
+        """
+        super(CoordinatorServer, self).__init__()
+        self._logger = logging.getLogger(__name__)
+        self.__server = _Server((host, port), _Handler)
+        self.__server.frontier = frontier
+        self.__thread = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.__server.server_address[:2]
+
+    def start(self) -> None:
+        """
+        serves nodes in background thread
+        :return: None
+        """
+        self.__thread = threading.Thread(target=self.serve_forever, name="coordinator", daemon=True)
+        self.__thread.start()
+
+    def serve_forever(self) -> None:
+        self._logger.info("Coordinator listens on {}:{}".format(*self.address))
+        self.__server.serve_forever()
+
+    def close(self) -> None:
+        if self.__thread:
+            self.__server.shutdown()
+            self.__thread.join()
+            self.__thread = None
+        self.__server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class RemoteFrontier(object):
+
+    def __init__(self, host: str, port: int = default_coordinator_port, timeout: float = 60.0, retries: int = 3):
+        """
+        Client of CoordinatorServer with the same methods as SharedFrontier
+        :param host: address of coordinator
+        :param port: port of coordinator
+        :param timeout: socket timeout in seconds
+        :param retries: how many times request is sent again over new connection when connection fails
+        """
+        super(RemoteFrontier, self).__init__()
+        self._logger = logging.getLogger(__name__)
+        self.__address = (host, port)
+        self.__timeout = timeout
+        self.__retries = retries
+        self.__lock = threading.Lock()
+        self.__socket = None
+        self.__file = None
+        self.shards = self.__call(op="shards")["shards"]
+
+    def add(self, urls: Iterable[str], depth: int) -> int:
+        return self.__call(op="add", urls=list(urls), depth=depth)["added"]
+
+    def lease(self, node: str, shard: int, count: int) -> List[Tuple[str, int]]:
+        return [(url, depth) for url, depth in self.__call(op="lease", node=node, shard=shard, count=count)["urls"]]
+
+    def complete(self, node: str, url: str, links: Iterable[str], depth: int) -> None:
+        self.__call(op="complete", node=node, url=url, links=list(links), depth=depth)
+
+    def release(self, node: str) -> int:
+        return self.__call(op="release", node=node)["released"]
+
+    def pending(self) -> int:
+        return self.__call(op="pending")["pending"]
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__disconnect()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __call(self, **request) -> dict:
+        line = json.dumps(request).encode("UTF-8") + b"\n"
+        with self.__lock:
+            for attempt in range(self.__retries + 1):
+                try:
+                    if self.__socket is None:
+                        self.__socket = socket.create_connection(self.__address, timeout=self.__timeout)
+                        self.__file = self.__socket.makefile("rb")
+                    self.__socket.sendall(line)
+                    response = self.__file.readline()
+                    if not response:
+                        raise ConnectionError("Coordinator closed connection")
+                    break
+                except OSError as e:
+                    self.__disconnect()
+                    if attempt == self.__retries:
+                        raise
+                    self._logger.warning("Coordinator {}:{} failed ({}), retrying".format(*self.__address, e))
+        response = json.loads(response.decode("UTF-8"))
+        if "error" in response:
+            raise RuntimeError("Coordinator failed: {}".format(response["error"]))
+        return response
+
+    def __disconnect(self) -> None:
+        if self.__file:
+            self.__file.close()
+            self.__file = None
+        if self.__socket:
+            self.__socket.close()
+            self.__socket = None
+
+
+def open_frontier(frontier_url: str, shards: int = 1,
+                  lease_time: float = 300.0) -> Union[SharedFrontier, RemoteFrontier]:
+    """
+    :param frontier_url: tcp://host:port for coordinator, sqlite:///path (sqlite:////path for absolute path, or just
+                         path) for sqlite file
+    :param shards: number of shards of new sqlite frontier
+    :param lease_time: lease time of sqlite frontier (coordinator has its own)
+    :return: shared frontier
+    """
+    parsed = urlparse(frontier_url)
+    if parsed.scheme == "tcp":
+        if not parsed.hostname:
+            raise ValueError("Coordinator address is missing in '{}'".format(frontier_url))
+        return RemoteFrontier(parsed.hostname, parsed.port or default_coordinator_port)
+    if parsed.scheme == "sqlite":
+        return SharedFrontier(frontier_url[len("sqlite:///"):], shards, lease_time)
+    if parsed.scheme and len(parsed.scheme) > 1:
+        # one letter scheme is windows drive
+        raise ValueError("Unknown frontier: {}".format(frontier_url))
+    return SharedFrontier(frontier_url, shards, lease_time)
+
+
+def main(args: List[str] = None) -> None:
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Coordinator of distributed crawl")
+    parser.add_argument("--frontier-file", default="logs/frontier.sqlite", help="sqlite file of shared frontier")
+    parser.add_argument("--host", default="0.0.0.0", help="listening address")
+    parser.add_argument("--port", type=int, default=default_coordinator_port, help="listening port")
+    parser.add_argument("--shards", type=int, default=1, help="number of shards (crawl nodes)")
+    parser.add_argument("--lease-time", type=float, default=300.0, help="lease time in seconds")
+    parser.add_argument("--seed", action="append", default=[], help="url added into frontier at depth 0")
+    options = parser.parse_args(args)
+    with SharedFrontier(options.frontier_file, options.shards, options.lease_time) as frontier:
+        frontier.add(options.seed, 0)
+        with CoordinatorServer(frontier, options.host, options.port) as server:
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import deque
+from typing import Iterator, Optional, Tuple
+
+
+class Frontier(object):
+
+    def __init__(self, memory_limit: int = 100000, spill_dir: Optional[str] = None):
+        """
+        FIFO queue of urls waiting for download together with their depth. Up to `memory_limit` urls are kept in
+        memory, when frontier grows over this limit, next urls are spilled into sqlite file
+        :param memory_limit: max number of urls kept in memory
+        :param spill_dir: directory for spill file, system temp dir by default
+        """
+        super(Frontier, self).__init__()
+        self._logger = logging.getLogger(__name__)
+        self.__memory = deque()
+        self.__memory_limit = max(memory_limit, 1)
+        self.__spill_dir = spill_dir
+        self.__spill_file = None
+        self.__db = None
+        self.__spilled = 0
+        self.__lock = threading.RLock()
+
+    def push(self, url: str, depth: int) -> None:
+        """
+        adds url at the end of queue
+        :param url: url to download
+        :param depth: depth of url
+        :return: None
+        """
+        with self.__lock:
+            # once something is spilled, all next urls have to go to disk too, otherwise we break FIFO order
+            if self.__spilled == 0 and len(self.__memory) < self.__memory_limit:
+                self.__memory.append((url, depth))
+            else:
+                self.__spill(url, depth)
+
+    def pop(self) -> Tuple[str, int]:
+        """
+        removes first url from queue
+        :return: url and its depth
+        """
+        with self.__lock:
+            if not self.__memory and self.__spilled > 0:
+                self.__load()
+            return self.__memory.popleft()
+
+    def peek(self) -> Tuple[str, int]:
+        """
+        returns first url from queue without removing it
+        :return: url and its depth
+        """
+        with self.__lock:
+            if not self.__memory and self.__spilled > 0:
+                self.__load()
+            return self.__memory[0]
+
+    def items(self) -> Iterator[Tuple[str, int]]:
+        """
+        iterates over queued urls in FIFO order, queue is not modified. Frontier can't be changed during iteration
+        :return: urls with depth
+        """
+        for item in list(self.__memory):
+            yield item
+        if self.__spilled > 0:
+            for row in self.__db.execute("SELECT url, depth FROM frontier ORDER BY id"):
+                yield row[0], row[1]
+
+    def close(self) -> None:
+        """
+        closes and removes spill file
+        :return: None
+        """
+        with self.__lock:
+            if self.__db:
+                self.__db.close()
+                self.__db = None
+                os.remove(self.__spill_file)
+            self.__memory.clear()
+            self.__spilled = 0
+
+    def __len__(self):
+        return len(self.__memory) + self.__spilled
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __spill(self, url: str, depth: int) -> None:
+        if not self.__db:
+            fd, self.__spill_file = tempfile.mkstemp(prefix="spider-frontier-", suffix=".db", dir=self.__spill_dir)
+            os.close(fd)
+            self.__db = sqlite3.connect(self.__spill_file, check_same_thread=False)
+            # spill file is temporary, we don't need durability here
+            self.__db.execute("PRAGMA journal_mode=OFF")
+            self.__db.execute("PRAGMA synchronous=OFF")
+            self.__db.execute("CREATE TABLE frontier (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT, depth INTEGER)")
+            self._logger.info("Frontier exceeds {} urls, spill into {}".format(self.__memory_limit,
+                                                                              self.__spill_file))
+        self.__db.execute("INSERT INTO frontier (url, depth) VALUES (?, ?)", (url, depth))
+        self.__spilled += 1
+
+    def __load(self) -> None:
+        rows = self.__db.execute("SELECT id, url, depth FROM frontier ORDER BY id LIMIT ?",
+                                 (self.__memory_limit,)).fetchall()
+        self.__db.execute("DELETE FROM frontier WHERE id <= ?", (rows[-1][0],))
+        self.__db.commit()
+        self.__memory.extend((row[1], row[2]) for row in rows)
+        self.__spilled -= len(rows)
@@ -0,0 +1,236 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# stages of single download
+connect_stage = "connect"
+ttfb_stage = "ttfb"
+download_stage = "download"
+html_parse_stage = "html_parse"
+link_filter_stage = "link_filter"
+pdf_extraction_stage = "pdf_extraction"
+# pdf extraction in worker processes, from submit until text is saved
+pdf_worker_stage = "pdf_worker"
+zip_extraction_stage = "zip_extraction"
+write_stage = "write"
+
+pages_metric = "spider_pages_total"
+bytes_metric = "spider_bytes_total"
+errors_metric = "spider_errors_total"
+stage_metric = "spider_stage_seconds"
+
+default_buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram(object):
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        """
+        Cumulative histogram of observed values as Prometheus has it
+        :param buckets: upper bounds of buckets, sorted
+        """
+        super(Histogram, self).__init__()
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """
+        :return: upper bound (+Inf for last one) and number of values lower or equal to it
+        """
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((repr(float(bound)), total))
+        result.append(("+Inf", self.count))
+        return result
+
+
+class Metrics(object):
+
+    def __init__(self, buckets: Tuple[float, ...] = default_buckets, per_host: bool = True):
+        """
+        Counters and latency histograms of crawl. Every value has labels, e.g. stage, content type and host, so we can
+        see whether crawl is network-bound, parse-bound or disk-bound
+        :param buckets: upper bounds (in seconds) of histogram buckets
+        :param per_host: if False, host label is dropped (crawl over many hosts has many label values)
+        """
+        super(Metrics, self).__init__()
+        self.__buckets = tuple(sorted(buckets))
+        self.__per_host = per_host
+        self.__counters: Dict[str, Dict[Labels, float]] = {}
+        self.__histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.__lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """
+        increments counter
+        :param name: counter name
+        :param value: increment
+        :param labels: labels of counter
+        :return: None
+        """
+        key = self.__labels(labels)
+        with self.__lock:
+            counter = self.__counters.setdefault(name, {})
+            counter[key] = counter.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """
+        adds value into histogram
+        :param name: histogram name
+        :param value: value, e.g. duration in seconds
+        :param labels: labels of histogram
+        :return: None
+        """
+        key = self.__labels(labels)
+        with self.__lock:
+            histograms = self.__histograms.setdefault(name, {})
+            histogram = histograms.get(key)
+            if histogram is None:
+                histogram = histograms[key] = Histogram(self.__buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def time(self, stage: str, **labels):
+        """
+        measures duration of block as stage of download (also when block fails)
+        :param stage: stage name
+        :param labels: other labels, e.g. content_type and host
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(stage_metric, time.monotonic() - start, stage=stage, **labels)
+
+    def snapshot(self) -> dict:
+        """
+        :return: current values, e.g. {"counters": {name: [{"labels": {...}, "value": 1}]},
+                 "histograms": {name: [{"labels": {...}, "count": 1, "sum": 0.5, "buckets": {"0.5": 1, ...}}]}}
+        """
+        with self.__lock:
+            counters = {name: [{"labels": dict(key), "value": value} for key, value in sorted(values.items())]
+                        for name, values in self.__counters.items()}
+            histograms = {name: [{"labels": dict(key), "count": h.count, "sum": h.sum,
+                                  "buckets": dict(h.cumulative())} for key, h in sorted(values.items())]
+                          for name, values in self.__histograms.items()}
+        return {"counters": counters, "histograms": histograms}
+
+    def to_prometheus(self) -> str:
+        """
+        :return: metrics in Prometheus text exposition format
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name, values in sorted(snapshot["counters"].items()):
+            lines.append("# TYPE {} counter".format(name))
+            for value in values:
+                lines.append("{}{} {}".format(name, self.__format_labels(value["labels"]), value["value"]))
+        for name, values in sorted(snapshot["histograms"].items()):
+            lines.append("# TYPE {} histogram".format(name))
+            for value in values:
+                for bound, count in value["buckets"].items():
+                    labels = self.__format_labels(dict(value["labels"], le=bound))
+                    lines.append("{}_bucket{} {}".format(name, labels, count))
+                labels = self.__format_labels(value["labels"])
+                lines.append("{}_sum{} {}".format(name, labels, value["sum"]))
+                lines.append("{}_count{} {}".format(name, labels, value["count"]))
+        return "\n".join(lines) + "\n"
+
+    def __labels(self, labels: dict) -> Labels:
+        if not self.__per_host:
+            labels.pop("host", None)
+        return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+    @staticmethod
+    def __format_labels(labels: dict) -> str:
+        if not labels:
+            return ""
+        return "{" + ",".join('{}="{}"'.format(key, value.replace("\\", "\\\\").replace("\"", "\\\"")
+                                                .replace("\n", "\\n")) for key, value in labels.items()) + "}"
+
+
+class NullMetrics(Metrics):
+    """
+    Metrics which are not collected, used when crawl has no metrics
+    """
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        pass
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        pass
+
+
+class PrometheusFileWriter(object):
+
+    def __init__(self, metrics: Metrics, metrics_file: str, interval: float = 15.0):
+        """
+        Writes metrics into Prometheus text file periodically (e.g. for textfile collector of node exporter).
+        File is replaced atomically, so reader never sees partial file
+        :param metrics: metrics
+        :param metrics_file: output file
+        :param interval: how often (in seconds) file is written
+        """
+        super(PrometheusFileWriter, self).__init__()
+        self._err_logger = logging.getLogger("spider.errors")
+        self.__metrics = metrics
+        self.__metrics_file = metrics_file
+        self.__interval = interval
+        self.__stopped = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.__thread = threading.Thread(target=self.__run, name="metrics-writer", daemon=True)
+        self.__thread.start()
+
+    def write(self) -> None:
+        """
+        writes current metrics
+        :return: None
+        """
+        tmp_file = "{}.tmp".format(self.__metrics_file)
+        with open(tmp_file, "w", encoding="UTF-8") as f:
+            f.write(self.__metrics.to_prometheus())
+        os.replace(tmp_file, self.__metrics_file)
+
+    def close(self) -> None:
+        """
+        stops writing and writes final metrics
+        :return: None
+        """
+        self.__stopped.set()
+        if self.__thread:
+            self.__thread.join()
+            self.__thread = None
+        self.write()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __run(self) -> None:
+        while not self.__stopped.wait(self.__interval):
+            try:
+                self.write()
+            except OSError as e:
+                self._err_logger.error("Can't write metrics into {}: {}".format(self.__metrics_file, e))
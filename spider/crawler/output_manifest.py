@@ -0,0 +1,103 @@
+import hashlib
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+
+def url_hash(url: str) -> str:
+    """
+    :param url: url
+    :return: stable hash of url (128 bits of sha256 as hex)
+    """
+    return hashlib.sha256(url.encode("UTF-8")).hexdigest()[:32]
+
+
+def sharded_name(name_hash: str) -> str:
+    """
+    :param name_hash: hash of url
+    :return: output name in two-level shard directories, e.g. 3f/a1/3fa1...
+    """
+    return "{}/{}/{}".format(name_hash[:2], name_hash[2:4], name_hash)
+
+
+class OutputManifest(object):
+
+    def __init__(self, manifest_file: Optional[str] = None):
+        """
+        Index of urls with output. Output name is hash of url, manifest maps hash back to url: every url is appended
+        into `manifest_file` as tab separated line (hash, url, content type). Existing manifest is loaded at start, so
+        existence and content type of output are answered from memory instead of stat calls. Only hashes (and shared
+        content type strings) are kept in memory. Lines are flushed as they are written, so they survive killed crawl.
+        Paths of zip members (see ZipHandler) are added the same way as urls, without content type
+        :param manifest_file: if defined, manifest is loaded from and appended into this file
+        """
+        super(OutputManifest, self).__init__()
+        self._logger = logging.getLogger(__name__)
+        # content type by hash, None if it is not known
+        self.__hashes: Dict[str, Optional[str]] = {}
+        self.__lock = threading.Lock()
+        if manifest_file and os.path.isfile(manifest_file):
+            content_types = {}
+            with open(manifest_file, "r", encoding="UTF-8") as f:
+                for line in f:
+                    name_hash, _, url = line.rstrip("\n").partition("\t")
+                    url, _, content_type = url.partition("\t")
+                    if url:
+                        # the same string object for every url of content type
+                        self.__hashes[name_hash] = content_types.setdefault(content_type, content_type) or None
+            self._logger.info("Manifest {} has {} urls".format(manifest_file, len(self.__hashes)))
+        self.__manifest_file = manifest_file
+        # opened at first added url, so crawl without output leaves no manifest
+        self.__manifest = None
+
+    def add(self, url: str, content_type: Optional[str] = None) -> None:
+        """
+        records that url has output
+        :param url: url
+        :param content_type: content type of output
+        :return: None
+        """
+        name_hash = url_hash(url)
+        with self.__lock:
+            if name_hash in self.__hashes:
+                return
+            self.__hashes[name_hash] = content_type
+            if self.__manifest_file:
+                if not self.__manifest:
+                    # line buffered, every line is flushed
+                    self.__manifest = open(self.__manifest_file, "a", encoding="UTF-8", buffering=1)
+                if content_type:
+                    self.__manifest.write("{}\t{}\t{}\n".format(name_hash, url, content_type))
+                else:
+                    self.__manifest.write("{}\t{}\n".format(name_hash, url))
+
+    def contains(self, url: str) -> bool:
+        """
+        :param url: url
+        :return: True if url has output
+        """
+        name_hash = url_hash(url)
+        with self.__lock:
+            return name_hash in self.__hashes
+
+    def content_type(self, url: str) -> Optional[str]:
+        """
+        :param url: url
+        :return: content type of output of url, None if url has no output or its content type is not known
+        """
+        name_hash = url_hash(url)
+        with self.__lock:
+            return self.__hashes.get(name_hash)
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__manifest:
+                self.__manifest.close()
+                self.__manifest = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,170 @@
+import heapq
+import logging
+import math
+import threading
+from itertools import count
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from spider.crawler.budgets import PageBudgets
+
+
+class PriorityFrontier(object):
+
+    def __init__(self, include_contains: List[str] = None, depth_weight: float = 1.0, inlink_weight: float = 1.0,
+                 include_weight: float = 1.0, scorer: Callable[[str, int, int], float] = None,
+                 max_pages: Optional[int] = None, max_pages_per_host: Optional[int] = None,
+                 max_pages_per_depth: Dict[int, int] = None):
+        """
+        Best-first counterpart of Frontier: url with the highest score goes first, urls with the same score in FIFO
+        order. Score is
+        `include_weight * matched include phrases - depth_weight * depth + inlink_weight * ln(1 + inlinks)
+        + scorer(url, depth, inlinks)`. Inlinks are links found so far to url which is still queued, see link (e.g.
+        UrlFilter on_seen). Budgets limit urls taken from frontier: url of host (or depth) which used its budget is
+        dropped, when global budget is used, frontier is empty. Urls are kept in memory
+        :param include_contains: phrases from include_contains, every phrase in url adds `include_weight`
+        :param depth_weight: penalty for every level of depth
+        :param inlink_weight: weight of ln(1 + number of links to url)
+        :param include_weight: weight of matched include phrase
+        :param scorer: custom score added to score, called with url, depth and number of inlinks
+        :param max_pages: max number of urls taken from frontier, unlimited if not defined
+        :param max_pages_per_host: max number of urls of single host taken from frontier, unlimited if not defined
+        :param max_pages_per_depth: max number of urls taken from frontier by depth, unlimited for missing depth
+        """
+        super(PriorityFrontier, self).__init__()
+        self._logger = logging.getLogger(__name__)
+        self.__include_contains = sorted(set(include_contains or []))
+        self.__depth_weight = depth_weight
+        self.__inlink_weight = inlink_weight
+        self.__include_weight = include_weight
+        self.__scorer = scorer
+        self.__budgets = PageBudgets(max_pages, max_pages_per_host, max_pages_per_depth)
+        # entries (-score, seq, url), entry is stale when score of url was changed meanwhile
+        self.__heap: List[Tuple[float, int, str]] = []
+        # queued urls: url -> [depth, inlinks, score]
+        self.__queued: Dict[str, list] = {}
+        self.__seq = count()
+        self.__exhausted = False
+        self.__lock = threading.RLock()
+
+    def push(self, url: str, depth: int) -> None:
+        """
+        adds url into queue, it has one inlink (link it was found by)
+        :param url: url to download
+        :param depth: depth of url
+        :return: None
+        """
+        with self.__lock:
+            if self.__exhausted or url in self.__queued:
+                return
+            score = self.score(url, depth, 1)
+            self.__queued[url] = [depth, 1, score]
+            heapq.heappush(self.__heap, (-score, next(self.__seq), url))
+
+    def link(self, url: str) -> None:
+        """
+        counts another link to url, score of queued url is raised
+        :param url: url
+        :return: None
+        """
+        with self.__lock:
+            item = self.__queued.get(url)
+            if item is None:
+                return
+            item[1] += 1
+            score = self.score(url, item[0], item[1])
+            if score != item[2]:
+                item[2] = score
+                heapq.heappush(self.__heap, (-score, next(self.__seq), url))
+
+    def pop(self) -> Tuple[str, int]:
+        """
+        removes url with the highest score from queue, url counts into budgets
+        :return: url and its depth
+        """
+        with self.__lock:
+            self.__settle()
+            _, _, url = heapq.heappop(self.__heap)
+            depth = self.__queued.pop(url)[0]
+            self.__budgets.take(url, depth)
+            return url, depth
+
+    def peek(self) -> Tuple[str, int]:
+        """
+        returns url with the highest score without removing it
+        :return: url and its depth
+        """
+        with self.__lock:
+            self.__settle()
+            url = self.__heap[0][2]
+            return url, self.__queued[url][0]
+
+    def items(self) -> Iterator[Tuple[str, int]]:
+        """
+        iterates over queued urls from the highest score, queue is not modified
+        :return: urls with depth
+        """
+        with self.__lock:
+            entries = sorted(entry for entry in self.__heap if self.__current(entry))
+            return iter([(url, self.__queued[url][0]) for _, _, url in entries])
+
+    def score(self, url: str, depth: int, inlinks: int) -> float:
+        """
+        :param url: url
+        :param depth: depth of url
+        :param inlinks: number of links to url
+        :return: score of url, higher goes first
+        """
+        score = -self.__depth_weight * depth + self.__inlink_weight * math.log1p(inlinks)
+        if self.__include_weight:
+            score += self.__include_weight * sum(1 for phrase in self.__include_contains if phrase in url)
+        if self.__scorer:
+            score += self.__scorer(url, depth, inlinks)
+        return score
+
+    @property
+    def pages(self) -> int:
+        """
+        :return: number of urls taken from frontier
+        """
+        return self.__budgets.pages
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__heap = []
+            self.__queued.clear()
+
+    def __len__(self):
+        with self.__lock:
+            self.__settle()
+            return len(self.__queued)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __current(self, entry: Tuple[float, int, str]) -> bool:
+        item = self.__queued.get(entry[2])
+        return item is not None and item[2] == -entry[0]
+
+    def __settle(self) -> None:
+        """
+        removes stale entries and urls over budget from top of heap
+        """
+        if self.__budgets.exhausted and not self.__exhausted:
+            self.__exhausted = True
+            self._logger.info("Page budget {} is used, {} queued urls are dropped".format(self.__budgets.max_pages,
+                                                                                         len(self.__queued)))
+            self.__heap = []
+            self.__queued.clear()
+        while self.__heap:
+            entry = self.__heap[0]
+            if not self.__current(entry):
+                heapq.heappop(self.__heap)
+                continue
+            url = entry[2]
+            if self.__budgets.allowed(url, self.__queued[url][0]):
+                return
+            heapq.heappop(self.__heap)
+            del self.__queued[url]
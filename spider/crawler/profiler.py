@@ -0,0 +1,198 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from spider.crawler.metrics import download_stage, html_parse_stage, link_filter_stage, pdf_extraction_stage, \
+    ttfb_stage, zip_extraction_stage
+
+# stages of get_page which can be profiled
+profiled_stages = (ttfb_stage, download_stage, html_parse_stage, link_filter_stage, pdf_extraction_stage,
+                   zip_extraction_stage)
+
+
+class PageProfile(object):
+
+    def __init__(self, url: str, stages: Tuple[str, ...], profile: Optional[cProfile.Profile] = None,
+                 memory: bool = False, finished: Callable[["PageProfile"], None] = None):
+        """
+        Profile of single page, only selected stages are profiled. Page without cProfile is not profiled at all
+        :param url: url of page
+        :param stages: profiled stages
+        :param profile: cProfile profile enabled during stages
+        :param memory: if True, allocations of every stage are compared by tracemalloc snapshots
+        :param finished: called when page is finished (once, even if page is finished more times)
+        """
+        super(PageProfile, self).__init__()
+        self.url = url
+        self.profile = profile
+        self.stage_seconds: Dict[str, float] = {}
+        self.memory_stats: List[Tuple[str, List[tracemalloc.StatisticDiff]]] = []
+        self.seconds = 0.0
+        self.__stages = stages
+        self.__memory = memory
+        self.__finished = finished
+        self.__start = time.monotonic()
+
+    @contextmanager
+    def stage(self, stage: str):
+        """
+        profiles block as stage of page if stage is selected
+        :param stage: stage name
+        """
+        if self.profile is None or stage not in self.__stages:
+            yield
+            return
+        before = tracemalloc.take_snapshot() if self.__memory else None
+        start = time.monotonic()
+        self.profile.enable()
+        try:
+            yield
+        finally:
+            self.profile.disable()
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + time.monotonic() - start
+            if before is not None:
+                self.memory_stats.append((stage, tracemalloc.take_snapshot().compare_to(before, "lineno")))
+
+    def finish(self) -> None:
+        """
+        ends page, profile is saved if page is sampled. Every page has to be finished, even page which is dropped
+        before it is processed, otherwise sampled page keeps other pages from being profiled
+        :return: None
+        """
+        finished, self.__finished = self.__finished, None
+        if finished:
+            self.seconds = time.monotonic() - self.__start
+            finished(self)
+
+
+class Profiler(object):
+
+    def __init__(self, profile_dir: str = "logs/profiles", stages: List[str] = None, every: int = 0,
+                 slower_than: Optional[float] = None, memory: bool = False, memory_frames: int = 10,
+                 top: int = 30):
+        """
+        Samples pages of crawl and profiles selected stages of their download with cProfile (and tracemalloc).
+        Page is sampled if it is every `every`-th page or if it takes more than `slower_than` milliseconds; with
+        `slower_than` every page is profiled and profile is kept only for slow pages. Profile is saved into
+        `profile_dir` as pstats file (.prof) and text report (.txt) with url, time of stages, top functions and top
+        allocations. Only one page is profiled at a time (single sample), pages downloaded at the same time are
+        skipped; with async and pipeline engines many pages are downloaded at the same time, so `every` and
+        `slower_than` find only part of pages they would find in sync crawl
+        :param profile_dir: output dir of profiles
+        :param stages: profiled stages (see profiled_stages), all of them by default
+        :param every: every n-th page is profiled (0 means never)
+        :param slower_than: pages slower than this (in milliseconds) are profiled
+        :param memory: if True, tracemalloc snapshots are compared around every stage (it is slow)
+        :param memory_frames: number of frames kept by tracemalloc for every allocation
+        :param top: number of functions and allocations in text report
+        """
+        super(Profiler, self).__init__()
+        self._logger = logging.getLogger(__name__)
+        unknown = set(stages or []) - set(profiled_stages)
+        if unknown:
+            raise ValueError("Unknown profiled stages: {}".format(", ".join(sorted(unknown))))
+        self.__profile_dir = profile_dir
+        self.__stages = tuple(stages) if stages else profiled_stages
+        self.__every = every
+        self.__slower_than = slower_than
+        self.__memory = memory
+        self.__memory_frames = memory_frames
+        self.__top = top
+        self.__pages = 0
+        self.__saved = 0
+        self.__lock = threading.Lock()
+        # cProfile can't profile more threads at the same time (since python 3.12)
+        self.__active = threading.Lock()
+        self.__started_tracemalloc = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.__every > 0 or self.__slower_than is not None
+
+    def page(self, url: str) -> PageProfile:
+        """
+        starts page, page is profiled if it is sampled and no other page is profiled now. Sample is held until
+        page is finished
+        :param url: url of page
+        :return: profile of page
+        """
+        with self.__lock:
+            self.__pages += 1
+            sampled = self.__every > 0 and self.__pages % self.__every == 0
+        if not (sampled or self.__slower_than is not None) or not self.__active.acquire(blocking=False):
+            return PageProfile(url, self.__stages)
+        if self.__memory and not tracemalloc.is_tracing():
+            tracemalloc.start(self.__memory_frames)
+            self.__started_tracemalloc = True
+        return PageProfile(url, self.__stages, cProfile.Profile(), self.__memory,
+                           lambda profile: self.__finish(profile, sampled))
+
+    def close(self) -> None:
+        if self.__started_tracemalloc:
+            tracemalloc.stop()
+            self.__started_tracemalloc = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __finish(self, profile: PageProfile, sampled: bool) -> None:
+        try:
+            # page which failed before first profiled stage has nothing to save
+            if profile.stage_seconds and (sampled or profile.seconds * 1000 >= self.__slower_than):
+                self.__save(profile)
+        finally:
+            self.__active.release()
+
+    def __save(self, profile: PageProfile) -> None:
+        with self.__lock:
+            self.__saved += 1
+            number = self.__saved
+        os.makedirs(self.__profile_dir, exist_ok=True)
+        name = "{}/{:06d}-{}".format(self.__profile_dir, number, re.sub(r"[^\w.-]+", "_", profile.url)[:100])
+        try:
+            profile.profile.dump_stats("{}.prof".format(name))
+            with open("{}.txt".format(name), "w", encoding="UTF-8") as f:
+                f.write(self.report(profile))
+            self._logger.info("Profile of '{}' ({:.0f} ms) saved into {}.prof".format(profile.url,
+                                                                                    profile.seconds * 1000, name))
+        except OSError as e:
+            self._logger.warning("Can't save profile of '{}': {}".format(profile.url, e))
+
+    def report(self, profile: PageProfile) -> str:
+        """
+        :param profile: profile of page
+        :return: text report with url, time of stages, top functions and top allocations
+        """
+        report = io.StringIO()
+        report.write("url: {}\n".format(profile.url))
+        report.write("page: {:.1f} ms\n".format(profile.seconds * 1000))
+        for stage, seconds in profile.stage_seconds.items():
+            report.write("{}: {:.1f} ms\n".format(stage, seconds * 1000))
+        report.write("\n")
+        pstats.Stats(profile.profile, stream=report).sort_stats("cumulative").print_stats(self.__top)
+        for stage, stats in profile.memory_stats:
+            report.write("allocations of {}:\n".format(stage))
+            for stat in stats[:self.__top]:
+                report.write("{}\n".format(stat))
+            report.write("\n")
+        return report.getvalue()
+
+
+class NullProfiler(Profiler):
+    """
+    Profiler which doesn't profile any page, used when crawl is not profiled
+    """
+
+    def page(self, url: str) -> PageProfile:
+        return PageProfile(url, ())
@@ -0,0 +1,274 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+import requests
+
+from spider.crawler.frontier import Frontier
+
+
+class TokenBucket(object):
+
+    def __init__(self, rate: Optional[float], burst: int = 1):
+        """
+        Token bucket limiting number of requests per second
+        :param rate: tokens added per second, unlimited if not defined
+        :param burst: max number of tokens in bucket
+        """
+        super(TokenBucket, self).__init__()
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.__tokens = float(self.burst)
+        self.__last = time.monotonic()
+
+    def delay(self, now: float) -> float:
+        """
+        :param now: current monotonic time
+        :return: seconds until token is available, 0 if token is available now
+        """
+        if not self.rate:
+            return 0.0
+        self.__refill(now)
+        return 0.0 if self.__tokens >= 1 else (1 - self.__tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        """
+        takes one token from bucket
+        :param now: current monotonic time
+        :return: None
+        """
+        if self.rate:
+            self.__refill(now)
+            self.__tokens -= 1
+
+    def limit(self, rate: float, now: float) -> None:
+        """
+        changes rate of bucket, bucket is emptied, because request for which we limit the rate is already sent
+        :param rate: tokens added per second
+        :param now: current monotonic time
+        :return: None
+        """
+        self.rate = rate
+        self.burst = 1
+        self.__tokens = 0.0
+        self.__last = now
+
+    def __refill(self, now: float) -> None:
+        self.__tokens = min(self.burst, self.__tokens + (now - self.__last) * self.rate)
+        self.__last = now
+
+
+class Host(object):
+
+    def __init__(self, bucket: TokenBucket):
+        super(Host, self).__init__()
+        self.urls = deque()
+        self.bucket = bucket
+        self.active = 0
+        self.blocked_until = 0.0
+
+
+class HostScheduler(object):
+
+    def __init__(self, rate: Optional[float] = None, burst: int = 1, max_connections: Optional[int] = None,
+                 respect_robots: bool = False, session: requests.Session = None, window: int = 1000,
+                 depth_barrier: bool = True):
+        """
+        Decides which url is downloaded next. Urls from frontier are grouped by host and next url is taken from host
+        which is ready: has token in its bucket, has less than `max_connections` downloads in flight and is not
+        blocked after error. Scheduler holds urls from one depth only, so depth level is finished before next one
+        (unless `depth_barrier` is False, e.g. for best-first frontier)
+        :param rate: max requests per second for single host, unlimited if not defined
+        :param burst: max number of requests sent to single host at once without waiting
+        :param max_connections: max number of downloads in flight for single host, unlimited if not defined
+        :param respect_robots: if True, robots.txt rules and its crawl-delay are respected
+        :param session: http session used for robots.txt download
+        :param window: max number of urls taken from frontier at once
+        :param depth_barrier: if True, urls from next depth are taken only when current depth is done
+        """
+        super(HostScheduler, self).__init__()
+        self._logger = logging.getLogger(__name__)
+        self._ex_url_logger = logging.getLogger("spider.excluded.urls")
+        self.__rate = rate
+        self.__burst = burst
+        self.__max_connections = max_connections
+        self.__respect_robots = respect_robots
+        self.__session = session
+        self.__window = window
+        self.__depth_barrier = depth_barrier
+        self.__hosts = OrderedDict()
+        self.__robots = {}
+        self.__robots_locks = {}
+        self.__size = 0
+        self.__active = 0
+        self.__depth = None
+        self.__lock = threading.RLock()
+
+    def fill(self, frontier: Frontier) -> None:
+        """
+        moves urls from frontier into scheduler. Urls from next depth are taken only when current depth is done
+        :param frontier: frontier
+        :return: None
+        """
+        with self.__lock:
+            while len(frontier) > 0 and self.__size < self.__window:
+                url, depth = frontier.peek()
+                if self.__depth_barrier and depth != self.__depth:
+                    if self.__size > 0 or self.__active > 0:
+                        break
+                    self.__depth = depth
+                frontier.pop()
+                self.add(url, depth)
+
+    def add(self, url: str, depth: int) -> None:
+        """
+        adds url into queue of its host
+        :param url: url
+        :param depth: depth of url
+        :return: None
+        """
+        with self.__lock:
+            self.__host(self.host(url)).urls.append((url, depth))
+            self.__size += 1
+
+    def next(self) -> Tuple[Optional[str], Optional[int], Optional[float]]:
+        """
+        takes url from first ready host
+        :return: url and its depth, or (None, None, wait) if no host is ready. Wait is number of seconds after which
+                 some host will be ready, None if we have to wait for downloads in flight
+        """
+        with self.__lock:
+            now = time.monotonic()
+            wait = None
+            for name, host in self.__hosts.items():
+                if not host.urls:
+                    continue
+                if self.__max_connections and host.active >= self.__max_connections:
+                    continue
+                delay = max(host.bucket.delay(now), host.blocked_until - now)
+                if delay > 0:
+                    wait = delay if wait is None else min(wait, delay)
+                    continue
+
+                host.bucket.take(now)
+                host.active += 1
+                self.__active += 1
+                self.__size -= 1
+                # round robin, the host goes at the end
+                self.__hosts.move_to_end(name)
+                url, depth = host.urls.popleft()
+                return url, depth, None
+            return None, None, wait
+
+    def release(self, url: str, processed: bool = True) -> None:
+        """
+        marks download of url as finished
+        :param url: url
+        :param processed: if False, host is free for next download, but depth level of url is not done until
+                          `processed` is called (page is processed later and its links are not queued yet)
+        :return: None
+        """
+        with self.__lock:
+            name = self.host(url)
+            host = self.__hosts[name]
+            host.active -= 1
+            if processed:
+                self.__active -= 1
+            if not host.urls and host.active == 0 and not host.bucket.rate and \
+                    host.blocked_until <= time.monotonic():
+                # there is nothing to remember about this host
+                del self.__hosts[name]
+
+    def processed(self, url: str) -> None:
+        """
+        marks url released with `processed=False` as processed, its links are queued
+        :param url: url
+        :return: None
+        """
+        with self.__lock:
+            self.__active -= 1
+
+    def backoff(self, url: str, seconds: float) -> None:
+        """
+        blocks host of url for some time, e.g. after connection error
+        :param url: url
+        :param seconds: how long host is blocked
+        :return: None
+        """
+        with self.__lock:
+            self.__host(self.host(url)).blocked_until = time.monotonic() + seconds
+
+    def allowed(self, url: str) -> bool:
+        """
+        checks robots.txt rules for url. Rules are downloaded once per host and cached
+        :param url: url
+        :return: True if url can be downloaded
+        """
+        if not self.__respect_robots:
+            return True
+
+        name = self.host(url)
+        with self.__lock:
+            lock = self.__robots_locks.setdefault(name, threading.Lock())
+        with lock:
+            if name not in self.__robots:
+                self.__robots[name] = self.__read_robots(url)
+        robots = self.__robots[name]
+
+        user_agent = self.__user_agent()
+        if robots.can_fetch(user_agent, url):
+            return True
+        self._ex_url_logger.info("Url is disallowed by robots.txt: {}".format(url))
+        return False
+
+    @staticmethod
+    def host(url: str) -> str:
+        return urlparse(url).netloc
+
+    def __len__(self):
+        return self.__size
+
+    def __host(self, name: str) -> Host:
+        host = self.__hosts.get(name)
+        if not host:
+            host = Host(TokenBucket(self.__rate, self.__burst))
+            self.__hosts[name] = host
+        return host
+
+    def __user_agent(self) -> str:
+        return self.__session.headers.get("User-Agent", "*") if self.__session else "*"
+
+    def __read_robots(self, url: str) -> RobotFileParser:
+        parsed_uri = urlparse(url)
+        robots_url = "{uri.scheme}://{uri.netloc}/robots.txt".format(uri=parsed_uri)
+        robots = RobotFileParser(robots_url)
+        # noinspection PyBroadException
+        try:
+            http = self.__session if self.__session else requests
+            response = http.get(robots_url, timeout=30)
+            if response.status_code in (401, 403):
+                robots.disallow_all = True
+            elif response.ok:
+                robots.parse(response.text.splitlines())
+            else:
+                robots.allow_all = True
+        except Exception:
+            self._logger.warning("Can't download {}, all urls are allowed".format(robots_url))
+            robots.allow_all = True
+
+        delay = robots.crawl_delay(self.__user_agent())
+        request_rate = robots.request_rate(self.__user_agent())
+        rates = [r for r in [self.__rate,
+                             1.0 / float(delay) if delay else None,
+                             request_rate.requests / request_rate.seconds
+                             if request_rate and request_rate.seconds else None] if r]
+        if len(rates) > 0 and min(rates) != self.__rate:
+            self._logger.info("Host {} is limited to {:.3f} requests per second".format(parsed_uri.netloc,
+                                                                                       min(rates)))
+            with self.__lock:
+                self.__host(parsed_uri.netloc).bucket.limit(min(rates), time.monotonic())
+        return robots
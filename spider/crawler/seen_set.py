@@ -0,0 +1,290 @@
+import hashlib
+import math
+import struct
+import threading
+import zlib
+from abc import ABCMeta, abstractmethod
+from array import array
+
+exact_seen_set = "exact"
+fingerprint_seen_set = "fingerprint"
+bloom_seen_set = "bloom"
+
+
+class SeenSet(metaclass=ABCMeta):
+
+    @abstractmethod
+    def add(self, url: str) -> None:
+        """
+        marks url as seen
+        :param url: url
+        :return: None
+        """
+        pass
+
+    @abstractmethod
+    def __contains__(self, url: str) -> bool:
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @abstractmethod
+    def to_bytes(self) -> bytes:
+        """
+        serializes set, e.g. for checkpoint
+        :return: serialized set
+        """
+        pass
+
+    @classmethod
+    @abstractmethod
+    def from_bytes(cls, data: bytes):
+        """
+        deserializes set created by to_bytes
+        :param data: serialized set
+        :return: seen set
+        """
+        pass
+
+    def load(self, data: bytes) -> None:
+        """
+        replaces content of set by set serialized by to_bytes, e.g. when crawl is restored from checkpoint
+        :param data: serialized set
+        :return: None
+        """
+        self.__dict__.update(self.from_bytes(data).__dict__)
+
+
+class ExactSeenSet(SeenSet):
+
+    def __init__(self):
+        """
+        Plain python set of urls, no false positives but every url is kept as string
+        """
+        super(ExactSeenSet, self).__init__()
+        self.__urls = set()
+
+    def add(self, url: str) -> None:
+        self.__urls.add(url)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.__urls
+
+    def __len__(self) -> int:
+        return len(self.__urls)
+
+    def to_bytes(self) -> bytes:
+        # copy is taken at once, so set can be serialized while crawl adds urls
+        return zlib.compress("\n".join(self.__urls.copy()).encode("UTF-8"))
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        seen = cls()
+        urls = zlib.decompress(data).decode("UTF-8")
+        for url in urls.split("\n") if urls else []:
+            seen.add(url)
+        return seen
+
+
+class FingerprintSeenSet(SeenSet):
+
+    def __init__(self, capacity: int = 1 << 20):
+        """
+        Set of 64-bit url hashes kept in open addressing table (array of unsigned longs), 8 bytes per url instead of
+        whole string. Probability of false positive is about n / 2^64
+        :param capacity: initial number of slots, rounded up to power of 2
+        """
+        super(FingerprintSeenSet, self).__init__()
+        self.__table = array("Q", bytes(8 * self.__round(capacity)))
+        self.__size = 0
+        self.__lock = threading.Lock()
+
+    def add(self, url: str) -> None:
+        fingerprint = self.fingerprint(url)
+        with self.__lock:
+            if self.__insert(self.__table, fingerprint):
+                self.__size += 1
+                # we keep load factor below 0.7, otherwise probing gets slow
+                if self.__size * 10 > len(self.__table) * 7:
+                    self.__resize(len(self.__table) * 2)
+
+    def __contains__(self, url: str) -> bool:
+        table = self.__table
+        mask = len(table) - 1
+        fingerprint = self.fingerprint(url)
+        i = fingerprint & mask
+        while table[i]:
+            if table[i] == fingerprint:
+                return True
+            i = (i + 1) & mask
+        return False
+
+    def __len__(self) -> int:
+        return self.__size
+
+    def to_bytes(self) -> bytes:
+        with self.__lock:
+            return struct.pack("<Q", self.__size) + zlib.compress(self.__table.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        seen = cls(1)
+        seen.__size = struct.unpack("<Q", data[:8])[0]
+        seen.__table = array("Q")
+        seen.__table.frombytes(zlib.decompress(data[8:]))
+        return seen
+
+    @staticmethod
+    def fingerprint(url: str) -> int:
+        """
+        :param url: url
+        :return: 64-bit hash of url, never 0 (0 marks empty slot)
+        """
+        return int.from_bytes(hashlib.blake2b(url.encode("UTF-8"), digest_size=8).digest(), "little") or 1
+
+    @staticmethod
+    def __insert(table: array, fingerprint: int) -> bool:
+        mask = len(table) - 1
+        i = fingerprint & mask
+        while table[i]:
+            if table[i] == fingerprint:
+                return False
+            i = (i + 1) & mask
+        table[i] = fingerprint
+        return True
+
+    def __resize(self, capacity: int) -> None:
+        table = array("Q", bytes(8 * capacity))
+        for fingerprint in self.__table:
+            if fingerprint:
+                self.__insert(table, fingerprint)
+        # readers use old table until this assignment
+        self.__table = table
+
+    @staticmethod
+    def __round(capacity: int) -> int:
+        return 1 << max(capacity - 1, 1).bit_length()
+
+
+class BloomFilter(object):
+
+    def __init__(self, capacity: int, error_rate: float):
+        """
+        Bloom filter sized for `capacity` items with `error_rate` false positive probability
+        :param capacity: expected number of items
+        :param error_rate: false positive probability
+        """
+        super(BloomFilter, self).__init__()
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits = max(int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))), 8)
+        self.hashes = max(int(round(self.bits / capacity * math.log(2))), 1)
+        self.array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def positions(self, h1: int, h2: int):
+        # double hashing, k positions from two hashes
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, h1: int, h2: int) -> None:
+        for p in self.positions(h1, h2):
+            self.array[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def __contains__(self, hashes) -> bool:
+        h1, h2 = hashes
+        return all(self.array[p >> 3] & (1 << (p & 7)) for p in self.positions(h1, h2))
+
+
+class BloomSeenSet(SeenSet):
+
+    def __init__(self, capacity: int = 1 << 20, error_rate: float = 0.001, growth: int = 2,
+                 tightening: float = 0.9):
+        """
+        Scalable bloom filter. When current filter is full, next (`growth` times bigger) filter is added with
+        error rate multiplied by `tightening`, so total false positive probability stays below `error_rate`.
+        False positive means url is treated as seen and is never downloaded
+        :param capacity: capacity of first filter
+        :param error_rate: max false positive probability
+        :param growth: how many times next filter is bigger
+        :param tightening: how error rate of next filter decreases
+        """
+        super(BloomSeenSet, self).__init__()
+        self.__capacity = capacity
+        self.__error_rate = error_rate
+        self.__growth = growth
+        self.__tightening = tightening
+        # error rates of filters make geometric series, their sum is error_rate
+        self.__filters = [BloomFilter(capacity, error_rate * (1 - tightening))]
+        self.__lock = threading.Lock()
+
+    def add(self, url: str) -> None:
+        hashes = self.__hashes(url)
+        with self.__lock:
+            if self.__contains(hashes):
+                return
+            last = self.__filters[-1]
+            if last.count >= last.capacity:
+                last = BloomFilter(last.capacity * self.__growth, last.error_rate * self.__tightening)
+                self.__filters.append(last)
+            last.add(*hashes)
+
+    def __contains__(self, url: str) -> bool:
+        return self.__contains(self.__hashes(url))
+
+    def __len__(self) -> int:
+        return sum(f.count for f in self.__filters)
+
+    def to_bytes(self) -> bytes:
+        with self.__lock:
+            data = struct.pack("<QddI", self.__capacity, self.__error_rate, self.__tightening, self.__growth)
+            data += struct.pack("<I", len(self.__filters))
+            for f in self.__filters:
+                array_data = zlib.compress(bytes(f.array))
+                data += struct.pack("<QdQQ", f.capacity, f.error_rate, f.count, len(array_data)) + array_data
+            return data
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        capacity, error_rate, tightening, growth = struct.unpack_from("<QddI", data)
+        offset = struct.calcsize("<QddI")
+        seen = cls(capacity, error_rate, growth, tightening)
+        filters_count = struct.unpack_from("<I", data, offset)[0]
+        offset += 4
+        seen.__filters = []
+        for _ in range(filters_count):
+            f_capacity, f_error_rate, count, length = struct.unpack_from("<QdQQ", data, offset)
+            offset += struct.calcsize("<QdQQ")
+            f = BloomFilter(f_capacity, f_error_rate)
+            f.array = bytearray(zlib.decompress(data[offset:offset + length]))
+            f.count = count
+            offset += length
+            seen.__filters.append(f)
+        return seen
+
+    def __contains(self, hashes) -> bool:
+        return any(hashes in f for f in self.__filters)
+
+    @staticmethod
+    def __hashes(url: str):
+        digest = hashlib.blake2b(url.encode("UTF-8"), digest_size=16).digest()
+        return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+
+def create_seen_set(kind: str = exact_seen_set, capacity: int = 1 << 20, error_rate: float = 0.001) -> SeenSet:
+    """
+    creates seen set
+    :param kind: exact, fingerprint or bloom
+    :param capacity: initial capacity (fingerprint and bloom)
+    :param error_rate: false positive probability (bloom only)
+    :return: seen set
+    """
+    if kind == exact_seen_set:
+        return ExactSeenSet()
+    if kind == fingerprint_seen_set:
+        return FingerprintSeenSet(capacity)
+    if kind == bloom_seen_set:
+        return BloomSeenSet(capacity, error_rate)
+    raise ValueError("Unknown seen set: {}".format(kind))
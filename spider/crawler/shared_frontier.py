@@ -0,0 +1,181 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Iterable, List, Tuple
+
+from spider.crawler.scheduler import HostScheduler
+
+queued_status = "queued"
+leased_status = "leased"
+done_status = "done"
+
+
+def host_shard(url: str, shards: int) -> int:
+    """
+    :param url: url
+    :param shards: number of shards
+    :return: shard of url, all urls of one host are in the same shard
+    """
+    return zlib.crc32(HostScheduler.host(url).encode("UTF-8")) % max(shards, 1)
+
+
+class SharedFrontier(object):
+
+    def __init__(self, frontier_file: str, shards: int = 1, lease_time: float = 300.0, timeout: float = 60.0):
+        """
+        Frontier shared by crawl nodes, kept in sqlite file (e.g. on shared volume, or behind coordinator). Every url
+        is stored once, so it is also seen set of whole crawl. Urls are sharded by host hash, node leases batch of urls
+        from its shard (or from shards without live node) and reports found links when url is done. Lease which is not
+        done or renewed in `lease_time` seconds expires and url is leased again, e.g. when node dies.
+        Nodes have to have synchronized clocks, lease expiration is checked against wall clock
+        :param frontier_file: path to sqlite file
+        :param shards: number of shards (nodes), used when frontier file is created, existing file keeps its value
+        :param lease_time: how long (in seconds) leased url belongs to node
+        :param timeout: how long (in seconds) we wait for lock of sqlite file held by other node
+        """
+        super(SharedFrontier, self).__init__()
+        self._logger = logging.getLogger(__name__)
+        self.__lease_time = lease_time
+        self.__lock = threading.Lock()
+
+        frontier_dir = os.path.dirname(frontier_file)
+        if frontier_dir:
+            os.makedirs(frontier_dir, exist_ok=True)
+        # transactions are explicit, lease has to read and update urls atomically
+        self.__db = sqlite3.connect(frontier_file, timeout=timeout, check_same_thread=False, isolation_level=None)
+        with self.__transaction():
+            self.__db.execute("CREATE TABLE IF NOT EXISTS urls (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                              "url TEXT UNIQUE, depth INTEGER, shard INTEGER, status TEXT, node TEXT, "
+                              "lease_until REAL)")
+            self.__db.execute("CREATE INDEX IF NOT EXISTS urls_status ON urls (status, depth, seq)")
+            self.__db.execute("CREATE INDEX IF NOT EXISTS urls_node ON urls (node)")
+            self.__db.execute("CREATE TABLE IF NOT EXISTS nodes (name TEXT PRIMARY KEY, shard INTEGER, seen REAL)")
+            self.__db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self.__db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('shards', ?)", (str(shards),))
+            self.shards = int(self.__db.execute("SELECT value FROM meta WHERE key = 'shards'").fetchone()[0])
+
+    def add(self, urls: Iterable[str], depth: int) -> int:
+        """
+        adds urls which were not seen yet
+        :param urls: urls
+        :param depth: depth of urls
+        :return: number of new urls
+        """
+        with self.__transaction():
+            return self.__add(urls, depth)
+
+    def lease(self, node: str, shard: int, count: int) -> List[Tuple[str, int]]:
+        """
+        leases urls waiting for download (or urls whose lease expired), urls from shard of node go first, then urls
+        from shards without live node. Lower depth goes first
+        :param node: name of node
+        :param shard: shard of node
+        :param count: max number of leased urls
+        :return: urls and their depths
+        """
+        with self.__transaction():
+            now = time.time()
+            self.__heartbeat(node, shard, now)
+            live_shards = [row[0] for row in self.__db.execute(
+                "SELECT DISTINCT shard FROM nodes WHERE name != ? AND shard != ? AND seen >= ?",
+                (node, shard, now - self.__lease_time))]
+            rows = self.__db.execute(
+                "SELECT seq, url, depth FROM urls WHERE (status = ? OR (status = ? AND lease_until < ?)) "
+                "AND shard NOT IN ({}) ORDER BY shard != ?, depth, seq LIMIT ?".format(
+                    ", ".join("?" * len(live_shards))),
+                [queued_status, leased_status, now] + live_shards + [shard, count]).fetchall()
+            self.__db.executemany("UPDATE urls SET status = ?, node = ?, lease_until = ? WHERE seq = ?",
+                                  [(leased_status, node, now + self.__lease_time, seq) for seq, _, _ in rows])
+        return [(url, depth) for _, url, depth in rows]
+
+    def complete(self, node: str, url: str, links: Iterable[str], depth: int) -> None:
+        """
+        marks leased url as done and adds links found on it. Other leases of node are renewed
+        :param node: name of node
+        :param url: downloaded url
+        :param links: links found on url
+        :param depth: depth of links
+        :return: None
+        """
+        with self.__transaction():
+            now = time.time()
+            self.__add(links, depth)
+            self.__db.execute("UPDATE urls SET status = ?, node = NULL, lease_until = NULL WHERE url = ?",
+                              (done_status, url))
+            self.__db.execute("UPDATE urls SET lease_until = ? WHERE node = ? AND status = ?",
+                              (now + self.__lease_time, node, leased_status))
+            self.__db.execute("UPDATE nodes SET seen = ? WHERE name = ?", (now, node))
+
+    def release(self, node: str) -> int:
+        """
+        returns urls leased by node (e.g. when node stops), so other nodes don't have to wait for lease expiration
+        :param node: name of node
+        :return: number of returned urls
+        """
+        with self.__transaction():
+            released = self.__db.execute("UPDATE urls SET status = ?, node = NULL, lease_until = NULL "
+                                         "WHERE node = ? AND status = ?", (queued_status, node, leased_status))
+            self.__db.execute("DELETE FROM nodes WHERE name = ?", (node,))
+            return released.rowcount
+
+    def pending(self) -> int:
+        """
+        :return: number of urls which are not done (waiting or leased)
+        """
+        with self.__lock:
+            return self.__db.execute("SELECT COUNT(*) FROM urls WHERE status != ?", (done_status,)).fetchone()[0]
+
+    def stats(self) -> dict:
+        """
+        :return: number of urls by status
+        """
+        with self.__lock:
+            return dict(self.__db.execute("SELECT status, COUNT(*) FROM urls GROUP BY status").fetchall())
+
+    def close(self) -> None:
+        self.__db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __add(self, urls: Iterable[str], depth: int) -> int:
+        cursor = self.__db.executemany("INSERT OR IGNORE INTO urls (url, depth, shard, status) VALUES (?, ?, ?, ?)",
+                                       [(url, depth, host_shard(url, self.shards), queued_status) for url in urls])
+        return max(cursor.rowcount, 0)
+
+    def __heartbeat(self, node: str, shard: int, now: float) -> None:
+        self.__db.execute("INSERT OR REPLACE INTO nodes (name, shard, seen) VALUES (?, ?, ?)", (node, shard, now))
+
+    def __transaction(self):
+        return _Transaction(self.__db, self.__lock)
+
+
+class _Transaction(object):
+    """
+    write transaction which locks sqlite file for other nodes from its start (BEGIN IMMEDIATE)
+    """
+
+    def __init__(self, db: sqlite3.Connection, lock: threading.Lock):
+        self.__db = db
+        self.__lock = lock
+
+    def __enter__(self):
+        self.__lock.acquire()
+        try:
+            self.__db.execute("BEGIN IMMEDIATE")
+        except Exception:
+            self.__lock.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self.__db.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        finally:
+            self.__lock.release()
@@ -0,0 +1,76 @@
+import os
+import sqlite3
+from contextlib import closing
+from unittest import TestCase
+
+from spider.crawler.checkpoint import Checkpoint
+from spider.crawler.frontier import Frontier
+from spider.crawler.seen_set import BloomSeenSet, FingerprintSeenSet
+
+
+class TestCheckpoint(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkpoint_file = 'spider/crawler/test/outdir/checkpoint.db'
+
+    def setUp(self):
+        if os.path.isfile(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+
+    def test_restore(self):
+        with Checkpoint(self.checkpoint_file) as checkpoint:
+            checkpoint.queued('http://some.url', 0)
+            checkpoint.queued('http://some.url/a', 1)
+            checkpoint.queued('http://some.url/b', 1)
+            checkpoint.done('http://some.url')
+            # the same url can't be queued twice
+            checkpoint.queued('http://some.url/a', 2)
+
+        downloaded_urls = set()
+        with Checkpoint(self.checkpoint_file) as checkpoint, Frontier() as frontier:
+            self.assertEqual(2, checkpoint.restore(frontier, downloaded_urls))
+            self.assertEqual({'http://some.url', 'http://some.url/a', 'http://some.url/b'}, downloaded_urls)
+            self.assertEqual([('http://some.url/a', 1), ('http://some.url/b', 1)], list(frontier.items()))
+
+    def test_flush_interval(self):
+        checkpoint = Checkpoint(self.checkpoint_file, interval=3600)
+        checkpoint.queued('http://some.url', 0)
+        checkpoint.flush_if_due()
+
+        # nothing is flushed before interval
+        with Checkpoint(self.checkpoint_file) as other, Frontier() as frontier:
+            self.assertEqual(0, other.restore(frontier, set()))
+
+        checkpoint.close()
+        with Checkpoint(self.checkpoint_file) as other, Frontier() as frontier:
+            self.assertEqual(1, other.restore(frontier, set()))
+
+    def test_restore_seen_set(self):
+        seen = BloomSeenSet(capacity=100)
+        with Checkpoint(self.checkpoint_file, seen=seen) as checkpoint:
+            for url in ('http://some.url', 'http://some.url/a', 'http://some.url/b'):
+                seen.add(url)
+            checkpoint.queued('http://some.url', 0)
+            checkpoint.queued('http://some.url/a', 1)
+            checkpoint.queued('http://some.url/b', 1)
+            checkpoint.done('http://some.url')
+            checkpoint.flush()
+            seen.add('http://some.url/c')
+            checkpoint.queued('http://some.url/c', 2)
+            checkpoint.done('http://some.url/a')
+
+        downloaded_urls = BloomSeenSet(capacity=100)
+        with Checkpoint(self.checkpoint_file, seen=downloaded_urls) as checkpoint, Frontier() as frontier:
+            self.assertEqual(2, checkpoint.restore(frontier, downloaded_urls))
+            self.assertEqual(4, len(downloaded_urls))
+            self.assertTrue('http://some.url/a' in downloaded_urls)
+            self.assertFalse('http://some.url/d' in downloaded_urls)
+            self.assertEqual([('http://some.url/b', 1), ('http://some.url/c', 2)], list(frontier.items()))
+            # done urls are kept only in seen set
+            with closing(sqlite3.connect(self.checkpoint_file)) as db:
+                self.assertEqual([('http://some.url/b',), ('http://some.url/c',)],
+                                 db.execute('SELECT url FROM urls ORDER BY seq').fetchall())
+
+            with self.assertRaises(ValueError):
+                checkpoint.restore(frontier, FingerprintSeenSet())
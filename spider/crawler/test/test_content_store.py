@@ -0,0 +1,41 @@
+import os
+from unittest import TestCase
+
+from spider.crawler.content_store import ContentStore
+from spider.utils import file_utils
+
+
+class TestContentStore(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.references_file = 'spider/crawler/test/outdir/references.txt'
+
+    def setUp(self):
+        file_utils.create_dir_if_not_exist('spider/crawler/test/outdir')
+        if os.path.isfile(self.references_file):
+            os.remove(self.references_file)
+
+    def test_add(self):
+        with ContentStore(self.references_file) as store:
+            self.assertIsNone(store.add('http://some.url/a.pdf', 'a', 'abc'))
+            self.assertEqual('a', store.add('http://mirror.url/a.pdf?utm=1', 'b', 'abc'))
+            self.assertIsNone(store.add('http://some.url/c.pdf', 'c', 'def'))
+            store.reference('http://mirror.url/a.pdf?utm=1', 'b', 'a')
+
+        with open(self.references_file, encoding='UTF-8') as f:
+            self.assertEqual('http://mirror.url/a.pdf?utm=1\tb\ta\n', f.read())
+
+    def test_find_by_headers(self):
+        store = ContentStore()
+        store.add('http://some.url/a.pdf', 'a', 'abc', {'etag': '"v1"', 'content-md5': 'Q2hlY2sgSW50ZWdyaXR5IQ=='})
+        store.add('http://some.url/b.pdf', 'b', 'def', {'etag': 'W/"v2"'})
+
+        self.assertEqual('a', store.find('http://some.url/download?id=1', {'etag': '"v1"'}))
+        # etag is unique only within host, content-md5 everywhere
+        self.assertIsNone(store.find('http://other.url/a.pdf', {'etag': '"v1"'}))
+        self.assertEqual('a', store.find('http://other.url/a.pdf', {'content-md5': 'Q2hlY2sgSW50ZWdyaXR5IQ=='}))
+        self.assertEqual('b', store.find('http://other.url/b.pdf', {}, 'def'))
+        # weak etags are ignored
+        self.assertIsNone(store.find('http://some.url/b2.pdf', {'etag': 'W/"v2"'}))
+        self.assertIsNone(store.find('http://some.url/c.pdf', {}))
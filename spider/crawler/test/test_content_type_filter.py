@@ -0,0 +1,64 @@
+from unittest import TestCase, mock
+
+import requests
+
+from spider.crawler.content_type_filter import ContentTypeFilter, guess_content_type, url_pattern
+
+
+class Object(object):
+    pass
+
+
+# noinspection PyUnusedLocal
+def mock_head(url, **kwargs):
+    response = Object()
+    response.ok = True
+    response.headers = {'content-type': 'application/pdf' if 'download' in url else 'text/html; charset=UTF-8'}
+    return response
+
+
+class TestContentTypeFilter(TestCase):
+
+    def test_url_pattern(self):
+        self.assertEqual('some.url/files/N/report?id', url_pattern('http://some.url/files/2020/report?id=5'))
+        self.assertEqual('some.url/download.php?id&type', url_pattern('http://some.url/download.php?type=a&id=1'))
+        self.assertEqual('some.url/docs/fileN.aspx', url_pattern('http://some.url/docs/file12.aspx'))
+        self.assertEqual('some.url/download/N', url_pattern('http://some.url/download/15'))
+        # extensionless names of one directory don't share pattern
+        self.assertNotEqual(url_pattern('http://some.url/docs/overview'), url_pattern('http://some.url/docs/report'))
+        self.assertEqual('some.url', url_pattern('http://some.url'))
+
+    def test_guess_content_type(self):
+        self.assertEqual('application/pdf', guess_content_type('http://some.url/doc/1.pdf?download=1'))
+        self.assertEqual('application/zip', guess_content_type('http://some.url/data.ZIP'))
+        self.assertEqual('text/html', guess_content_type('http://some.url/index.html'))
+        self.assertIsNone(guess_content_type('http://some.url/doc/1'))
+        self.assertIsNone(guess_content_type('http://some.url/v1.2/page'))
+
+    def test_excluded_by_extension(self):
+        content_type_filter = ContentTypeFilter(['application/pdf', 'application/zip'])
+        self.assertEqual('application/pdf', content_type_filter.excluded('http://some.url/doc/1.pdf'))
+        self.assertEqual('application/zip', content_type_filter.excluded('http://some.url/data.zip'))
+        self.assertIsNone(content_type_filter.excluded('http://some.url/page.html'))
+        self.assertIsNone(content_type_filter.excluded('http://some.url/doc/1'))
+        # nothing is excluded
+        self.assertIsNone(ContentTypeFilter([]).excluded('http://some.url/doc/1.pdf'))
+
+    @mock.patch('requests.head', side_effect=mock_head)
+    def test_probe(self, mock_req_head):
+        content_type_filter = ContentTypeFilter(['application/pdf'], probe=True)
+        self.assertEqual('application/pdf', content_type_filter.excluded('http://some.url/download/1'))
+        self.assertEqual('application/pdf', content_type_filter.excluded('http://some.url/download/2'))
+        self.assertIsNone(content_type_filter.excluded('http://some.url/article/first'))
+        self.assertEqual('application/pdf', content_type_filter.excluded('http://some.url/article/download'))
+        # url with known extension is not probed
+        self.assertIsNone(content_type_filter.excluded('http://some.url/download/3.html'))
+        # probes are cached by pattern
+        self.assertEqual(3, mock_req_head.call_count)
+
+    @mock.patch('requests.head', side_effect=requests.ConnectionError('refused'))
+    def test_failed_probe(self, mock_req_head):
+        content_type_filter = ContentTypeFilter(['application/pdf'], probe=True)
+        self.assertIsNone(content_type_filter.excluded('http://some.url/download/1'))
+        self.assertIsNone(content_type_filter.excluded('http://some.url/download/2'))
+        self.assertEqual(1, mock_req_head.call_count)
@@ -0,0 +1,67 @@
+import os
+from unittest import TestCase
+
+from spider.crawler.budgets import BudgetFrontier
+from spider.crawler.frontier import Frontier
+
+
+class TestFrontier(TestCase):
+
+    def test_fifo_order(self):
+        with Frontier() as frontier:
+            frontier.push('http://some.url/a', 0)
+            frontier.push('http://some.url/b', 1)
+            self.assertEqual(2, len(frontier))
+            self.assertEqual(('http://some.url/a', 0), frontier.pop())
+            self.assertEqual(('http://some.url/b', 1), frontier.pop())
+            self.assertEqual(0, len(frontier))
+
+    def test_spill_to_disk(self):
+        spill_dir = 'spider/crawler/test'
+        files = set(os.listdir(spill_dir))
+        with Frontier(memory_limit=3, spill_dir=spill_dir) as frontier:
+            for i in range(10):
+                frontier.push('http://some.url/{}'.format(i), i // 4)
+            self.assertEqual(10, len(frontier))
+            # spill file is created only when memory limit is exceeded
+            self.assertEqual(1, len(set(os.listdir(spill_dir)) - files))
+
+            expected = [('http://some.url/{}'.format(i), i // 4) for i in range(10)]
+            self.assertEqual(expected, list(frontier.items()))
+
+            popped = [frontier.pop() for _ in range(5)]
+            frontier.push('http://some.url/10', 2)
+            popped += [frontier.pop() for _ in range(6)]
+            self.assertEqual(expected + [('http://some.url/10', 2)], popped)
+            self.assertEqual(0, len(frontier))
+        # spill file is removed at the end
+        self.assertEqual(files, set(os.listdir(spill_dir)))
+
+    def test_budgets(self):
+        spill_dir = 'spider/crawler/test'
+        files = set(os.listdir(spill_dir))
+        with BudgetFrontier(memory_limit=2, spill_dir=spill_dir, max_pages_per_host=2,
+                            max_pages_per_depth={1: 1}) as frontier:
+            for url, depth in [('http://a.url', 0), ('http://b.url', 0), ('http://a.url/1', 1),
+                               ('http://b.url/1', 1), ('http://a.url/2', 2), ('http://b.url/2', 2)]:
+                frontier.push(url, depth)
+            # urls over memory limit are spilled like in Frontier
+            self.assertEqual(1, len(set(os.listdir(spill_dir)) - files))
+            popped = []
+            while len(frontier) > 0:
+                popped.append(frontier.pop()[0])
+            # depth 1 has budget for one url, so b.url/1 is dropped, a.url has budget for two urls
+            self.assertEqual(['http://a.url', 'http://b.url', 'http://a.url/1', 'http://b.url/2'], popped)
+        self.assertEqual(files, set(os.listdir(spill_dir)))
+
+        with BudgetFrontier(memory_limit=2, spill_dir=spill_dir, max_pages=2) as frontier:
+            for number in range(5):
+                frontier.push('http://some.url/{}'.format(number), 1)
+            frontier.pop()
+            frontier.pop()
+            self.assertEqual(0, len(frontier))
+            # urls found after budget is used are not queued
+            frontier.push('http://some.url/new', 1)
+            self.assertEqual(0, len(frontier))
+            self.assertEqual(2, frontier.pages)
+        self.assertEqual(files, set(os.listdir(spill_dir)))
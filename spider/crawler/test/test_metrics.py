@@ -0,0 +1,67 @@
+import os
+from unittest import TestCase
+
+from spider.crawler.metrics import Metrics, NullMetrics, PrometheusFileWriter, stage_metric
+
+
+class TestMetrics(TestCase):
+
+    def test_counters(self):
+        metrics = Metrics()
+        metrics.inc('spider_pages_total', host='a', status=200)
+        metrics.inc('spider_pages_total', host='a', status=200)
+        metrics.inc('spider_bytes_total', 10, host='a', content_type=None)
+
+        counters = metrics.snapshot()['counters']
+        self.assertEqual([{'labels': {'host': 'a', 'status': '200'}, 'value': 2}], counters['spider_pages_total'])
+        # labels without value are dropped
+        self.assertEqual([{'labels': {'host': 'a'}, 'value': 10}], counters['spider_bytes_total'])
+
+    def test_histogram(self):
+        metrics = Metrics(buckets=(0.1, 1.0), per_host=False)
+        for value in (0.05, 0.1, 0.5, 5.0):
+            metrics.observe(stage_metric, value, stage='ttfb', host='a')
+
+        histogram, = metrics.snapshot()['histograms'][stage_metric]
+        self.assertEqual({'stage': 'ttfb'}, histogram['labels'])
+        self.assertEqual(4, histogram['count'])
+        self.assertAlmostEqual(5.65, histogram['sum'])
+        self.assertEqual({'0.1': 2, '1.0': 3, '+Inf': 4}, histogram['buckets'])
+
+    def test_timer(self):
+        metrics = Metrics()
+        with self.assertRaises(ValueError):
+            with metrics.time('html_parse', content_type='text/html'):
+                raise ValueError()
+        # failed stage is measured too
+        self.assertEqual(1, metrics.snapshot()['histograms'][stage_metric][0]['count'])
+
+    def test_prometheus_format(self):
+        metrics = Metrics(buckets=(1.0,))
+        metrics.inc('spider_errors_total', host='a"b')
+        metrics.observe(stage_metric, 0.5, stage='write')
+
+        self.assertEqual('# TYPE spider_errors_total counter\n'
+                         'spider_errors_total{host="a\\"b"} 1\n'
+                         '# TYPE spider_stage_seconds histogram\n'
+                         'spider_stage_seconds_bucket{stage="write",le="1.0"} 1\n'
+                         'spider_stage_seconds_bucket{stage="write",le="+Inf"} 1\n'
+                         'spider_stage_seconds_sum{stage="write"} 0.5\n'
+                         'spider_stage_seconds_count{stage="write"} 1\n', metrics.to_prometheus())
+
+    def test_null_metrics(self):
+        metrics = NullMetrics()
+        metrics.inc('spider_pages_total')
+        with metrics.time('write'):
+            pass
+        self.assertEqual({'counters': {}, 'histograms': {}}, metrics.snapshot())
+
+    def test_file_writer(self):
+        metrics_file = 'spider/crawler/test/outdir/metrics.prom'
+        os.makedirs(os.path.dirname(metrics_file), exist_ok=True)
+        metrics = Metrics()
+        with PrometheusFileWriter(metrics, metrics_file, interval=60):
+            metrics.inc('spider_pages_total')
+        with open(metrics_file) as f:
+            self.assertEqual('# TYPE spider_pages_total counter\nspider_pages_total 1\n', f.read())
+        os.remove(metrics_file)
@@ -0,0 +1,67 @@
+import os
+import shutil
+from unittest import TestCase
+
+from spider.crawler.output_manifest import OutputManifest, sharded_name, url_hash
+
+
+class TestOutputManifest(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.output_dir = 'spider/crawler/test/outdir/manifest'
+        self.manifest_file = '{}/manifest.tsv'.format(self.output_dir)
+
+    def setUp(self):
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+        os.makedirs(self.output_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def test_sharded_name(self):
+        name_hash = url_hash('http://some.url/page')
+        self.assertEqual(32, len(name_hash))
+        self.assertEqual('{}/{}/{}'.format(name_hash[:2], name_hash[2:4], name_hash), sharded_name(name_hash))
+
+    def test_contains(self):
+        with OutputManifest() as manifest:
+            self.assertFalse(manifest.contains('http://some.url/a'))
+            manifest.add('http://some.url/a')
+            self.assertTrue(manifest.contains('http://some.url/a'))
+            self.assertFalse(manifest.contains('http://some.url/b'))
+
+    def test_manifest_is_loaded(self):
+        with OutputManifest(self.manifest_file) as manifest:
+            # manifest file is created with first url
+            self.assertFalse(os.path.isfile(self.manifest_file))
+            manifest.add('http://some.url/a')
+            manifest.add('http://some.url/b')
+            manifest.add('http://some.url/a')
+        with open(self.manifest_file, encoding='UTF-8') as f:
+            self.assertEqual(['{}\thttp://some.url/a\n'.format(url_hash('http://some.url/a')),
+                              '{}\thttp://some.url/b\n'.format(url_hash('http://some.url/b'))], f.readlines())
+
+        with OutputManifest(self.manifest_file) as manifest:
+            self.assertTrue(manifest.contains('http://some.url/a'))
+            self.assertTrue(manifest.contains('http://some.url/b'))
+            manifest.add('http://some.url/c')
+        with open(self.manifest_file, encoding='UTF-8') as f:
+            self.assertEqual(3, len(f.readlines()))
+
+    def test_content_type(self):
+        with OutputManifest(self.manifest_file) as manifest:
+            manifest.add('http://some.url/a', 'text/html')
+            manifest.add('http://some.url/b.pdf', 'application/pdf')
+            manifest.add('zip!/member.txt')
+            # line is in file before manifest is closed (e.g. when crawl is killed)
+            with open(self.manifest_file, encoding='UTF-8') as f:
+                self.assertEqual('{}\thttp://some.url/a\ttext/html\n'.format(url_hash('http://some.url/a')),
+                                 f.readline())
+
+        with OutputManifest(self.manifest_file) as manifest:
+            self.assertEqual('text/html', manifest.content_type('http://some.url/a'))
+            self.assertEqual('application/pdf', manifest.content_type('http://some.url/b.pdf'))
+            self.assertIsNone(manifest.content_type('zip!/member.txt'))
+            self.assertTrue(manifest.contains('zip!/member.txt'))
+            self.assertIsNone(manifest.content_type('http://some.url/c'))
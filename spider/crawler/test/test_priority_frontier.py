@@ -0,0 +1,74 @@
+from unittest import TestCase
+
+from spider.crawler.priority_frontier import PriorityFrontier
+
+
+class TestPriorityFrontier(TestCase):
+
+    def test_depth_order(self):
+        with PriorityFrontier(inlink_weight=0, include_weight=0) as frontier:
+            frontier.push('http://some.url/a', 1)
+            frontier.push('http://some.url', 0)
+            frontier.push('http://some.url/b', 1)
+            # the same url is queued once
+            frontier.push('http://some.url/a', 2)
+            self.assertEqual(3, len(frontier))
+            self.assertEqual([('http://some.url', 0), ('http://some.url/a', 1), ('http://some.url/b', 1)],
+                             list(frontier.items()))
+            self.assertEqual(('http://some.url', 0), frontier.peek())
+            self.assertEqual(('http://some.url', 0), frontier.pop())
+            self.assertEqual(('http://some.url/a', 1), frontier.pop())
+            self.assertEqual(('http://some.url/b', 1), frontier.pop())
+            self.assertEqual(0, len(frontier))
+
+    def test_inlinks(self):
+        with PriorityFrontier() as frontier:
+            frontier.push('http://some.url/a', 1)
+            frontier.push('http://some.url/b', 1)
+            frontier.link('http://some.url/b')
+            # url which is not queued is ignored
+            frontier.link('http://some.url/c')
+            self.assertEqual(('http://some.url/b', 1), frontier.pop())
+            self.assertEqual(('http://some.url/a', 1), frontier.pop())
+            self.assertEqual(0, len(frontier))
+
+    def test_include_contains_and_scorer(self):
+        with PriorityFrontier(['some.url', 'article']) as frontier:
+            frontier.push('http://some.url/page?p=2', 1)
+            frontier.push('http://some.url/article/1', 2)
+            self.assertEqual('http://some.url/article/1', frontier.pop()[0])
+
+        def scorer(url: str, depth: int, inlinks: int) -> float:
+            return -10 if 'page' in url else 0
+
+        with PriorityFrontier(depth_weight=0, scorer=scorer) as frontier:
+            frontier.push('http://some.url/page?p=2', 1)
+            frontier.push('http://some.url/about', 1)
+            self.assertEqual(-10 + frontier.score('http://some.url/about', 1, 1),
+                             frontier.score('http://some.url/page?p=2', 1, 1))
+            self.assertEqual('http://some.url/about', frontier.pop()[0])
+
+    def test_budgets(self):
+        with PriorityFrontier(max_pages_per_host=2, max_pages_per_depth={1: 1}) as frontier:
+            frontier.push('http://a.url', 0)
+            frontier.push('http://b.url', 0)
+            frontier.push('http://a.url/1', 1)
+            frontier.push('http://a.url/2', 2)
+            frontier.push('http://b.url/1', 1)
+            frontier.push('http://b.url/2', 2)
+            popped = []
+            while len(frontier) > 0:
+                popped.append(frontier.pop()[0])
+            # depth 1 has budget for one url, so b.url/1 is dropped, a.url has budget for two urls
+            self.assertEqual(['http://a.url', 'http://b.url', 'http://a.url/1', 'http://b.url/2'], popped)
+
+        with PriorityFrontier(max_pages=2) as frontier:
+            for number in range(5):
+                frontier.push('http://some.url/{}'.format(number), 1)
+            frontier.pop()
+            frontier.pop()
+            self.assertEqual(0, len(frontier))
+            # urls found after budget is used are not queued
+            frontier.push('http://some.url/new', 1)
+            self.assertEqual(0, len(frontier))
+            self.assertEqual(2, frontier.pages)
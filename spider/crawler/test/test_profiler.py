@@ -0,0 +1,96 @@
+import os
+import pstats
+import shutil
+import time
+import tracemalloc
+from unittest import TestCase
+
+from spider.crawler.metrics import download_stage, html_parse_stage
+from spider.crawler.profiler import NullProfiler, Profiler
+
+
+def parse_page():
+    return [str(i) for i in range(10000)]
+
+
+class TestProfiler(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.profile_dir = 'spider/crawler/test/outdir/profiles'
+
+    def setUp(self):
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+    def crawl(self, profiler, urls, delay=0.0):
+        for url in urls:
+            profile = profiler.page(url)
+            try:
+                with profile.stage(download_stage):
+                    time.sleep(delay)
+                with profile.stage(html_parse_stage):
+                    parse_page()
+            finally:
+                profile.finish()
+
+    def test_every_nth_page(self):
+        profiler = Profiler(self.profile_dir, stages=[html_parse_stage], every=2)
+        self.crawl(profiler, ['http://some.url/{}'.format(i) for i in range(5)])
+
+        files = sorted(os.listdir(self.profile_dir))
+        self.assertEqual(['000001-http_some.url_1.prof', '000001-http_some.url_1.txt',
+                          '000002-http_some.url_3.prof', '000002-http_some.url_3.txt'], files)
+        stats = pstats.Stats('{}/{}'.format(self.profile_dir, files[0]))
+        self.assertTrue(any(function == 'parse_page' for _, _, function in stats.stats))
+        with open('{}/{}'.format(self.profile_dir, files[1]), encoding='UTF-8') as f:
+            report = f.read()
+        self.assertTrue(report.startswith('url: http://some.url/1\n'))
+        self.assertIn('html_parse: ', report)
+        # not selected stage is not profiled
+        self.assertNotIn('download: ', report)
+
+    def test_slow_pages(self):
+        profiler = Profiler(self.profile_dir, slower_than=50)
+        self.crawl(profiler, ['http://fast.url'])
+        self.assertFalse(os.path.exists(self.profile_dir))
+        self.crawl(profiler, ['http://slow.url'], delay=0.1)
+        self.assertEqual(['000001-http_slow.url.prof', '000001-http_slow.url.txt'],
+                         sorted(os.listdir(self.profile_dir)))
+
+    def test_memory(self):
+        with Profiler(self.profile_dir, stages=[html_parse_stage], every=1, memory=True) as profiler:
+            self.crawl(profiler, ['http://some.url'])
+            self.assertTrue(tracemalloc.is_tracing())
+        self.assertFalse(tracemalloc.is_tracing())
+        with open('{}/000001-http_some.url.txt'.format(self.profile_dir), encoding='UTF-8') as f:
+            self.assertIn('allocations of html_parse:\n', f.read())
+
+    def test_one_page_at_a_time(self):
+        profiler = Profiler(self.profile_dir, every=1)
+        first = profiler.page('http://first.url')
+        second = profiler.page('http://second.url')
+        self.assertIsNotNone(first.profile)
+        self.assertIsNone(second.profile)
+        second.finish()
+        first.finish()
+        self.assertIsNotNone(profiler.page('http://third.url').profile)
+
+    def test_page_is_finished_once(self):
+        profiler = Profiler(self.profile_dir, every=1)
+        first = profiler.page('http://first.url')
+        first.finish()
+        second = profiler.page('http://second.url')
+        # second finish of first page doesn't release sample of second page
+        first.finish()
+        self.assertIsNone(profiler.page('http://third.url').profile)
+        second.finish()
+
+    def test_null_profiler(self):
+        self.crawl(NullProfiler(self.profile_dir, every=1), ['http://some.url'])
+        self.assertFalse(os.path.exists(self.profile_dir))
+
+    def test_unknown_stage(self):
+        self.assertRaises(ValueError, Profiler, self.profile_dir, stages=['get_links'])
@@ -0,0 +1,140 @@
+import time
+from unittest import TestCase, mock
+
+from spider.crawler.frontier import Frontier
+from spider.crawler.scheduler import HostScheduler, TokenBucket
+
+
+class Object(object):
+    pass
+
+
+# noinspection PyUnusedLocal
+def mock_get_robots(url, **kwargs):
+    response = Object()
+    response.ok = True
+    response.status_code = 200
+    response.text = "User-agent: *\n" \
+                    "Crawl-delay: 10\n" \
+                    "Disallow: /private\n"
+    return response
+
+
+class TestScheduler(TestCase):
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=2, burst=2)
+        now = time.monotonic()
+        bucket.delay(now)
+        bucket.take(now)
+        bucket.take(now)
+        self.assertAlmostEqual(0.5, bucket.delay(now))
+        self.assertEqual(0.0, bucket.delay(now + 0.5))
+        self.assertEqual(0.0, TokenBucket(rate=None).delay(now))
+
+    def test_round_robin_over_hosts(self):
+        scheduler = HostScheduler()
+        for url in ['http://a.url/1', 'http://a.url/2', 'http://a.url/3', 'http://b.url/1']:
+            scheduler.add(url, 0)
+        urls = []
+        while len(scheduler) > 0:
+            url, depth, wait = scheduler.next()
+            urls.append(url)
+            scheduler.release(url)
+        self.assertEqual(['http://a.url/1', 'http://b.url/1', 'http://a.url/2', 'http://a.url/3'], urls)
+
+    def test_host_rate_and_connections(self):
+        scheduler = HostScheduler(rate=1, burst=1, max_connections=1)
+        for url in ['http://a.url/1', 'http://a.url/2', 'http://b.url/1']:
+            scheduler.add(url, 0)
+
+        self.assertEqual('http://a.url/1', scheduler.next()[0])
+        self.assertEqual('http://b.url/1', scheduler.next()[0])
+        # a.url has download in flight
+        self.assertEqual((None, None, None), scheduler.next())
+
+        scheduler.release('http://a.url/1')
+        url, depth, wait = scheduler.next()
+        # a.url has no token now
+        self.assertIsNone(url)
+        self.assertTrue(0 < wait <= 1)
+
+    def test_backoff(self):
+        scheduler = HostScheduler()
+        scheduler.add('http://a.url/1', 0)
+        scheduler.backoff('http://a.url/2', 5)
+        url, depth, wait = scheduler.next()
+        self.assertIsNone(url)
+        self.assertTrue(4 < wait <= 5)
+
+    def test_fill_keeps_depth_levels(self):
+        scheduler = HostScheduler(window=10)
+        with Frontier() as frontier:
+            frontier.push('http://a.url/1', 0)
+            frontier.push('http://b.url/1', 0)
+            frontier.push('http://a.url/2', 1)
+            scheduler.fill(frontier)
+            self.assertEqual(2, len(scheduler))
+            self.assertEqual(1, len(frontier))
+
+            url1 = scheduler.next()[0]
+            url2 = scheduler.next()[0]
+            scheduler.release(url1)
+            scheduler.fill(frontier)
+            # url2 is still downloaded, so next level waits
+            self.assertEqual(0, len(scheduler))
+
+            scheduler.release(url2)
+            scheduler.fill(frontier)
+            self.assertEqual(1, len(scheduler))
+            self.assertEqual(('http://a.url/2', 1, None), scheduler.next())
+
+    def test_released_url_which_is_not_processed(self):
+        scheduler = HostScheduler(window=10, max_connections=1)
+        with Frontier() as frontier:
+            frontier.push('http://a.url/1', 0)
+            frontier.push('http://a.url/2', 0)
+            frontier.push('http://a.url/3', 1)
+            scheduler.fill(frontier)
+            url1 = scheduler.next()[0]
+            scheduler.release(url1, processed=False)
+            # host is free for next download
+            url2 = scheduler.next()[0]
+            self.assertEqual('http://a.url/2', url2)
+            scheduler.release(url2)
+            scheduler.fill(frontier)
+            # url1 is not processed, so next level waits
+            self.assertEqual(0, len(scheduler))
+
+            scheduler.processed(url1)
+            scheduler.fill(frontier)
+            self.assertEqual(('http://a.url/3', 1, None), scheduler.next())
+
+    def test_fill_without_depth_barrier(self):
+        scheduler = HostScheduler(window=10, depth_barrier=False)
+        with Frontier() as frontier:
+            frontier.push('http://a.url/1', 0)
+            frontier.push('http://a.url/2', 1)
+            scheduler.fill(frontier)
+            self.assertEqual(2, len(scheduler))
+            self.assertEqual(0, len(frontier))
+
+    def test_robots(self):
+        session = mock.Mock()
+        session.headers = {}
+        session.get.side_effect = mock_get_robots
+        scheduler = HostScheduler(respect_robots=True, session=session)
+        scheduler.add('http://a.url/1', 0)
+        scheduler.add('http://a.url/2', 0)
+
+        url = scheduler.next()[0]
+        self.assertTrue(scheduler.allowed(url))
+        self.assertFalse(scheduler.allowed('http://a.url/private/page'))
+        # robots.txt is downloaded only once
+        self.assertEqual(1, session.get.call_count)
+
+        # crawl delay limits host to one request per 10 seconds
+        scheduler.release(url)
+        url, depth, wait = scheduler.next()
+        self.assertIsNone(url)
+        self.assertTrue(9 < wait <= 10)
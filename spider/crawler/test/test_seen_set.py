@@ -0,0 +1,53 @@
+from unittest import TestCase
+
+from spider.crawler.seen_set import BloomSeenSet, ExactSeenSet, FingerprintSeenSet, create_seen_set, \
+    bloom_seen_set, exact_seen_set, fingerprint_seen_set
+
+
+class TestSeenSet(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.urls = ['http://some.url/page/{}'.format(i) for i in range(5000)]
+        self.unseen = ['http://other.url/page/{}'.format(i) for i in range(5000)]
+
+    def check(self, seen, max_false_positives=0):
+        for url in self.urls:
+            seen.add(url)
+        # adding the same url again does not change anything, url taken for false positive is not counted
+        seen.add(self.urls[0])
+        self.assertLessEqual(len(self.urls) - max_false_positives, len(seen))
+        self.assertLessEqual(len(seen), len(self.urls))
+        for url in self.urls:
+            self.assertTrue(url in seen)
+        false_positives = len([url for url in self.unseen if url in seen])
+        self.assertLessEqual(false_positives, max_false_positives)
+
+        restored = seen.__class__.from_bytes(seen.to_bytes())
+        self.assertEqual(len(seen), len(restored))
+        for url in self.urls:
+            self.assertTrue(url in restored)
+        self.assertEqual(false_positives, len([url for url in self.unseen if url in restored]))
+
+        loaded = seen.__class__()
+        loaded.load(seen.to_bytes())
+        self.assertEqual(len(seen), len(loaded))
+        self.assertTrue(self.urls[-1] in loaded)
+
+    def test_exact(self):
+        self.check(ExactSeenSet())
+        self.assertEqual(0, len(ExactSeenSet.from_bytes(ExactSeenSet().to_bytes())))
+
+    def test_fingerprint(self):
+        # small capacity, so table is resized a few times
+        self.check(FingerprintSeenSet(capacity=16))
+
+    def test_bloom(self):
+        # small capacity, so a few filters are created
+        self.check(BloomSeenSet(capacity=500, error_rate=0.001), max_false_positives=20)
+
+    def test_create_seen_set(self):
+        self.assertIsInstance(create_seen_set(exact_seen_set), ExactSeenSet)
+        self.assertIsInstance(create_seen_set(fingerprint_seen_set), FingerprintSeenSet)
+        self.assertIsInstance(create_seen_set(bloom_seen_set), BloomSeenSet)
+        self.assertRaises(ValueError, create_seen_set, 'fast')
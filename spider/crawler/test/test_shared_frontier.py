@@ -0,0 +1,92 @@
+import os
+from unittest import TestCase, mock
+
+from spider.crawler.coordinator import CoordinatorServer, RemoteFrontier, open_frontier
+from spider.crawler.shared_frontier import SharedFrontier, host_shard
+
+
+class TestSharedFrontier(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.frontier_file = 'spider/crawler/test/outdir/frontier.sqlite'
+
+    def setUp(self):
+        if os.path.isfile(self.frontier_file):
+            os.remove(self.frontier_file)
+
+    def test_lease_and_complete(self):
+        with SharedFrontier(self.frontier_file) as frontier:
+            self.assertEqual(1, frontier.add(['http://some.url'], 0))
+            # the same url is added once
+            self.assertEqual(0, frontier.add(['http://some.url'], 0))
+            self.assertEqual([('http://some.url', 0)], frontier.lease('node', 0, 10))
+            self.assertEqual([], frontier.lease('node', 0, 10))
+            self.assertEqual(1, frontier.pending())
+
+            frontier.complete('node', 'http://some.url', ['http://some.url/b', 'http://some.url/a',
+                                                          'http://some.url'], 1)
+            self.assertEqual({'done': 1, 'queued': 2}, frontier.stats())
+            self.assertEqual([('http://some.url/b', 1)], frontier.lease('node', 0, 1))
+            self.assertEqual([('http://some.url/a', 1)], frontier.lease('node', 0, 1))
+
+            # urls of stopped node are leased again
+            self.assertEqual(2, frontier.release('node'))
+            self.assertEqual(2, len(frontier.lease('other', 0, 10)))
+
+    def test_lease_expiration(self):
+        with SharedFrontier(self.frontier_file, lease_time=60) as frontier:
+            frontier.add(['http://some.url'], 0)
+            with mock.patch('spider.crawler.shared_frontier.time.time', return_value=1000):
+                self.assertEqual(1, len(frontier.lease('dead', 0, 10)))
+            with mock.patch('spider.crawler.shared_frontier.time.time', return_value=1059):
+                self.assertEqual([], frontier.lease('live', 0, 10))
+            with mock.patch('spider.crawler.shared_frontier.time.time', return_value=1061):
+                self.assertEqual([('http://some.url', 0)], frontier.lease('live', 0, 10))
+
+    def test_shards(self):
+        urls = ['http://host{}.url/page'.format(number) for number in range(20)]
+        with SharedFrontier(self.frontier_file, shards=2) as frontier:
+            frontier.add(urls, 0)
+            shards = [[url for url in urls if host_shard(url, 2) == shard] for shard in range(2)]
+            self.assertEqual(shards[0][:3], [url for url, _ in frontier.lease('first', 0, 3)])
+            # nodes of both shards are live, node leases only urls of its shard
+            self.assertEqual(shards[1], [url for url, _ in frontier.lease('second', 1, 100)])
+            self.assertEqual(shards[0][3:], [url for url, _ in frontier.lease('first', 0, 100)])
+
+        # existing frontier keeps its number of shards
+        with SharedFrontier(self.frontier_file, shards=5) as frontier:
+            self.assertEqual(2, frontier.shards)
+
+    def test_shard_without_node(self):
+        urls = ['http://host{}.url/page'.format(number) for number in range(20)]
+        with SharedFrontier(self.frontier_file, shards=2) as frontier:
+            frontier.add(urls, 0)
+            # second node is not running, its urls are leased after urls of first node
+            leased = [url for url, _ in frontier.lease('first', 0, 100)]
+            self.assertEqual(20, len(leased))
+            self.assertEqual(0, host_shard(leased[0], 2))
+            self.assertEqual(1, host_shard(leased[-1], 2))
+
+    def test_coordinator(self):
+        with SharedFrontier(self.frontier_file, shards=3) as frontier, \
+                CoordinatorServer(frontier, '127.0.0.1', 0) as server:
+            server.start()
+            host, port = server.address
+            with open_frontier('tcp://{}:{}'.format(host, port)) as remote:
+                self.assertIsInstance(remote, RemoteFrontier)
+                self.assertEqual(3, remote.shards)
+                self.assertEqual(1, remote.add(['http://some.url'], 0))
+                self.assertEqual([('http://some.url', 0)], remote.lease('node', host_shard('http://some.url', 3), 10))
+                remote.complete('node', 'http://some.url', ['http://some.url/a'], 1)
+                self.assertEqual(1, remote.pending())
+                self.assertEqual({'done': 1, 'queued': 1}, frontier.stats())
+                self.assertRaises(RuntimeError, remote.lease, 'node', 0, 'many')
+
+    def test_open_frontier(self):
+        with open_frontier('sqlite:///' + os.path.abspath(self.frontier_file), shards=4) as frontier:
+            self.assertIsInstance(frontier, SharedFrontier)
+            self.assertEqual(4, frontier.shards)
+        with open_frontier(self.frontier_file) as frontier:
+            self.assertEqual(4, frontier.shards)
+        self.assertRaises(ValueError, open_frontier, 'redis://some.host')
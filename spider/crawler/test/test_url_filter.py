@@ -0,0 +1,69 @@
+from unittest import TestCase
+
+from spider.crawler.content_type_filter import ContentTypeFilter
+from spider.crawler.url_filter import PrefixTrie, UrlFilter, content_type_rule, downloaded_rule, \
+    exclude_contains_rule, exclude_prefix_rule, include_rule
+
+
+class TestUrlFilter(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.urls = ['http://some.url/page',
+                     'http://some.url/login',
+                     'http://fake.url.com/page',
+                     'https://www.youtube.com/watch',
+                     'http://other.com/page',
+                     'http://some.url/downloaded']
+
+    def test_prefix_trie(self):
+        trie = PrefixTrie(['http://fake', 'http://fake.url', 'https://www.youtube.com'])
+        self.assertEqual('http://fake', trie.match('http://fake.url.com/page'))
+        self.assertEqual('https://www.youtube.com', trie.match('https://www.youtube.com/watch'))
+        self.assertIsNone(trie.match('http://some.url'))
+        self.assertIsNone(trie.match('http://fak'))
+        self.assertIsNone(PrefixTrie([]).match('http://some.url'))
+
+    def test_filter(self):
+        url_filter = UrlFilter(['some.url', 'fake', 'youtube'], ['http://fake', 'https://www.youtube.com'],
+                               ['login', 'log'])
+        links = url_filter.filter(self.urls, {'http://some.url/downloaded'})
+        self.assertEqual({'http://some.url/page'}, links)
+
+        hits = url_filter.hits
+        self.assertEqual(1, hits[(include_rule, None)])
+        self.assertEqual(1, hits[(exclude_prefix_rule, 'http://fake')])
+        self.assertEqual(1, hits[(exclude_prefix_rule, 'https://www.youtube.com')])
+        self.assertEqual(1, hits[(exclude_contains_rule, 'login')])
+        self.assertEqual(1, hits[(downloaded_rule, None)])
+
+        # hits are summed over batches
+        url_filter.filter(self.urls, set())
+        self.assertEqual(2, url_filter.hits[(exclude_contains_rule, 'login')])
+
+    def test_on_seen(self):
+        seen = []
+        url_filter = UrlFilter(['http'], [], [], on_seen=seen.append)
+        url_filter.filter(['http://some.url/page', 'http://some.url/downloaded'], {'http://some.url/downloaded'})
+        self.assertEqual(['http://some.url/downloaded'], seen)
+        # repeated link of one page is seen once
+        seen.clear()
+        url_filter.filter(['http://some.url/downloaded', 'http://some.url/downloaded'], {'http://some.url/downloaded'})
+        self.assertEqual(['http://some.url/downloaded'], seen)
+
+    def test_content_type(self):
+        url_filter = UrlFilter(['http'], [], [], content_type_filter=ContentTypeFilter(['application/pdf']))
+        links = url_filter.filter(['http://some.url/page', 'http://some.url/doc.pdf'], set())
+        self.assertEqual({'http://some.url/page'}, links)
+        self.assertEqual(1, url_filter.hits[(content_type_rule, 'application/pdf')])
+
+    def test_empty_rules(self):
+        # without include rules nothing is included
+        self.assertEqual(set(), UrlFilter([], [], []).filter(self.urls, set()))
+        self.assertEqual(set(self.urls), UrlFilter(['http'], [], []).filter(self.urls, set()))
+
+    def test_special_characters(self):
+        url_filter = UrlFilter(['http'], [], ['#', '?', 'javascript:void(0)'])
+        links = url_filter.filter(['http://some.url/#top', 'http://some.url/?a=b', 'http://some.url/a.b',
+                                   'http://some.url/javascript:void(0)'], set())
+        self.assertEqual({'http://some.url/a.b'}, links)
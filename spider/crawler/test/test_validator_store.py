@@ -0,0 +1,34 @@
+import os
+from unittest import TestCase
+
+from spider.crawler.validator_store import Validator, ValidatorStore
+
+
+class TestValidatorStore(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.validators_file = 'spider/crawler/test/outdir/validators.db'
+
+    def setUp(self):
+        if os.path.isfile(self.validators_file):
+            os.remove(self.validators_file)
+
+    def test_put_and_get(self):
+        validator = Validator('some_url', 'text/html', '"v1"', 'Wed, 21 Oct 2015 07:28:00 GMT', 'abc')
+        with ValidatorStore(self.validators_file, batch_size=2) as validators:
+            validators.put('http://some.url', validator)
+            self.assertEqual(validator, validators.get('http://some.url'))
+            self.assertIsNone(validators.get('http://some.url/a'))
+
+        # validators are kept for next crawl
+        with ValidatorStore(self.validators_file) as validators:
+            self.assertEqual(validator, validators.get('http://some.url'))
+            validators.put('http://some.url', validator._replace(etag='"v2"'))
+            self.assertEqual('"v2"', validators.get('http://some.url').etag)
+
+    def test_conditional_headers(self):
+        validator = Validator('some_url', 'text/html', '"v1"', 'Wed, 21 Oct 2015 07:28:00 GMT', 'abc')
+        self.assertEqual({'If-None-Match': '"v1"', 'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT'},
+                         ValidatorStore.conditional_headers(validator))
+        self.assertEqual({}, ValidatorStore.conditional_headers(validator._replace(etag=None, last_modified=None)))
@@ -0,0 +1,145 @@
+import logging
+import re
+import threading
+from collections import Counter
+from typing import Callable, Iterable, List, Optional, Pattern
+
+from spider.crawler.content_type_filter import ContentTypeFilter
+
+include_rule = "include_contains"
+exclude_prefix_rule = "exclude_prefixes"
+exclude_contains_rule = "exclude_contains"
+downloaded_rule = "downloaded"
+content_type_rule = "content_type"
+
+
+class PrefixTrie(object):
+
+    def __init__(self, prefixes: List[str]):
+        """
+        Trie of prefixes, allows to find matching prefix in time depending on url length only
+        :param prefixes: prefixes
+        """
+        super(PrefixTrie, self).__init__()
+        self.__root = {}
+        # marks end of prefix in trie node
+        self.__end = object()
+        for prefix in prefixes:
+            node = self.__root
+            for char in prefix:
+                node = node.setdefault(char, {})
+            node[self.__end] = prefix
+
+    def match(self, text: str) -> Optional[str]:
+        """
+        :param text: text
+        :return: shortest prefix of text, None if there is no such prefix
+        """
+        node = self.__root
+        if self.__end in node:
+            return node[self.__end]
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                return None
+            if self.__end in node:
+                return node[self.__end]
+        return None
+
+
+class UrlFilter(object):
+
+    def __init__(self, include_contains: List[str], exclude_prefixes: List[str], exclude_contains: List[str],
+                 on_seen: Callable[[str], None] = None, content_type_filter: ContentTypeFilter = None):
+        """
+        Compiled include/exclude rules for urls. Prefixes are kept in trie, phrases are joined into one regular
+        expression, so every url is checked in single pass instead of loop over all rules. Instead of logging every
+        dropped url, we count how many urls were dropped by every rule
+        :param include_contains: urls need to contain at least one phrase from this list
+        :param exclude_prefixes: urls with these prefixes are excluded
+        :param exclude_contains: urls containing these phrases are excluded
+        :param on_seen: called once per batch for every url dropped because it is downloaded already (e.g. to count
+                        inlinks)
+        :param content_type_filter: if defined, links to excluded content types are dropped (checked last, it can
+                                    send HEAD request)
+        """
+        super(UrlFilter, self).__init__()
+        self._ex_url_logger = logging.getLogger("spider.excluded.urls")
+        self.__include = self.__compile(include_contains)
+        self.__exclude_prefixes = PrefixTrie(exclude_prefixes)
+        self.__exclude_contains = self.__compile(exclude_contains)
+        self.__on_seen = on_seen
+        self.__content_type_filter = content_type_filter
+        self.__hits = Counter()
+        self.__lock = threading.Lock()
+
+    def filter(self, urls: Iterable[str], downloaded_urls: set) -> set:
+        """
+        filters batch of urls
+        :param urls: urls
+        :param downloaded_urls: downloaded urls are dropped too
+        :return: urls which pass all rules
+        """
+        hits = Counter()
+        result = set()
+        # same link repeated on one page counts as one inlink
+        linked = set()
+        for url in urls:
+            if not self.__include or not self.__include.search(url):
+                hits[(include_rule, None)] += 1
+                continue
+
+            prefix = self.__exclude_prefixes.match(url)
+            if prefix is not None:
+                hits[(exclude_prefix_rule, prefix)] += 1
+                continue
+
+            if self.__exclude_contains:
+                m = self.__exclude_contains.search(url)
+                if m:
+                    hits[(exclude_contains_rule, m.group(0))] += 1
+                    continue
+
+            if url in downloaded_urls:
+                hits[(downloaded_rule, None)] += 1
+                if self.__on_seen and url not in linked:
+                    linked.add(url)
+                    self.__on_seen(url)
+                continue
+
+            if self.__content_type_filter:
+                content_type = self.__content_type_filter.excluded(url)
+                if content_type:
+                    hits[(content_type_rule, content_type)] += 1
+                    continue
+            result.add(url)
+
+        with self.__lock:
+            self.__hits.update(hits)
+        return result
+
+    @property
+    def hits(self) -> Counter:
+        """
+        :return: number of dropped urls by rule, key is tuple (rule type, pattern)
+        """
+        with self.__lock:
+            return Counter(self.__hits)
+
+    def log_hits(self) -> None:
+        """
+        logs number of dropped urls for every rule
+        :return: None
+        """
+        for (rule, pattern), count in self.hits.most_common():
+            if pattern is None:
+                self._ex_url_logger.warning("Rule {} dropped {} urls".format(rule, count))
+            else:
+                self._ex_url_logger.warning("Rule {} '{}' dropped {} urls".format(rule, pattern, count))
+
+    @classmethod
+    def __compile(cls, phrases: List[str]) -> Optional[Pattern]:
+        if not phrases:
+            return None
+        # longer phrases first, so the most specific phrase is reported
+        return re.compile("|".join(re.escape(p) for p in sorted(set(phrases), key=len, reverse=True)))
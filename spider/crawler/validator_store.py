@@ -0,0 +1,99 @@
+import logging
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+from typing import Dict, Optional
+
+Validator = namedtuple("Validator", ["output_name", "content_type", "etag", "last_modified", "digest"])
+
+
+class ValidatorStore(object):
+
+    def __init__(self, validators_file: str, batch_size: int = 1000):
+        """
+        Cache validators (ETag, Last-Modified, sha256 of body) of downloaded urls kept in sqlite file, so next crawl
+        can send conditional requests and reuse output of pages which were not modified
+        :param validators_file: path to sqlite file
+        :param batch_size: changes are written into file in batches of this size
+        """
+        super(ValidatorStore, self).__init__()
+        self._logger = logging.getLogger(__name__)
+        self.__batch_size = batch_size
+        self.__pending = {}
+        self.__lock = threading.Lock()
+
+        validators_dir = os.path.dirname(validators_file)
+        if validators_dir:
+            os.makedirs(validators_dir, exist_ok=True)
+        self.__db = sqlite3.connect(validators_file, check_same_thread=False)
+        self.__db.execute("CREATE TABLE IF NOT EXISTS validators (url TEXT PRIMARY KEY, output_name TEXT, "
+                          "content_type TEXT, etag TEXT, last_modified TEXT, digest TEXT)")
+        self.__db.commit()
+
+    def get(self, url: str) -> Optional[Validator]:
+        """
+        :param url: url
+        :return: validator of url from this or previous crawl, None if url was never downloaded
+        """
+        with self.__lock:
+            validator = self.__pending.get(url)
+            if validator:
+                return validator
+            row = self.__db.execute("SELECT output_name, content_type, etag, last_modified, digest "
+                                    "FROM validators WHERE url = ?", (url,)).fetchone()
+        return Validator(*row) if row else None
+
+    def put(self, url: str, validator: Validator) -> None:
+        """
+        saves validator of downloaded url
+        :param url: url
+        :param validator: validator
+        :return: None
+        """
+        with self.__lock:
+            self.__pending[url] = validator
+            if len(self.__pending) >= self.__batch_size:
+                self.__flush()
+
+    @staticmethod
+    def conditional_headers(validator: Validator) -> Dict[str, str]:
+        """
+        :param validator: validator
+        :return: headers of conditional request, server answers 304 if content is not modified
+        """
+        headers = {}
+        if validator.etag:
+            headers["If-None-Match"] = validator.etag
+        if validator.last_modified:
+            headers["If-Modified-Since"] = validator.last_modified
+        return headers
+
+    def flush(self) -> None:
+        """
+        writes pending validators into file
+        :return: None
+        """
+        with self.__lock:
+            self.__flush()
+
+    def close(self) -> None:
+        """
+        writes pending validators and closes file
+        :return: None
+        """
+        self.flush()
+        self.__db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __flush(self) -> None:
+        pending, self.__pending = self.__pending, {}
+        with self.__db:
+            self.__db.executemany("INSERT OR REPLACE INTO validators VALUES (?, ?, ?, ?, ?, ?)",
+                                  [(url,) + tuple(v) for url, v in pending.items()])
+        self._logger.info("Saved validators of {} urls".format(len(pending)))
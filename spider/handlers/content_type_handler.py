@@ -1,12 +1,19 @@
 import logging
 from abc import ABCMeta, abstractmethod
+from typing import IO, Optional
+
+from spider.storage.storage import DirectoryStorage, Storage
 
 
 class ContentTypeHandler(metaclass=ABCMeta):
 
-    def __init__(self):
+    def __init__(self, storage: Storage = None):
+        """
+        :param storage: where results are saved, files in output dir (DirectoryStorage) by default
+        """
         self._logger = logging.getLogger(__name__)
         self._err_logger = logging.getLogger("spider.errors")
+        self.__storage = storage
 
     @abstractmethod
     def save_result(self, output_dir: str, output_name: str, obj) -> None:
@@ -18,3 +25,16 @@ class ContentTypeHandler(metaclass=ABCMeta):
         :return: none
         """
         pass
+
+    def spool_file(self) -> Optional[IO[bytes]]:
+        """
+        :return: file object streamed body of this content type is spooled into, None for spooled temporary file
+        """
+        return None
+
+    def get_storage(self, output_dir: str) -> Storage:
+        """
+        :param output_dir: output dir, used only if handler has no storage
+        :return: storage of results
+        """
+        return self.__storage if self.__storage else DirectoryStorage(output_dir)
@@ -1,6 +1,9 @@
+from typing import List
+
 from bs4 import BeautifulSoup
 
 from spider.handlers.content_type_handler import ContentTypeHandler
+from spider.storage.storage import html_kind, txt_kind
 
 
 class HtmlHandler(ContentTypeHandler):
@@ -13,11 +16,36 @@ class HtmlHandler(ContentTypeHandler):
         :param output_name: output file name
         :return: None
         """
-        with open("{}/html/{}.html".format(output_dir, output_name), "w", encoding="UTF-8") as f:
-            # noinspection PyTypeChecker
-            f.write(str(soup))
-        with open("{}/txt/{}.txt".format(output_dir, output_name), "w", encoding="UTF-8") as f:
-            f.write("\n".join(self.__extract_text(soup)))
+        storage = self.get_storage(output_dir)
+        # noinspection PyTypeChecker
+        storage.write(html_kind, "{}.html".format(output_name), str(soup).encode("UTF-8"))
+        storage.write(txt_kind, "{}.txt".format(output_name), "\n".join(self.__extract_text(soup)).encode("UTF-8"))
+
+    def save_content(self, output_dir: str, output_name: str, content: bytes) -> List[str]:
+        """
+        parses html page and saves it as save_result does
+        :param output_dir: output dir
+        :param output_name: output file name
+        :param content: html page
+        :return: hrefs of <a> tags
+        """
+        soup = BeautifulSoup(content, "lxml")
+        hrefs = self.__get_hrefs(soup)
+        self.save_result(output_dir, output_name, soup)
+        return hrefs
+
+    def get_hrefs(self, content: bytes) -> List[str]:
+        """
+        parses html page without saving it, e.g. page saved before
+        :param content: html page
+        :return: hrefs of <a> tags
+        """
+        return self.__get_hrefs(BeautifulSoup(content, "lxml"))
+
+    @classmethod
+    def __get_hrefs(cls, soup: BeautifulSoup) -> List[str]:
+        # sometimes we have <a></a>, we don't need it
+        return [link['href'] for link in soup.find_all('a', href=True) if link['href']]
 
     def __extract_text(self, soup: BeautifulSoup) -> set:
         """
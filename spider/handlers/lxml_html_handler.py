@@ -0,0 +1,95 @@
+from typing import List, Tuple
+
+from lxml import etree
+
+from spider.handlers.content_type_handler import ContentTypeHandler
+from spider.storage.storage import Storage, html_kind, txt_kind
+
+
+class LxmlHtmlHandler(ContentTypeHandler):
+
+    def __init__(self, skipped_tags: Tuple[str, ...] = ("script", "style"), storage: Storage = None):
+        """
+        Fast alternative to HtmlHandler. Page is parsed once by lxml and links and texts are collected in single
+        walk over the tree, original bytes are saved instead of serialized tree
+        :param skipped_tags: text of these tags is dropped
+        :param storage: where results are saved, files in output dir by default
+        """
+        super().__init__(storage)
+        self.__skipped_tags = frozenset(skipped_tags)
+
+    def save_result(self, output_dir: str, output_name: str, content: bytes) -> None:
+        """
+        save spider result as html file (for debug purpose) and as txt file with words (for word2vec)
+        :param content: html page
+        :param output_dir: output dir
+        :param output_name: output file name
+        :return: None
+        """
+        self.save_content(output_dir, output_name, content)
+
+    def save_content(self, output_dir: str, output_name: str, content: bytes) -> List[str]:
+        """
+        same as save_result, but hrefs found on page are returned
+        :param output_dir: output dir
+        :param output_name: output file name
+        :param content: html page
+        :return: hrefs of <a> tags
+        """
+        hrefs, texts = self.parse(content)
+        storage = self.get_storage(output_dir)
+        storage.write(html_kind, "{}.html".format(output_name), content)
+        storage.write(txt_kind, "{}.txt".format(output_name), "\n".join(texts).encode("UTF-8"))
+        return hrefs
+
+    def get_hrefs(self, content: bytes) -> List[str]:
+        """
+        parses html page without saving it, e.g. page saved before
+        :param content: html page
+        :return: hrefs of <a> tags
+        """
+        return self.parse(content)[0]
+
+    def parse(self, content: bytes) -> Tuple[List[str], List[str]]:
+        """
+        walks html tree once
+        :param content: html page
+        :return: hrefs of <a> tags and unique texts (at least 2 characters, without <script>, <style>)
+        """
+        try:
+            root = etree.fromstring(content, etree.HTMLParser())
+        except etree.XMLSyntaxError:
+            root = None
+        if root is None:
+            return [], []
+
+        hrefs = []
+        texts = []
+        seen = set()
+
+        def add_text(text):
+            if text:
+                stripped = text.strip()
+                if len(stripped) > 1 and stripped not in seen:
+                    seen.add(stripped)
+                    texts.append(stripped)
+
+        walker = etree.iterwalk(root, events=("start", "end"))
+        for event, element in walker:
+            tag = element.tag
+            if event == "start":
+                if tag in self.__skipped_tags:
+                    # text of <script>/<style> and their children is dropped, end event still comes
+                    walker.skip_subtree()
+                    continue
+                if tag == "a":
+                    href = element.get("href")
+                    if href:
+                        hrefs.append(href)
+                # comments and processing instructions have no string tag, their text is not page text
+                if isinstance(tag, str):
+                    add_text(element.text)
+            else:
+                # tail is text after the element, it belongs to parent
+                add_text(element.tail)
+        return hrefs, texts
@@ -0,0 +1,292 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from io import BytesIO, StringIO
+from typing import IO, Callable, List, Optional, Union
+
+from pdfminer3.converter import TextConverter
+from pdfminer3.layout import LAParams
+from pdfminer3.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer3.pdfpage import PDFPage
+
+from spider.crawler.metrics import Metrics, pdf_worker_stage, stage_metric
+from spider.utils.file_utils import map_file
+
+
+@contextmanager
+def open_pdf(source: Union[str, bytes, IO[bytes]]):
+    """
+    opens pdf for parser without copying it: bytes are wrapped into BytesIO, file is memory-mapped
+    :param source: path to pdf file, pdf content or seekable file object
+    :return: seekable file-like object
+    """
+    if isinstance(source, (bytes, bytearray)):
+        yield BytesIO(source)
+    elif hasattr(source, "read"):
+        source.seek(0)
+        yield source
+    else:
+        with map_file(source) as fp:
+            yield fp
+
+
+def count_pages(source: Union[str, bytes], password: str = "") -> int:
+    """
+    counts pages of pdf file (runs in worker process)
+    :param source: path to pdf file or pdf content
+    :param password: password if pdf is encrypted
+    :return: number of pages
+    """
+    with open_pdf(source) as fp:
+        return sum(1 for _ in PDFPage.get_pages(fp, set(), password=password, check_extractable=True))
+
+
+def extract_pages(source: Union[str, bytes], start: int, end: int, password: str = "",
+                  encoding: str = "utf-8") -> str:
+    """
+    extracts text from range of pages (runs in worker process)
+    :param source: path to pdf file or pdf content
+    :param start: first page (counted from 0)
+    :param end: page after last page
+    :param password: password if pdf is encrypted
+    :param encoding: pdf encoding
+    :return: text
+    """
+    with StringIO() as return_string:
+        resource_mgr = PDFResourceManager()
+        with TextConverter(resource_mgr, return_string, codec=encoding, laparams=LAParams()) as device:
+            interpreter = PDFPageInterpreter(resource_mgr, device)
+            with open_pdf(source) as fp:
+                for page in PDFPage.get_pages(fp, set(range(start, end)), password=password,
+                                              check_extractable=True):
+                    interpreter.process_page(page)
+            return return_string.getvalue()
+
+
+class PdfDocument(object):
+
+    def __init__(self, source: Union[str, bytes], name: str, save: Callable[[str], None], result: Future):
+        super(PdfDocument, self).__init__()
+        self.source = source
+        self.name = name
+        self.save = save
+        self.result = result
+        self.chunks: List[Optional[str]] = []
+        self.futures: List[Future] = []
+        self.remaining = 0
+        self.timer: Optional[threading.Timer] = None
+        self.finished = False
+        self.started = time.monotonic()
+        # increased when document is started again, callbacks of older tasks are ignored
+        self.generation = 0
+
+
+class PdfExtractionPool(object):
+
+    def __init__(self, workers: Optional[int] = None, pages_per_task: int = 20, timeout: float = 600.0,
+                 max_pages: int = 0, metrics: Metrics = None, max_pending: int = 0):
+        """
+        Extracts text from pdf files in worker processes, so crawl does not wait for slow pdfminer. Every document
+        is split into page ranges processed by different workers, text is written when all ranges are done. When
+        document times out while its task is running, worker processes are killed and replaced, documents which
+        lost their tasks this way are started again
+        :param workers: number of worker processes, number of cpus by default
+        :param pages_per_task: number of pages extracted by single task
+        :param timeout: max time (in seconds) for single document, after that document is dropped
+        :param max_pages: only first `max_pages` pages are extracted, all pages if 0
+        :param metrics: if defined, time from submit until text is saved is measured
+        :param max_pending: max number of submitted documents which are not done (2 * workers by default), submit
+                            waits when there are more
+        """
+        super(PdfExtractionPool, self).__init__()
+        self._logger = logging.getLogger(__name__)
+        self._err_logger = logging.getLogger("spider.errors")
+        self.__workers = workers if workers else os.cpu_count() or 1
+        self.__executor = ProcessPoolExecutor(max_workers=self.__workers)
+        self.__pending = threading.BoundedSemaphore(max_pending if max_pending > 0 else 2 * self.__workers)
+        self.__pages_per_task = max(pages_per_task, 1)
+        self.__timeout = timeout
+        self.__max_pages = max_pages
+        self.__metrics = metrics
+        self.__documents = set()
+        self.__lock = threading.Lock()
+        self.__idle = threading.Condition(self.__lock)
+
+    def submit(self, source: Union[str, bytes], save: Callable[[str], None], name: str = None) -> Future:
+        """
+        schedules text extraction, waits while `max_pending` documents are not done
+        :param source: path to pdf file (preferred, workers map the file) or pdf content (sent to every task)
+        :param save: called with extracted text when all pages are done (in thread of pool)
+        :param name: name of pdf in logs, path of pdf file by default
+        :return: future resolved with True when text is saved, False if text can't be extracted
+        """
+        self.__pending.acquire()
+        name = name if name else source if isinstance(source, str) else "pdf"
+        document = PdfDocument(source, name, save, Future())
+        with self.__lock:
+            self.__documents.add(document)
+        self.__start_timer(document)
+        self.__start(document)
+        return document.result
+
+    def wait(self) -> None:
+        """
+        waits until all submitted documents are done
+        :return: None
+        """
+        with self.__idle:
+            while self.__documents:
+                self.__idle.wait()
+
+    def shutdown(self) -> None:
+        """
+        waits for submitted documents and stops worker processes
+        :return: None
+        """
+        self.wait()
+        self.__executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def __start_timer(self, document: PdfDocument) -> None:
+        document.timer = threading.Timer(self.__timeout, self.__expire, (document,))
+        document.timer.daemon = True
+        document.timer.start()
+
+    def __start(self, document: PdfDocument) -> None:
+        with self.__lock:
+            if document.finished:
+                return
+            generation = document.generation
+            future = self.__executor.submit(count_pages, document.source)
+            document.futures = [future]
+        # callback of done future runs at once, so it is added without lock
+        future.add_done_callback(lambda f: self.__split(document, generation, f))
+
+    def __split(self, document: PdfDocument, generation: int, future: Future) -> None:
+        if self.__restart_if_lost(document, generation, future):
+            return
+        try:
+            pages = future.result()
+        except Exception as e:
+            self.__finish(document, None, "Text extraction is not possible for {}: {}".format(document.name, e))
+            return
+
+        if self.__max_pages and pages > self.__max_pages:
+            self._logger.info("Pdf {} has {} pages, only {} are extracted".format(document.name, pages,
+                                                                                  self.__max_pages))
+            pages = self.__max_pages
+        if pages == 0:
+            self.__finish(document, "", None)
+            return
+
+        ranges = [(start, min(start + self.__pages_per_task, pages))
+                  for start in range(0, pages, self.__pages_per_task)]
+        with self.__lock:
+            if document.finished or document.generation != generation:
+                return
+            document.chunks = [None] * len(ranges)
+            document.remaining = len(ranges)
+            document.futures = [self.__executor.submit(extract_pages, document.source, start, end)
+                                for start, end in ranges]
+            futures = list(document.futures)
+        for i, f in enumerate(futures):
+            f.add_done_callback(lambda done, index=i: self.__chunk_done(document, generation, index, done))
+
+    def __chunk_done(self, document: PdfDocument, generation: int, index: int, future: Future) -> None:
+        if self.__restart_if_lost(document, generation, future):
+            return
+        try:
+            text = future.result()
+        except Exception as e:
+            self.__finish(document, None, "Text extraction failed for {}: {}".format(document.name, e))
+            return
+
+        with self.__lock:
+            if document.finished or document.generation != generation:
+                return
+            document.chunks[index] = text
+            document.remaining -= 1
+            completed = document.remaining == 0
+        if completed:
+            self.__finish(document, "".join(document.chunks), None)
+
+    def __restart_if_lost(self, document: PdfDocument, generation: int, future: Future) -> bool:
+        """
+        :return: True if task is cancelled or lost with killed workers, document is started again if it is not done
+        """
+        if not future.cancelled() and not isinstance(future.exception(), BrokenProcessPool):
+            return False
+        with self.__lock:
+            if document.finished or document.generation != generation:
+                return True
+            document.generation += 1
+            # document didn't cause recycle, it gets whole timeout again
+            document.timer.cancel()
+            self.__start_timer(document)
+        self._logger.info("Task of pdf {} was lost with recycled workers, extraction starts again".format(
+            document.name))
+        self.__start(document)
+        return True
+
+    def __expire(self, document: PdfDocument) -> None:
+        with self.__lock:
+            running = any(f.running() for f in document.futures)
+        self.__finish(document, None, "Text extraction timed out after {}s for {}".format(self.__timeout,
+                                                                                          document.name))
+        if running:
+            self.__recycle()
+
+    def __recycle(self) -> None:
+        # running task can't be cancelled, worker stuck in it would be lost for the rest of crawl, so workers are
+        # killed and new ones take next tasks
+        with self.__lock:
+            executor = self.__executor
+            self.__executor = ProcessPoolExecutor(max_workers=self.__workers)
+        # noinspection PyProtectedMember
+        processes = list((executor._processes or {}).values())
+        for process in processes:
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+        self._logger.warning("{} pdf workers were recycled".format(len(processes)))
+
+    def __finish(self, document: PdfDocument, text: Optional[str], error: Optional[str]) -> None:
+        with self.__lock:
+            if document.finished:
+                return
+            document.finished = True
+        document.timer.cancel()
+        for f in document.futures:
+            # tasks which are already running can't be stopped, their result is ignored
+            f.cancel()
+
+        written = False
+        if error:
+            self._err_logger.error(error)
+        elif text:
+            try:
+                document.save(text)
+                written = True
+            except UnicodeEncodeError:
+                self._err_logger.error("Encoding problem for file {}".format(document.name))
+            except Exception as e:
+                self._err_logger.error("Can't save text of {}: {}".format(document.name, e))
+        if self.__metrics:
+            self.__metrics.observe(stage_metric, time.monotonic() - document.started, stage=pdf_worker_stage,
+                                   result="ok" if written else "error" if error else "empty")
+        # pdf content can be big, we don't need it any more
+        document.source = None
+        document.result.set_result(written)
+
+        with self.__idle:
+            self.__documents.discard(document)
+            self.__idle.notify_all()
+        self.__pending.release()
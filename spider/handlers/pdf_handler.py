@@ -1,5 +1,10 @@
+import os
+import shutil
+import threading
+from concurrent.futures import Executor, Future
 from io import StringIO
-from typing import Optional
+from tempfile import NamedTemporaryFile
+from typing import IO, Callable, Optional, Union
 
 from pdfminer3.converter import TextConverter
 from pdfminer3.layout import LAParams
@@ -8,37 +13,159 @@ from pdfminer3.pdfinterp import PDFResourceManager, PDFPageInterpreter
 from pdfminer3.pdfpage import PDFPage
 
 from spider.handlers.content_type_handler import ContentTypeHandler
+from spider.handlers.pdf_extraction_pool import PdfExtractionPool, open_pdf
+from spider.storage.storage import Storage, pdf2txt_kind, pdf_kind
 
 
 class PdfHandler(ContentTypeHandler):
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, pool: PdfExtractionPool = None, persist_pdf: bool = True, writer: Executor = None,
+                 storage: Storage = None):
+        """
+        :param pool: if defined, text is extracted in worker processes and written when they finish, otherwise text
+                     is extracted before save_result/extract returns
+        :param persist_pdf: if False, original pdf file is not saved, text is extracted from memory only
+        :param writer: if defined, original pdf file is saved in this executor, so parsing doesn't wait for disk
+        :param storage: where results are saved, files in output dir by default
+        """
+        super().__init__(storage)
+        self.__pool = pool
+        self.__persist_pdf = persist_pdf
+        self.__writer = writer
 
     def save_result(self, output_dir: str, output_name: str, content: bytes) -> None:
         """
-        save spider result as pdf file (for debug purpose) and as txt file with words (for word2vec)
+        save spider result as pdf file (for debug purpose) and as txt file with words (for word2vec). Text is
+        extracted from content in memory, pdf file is never read back
         :param content: pdf response
         :param output_dir: output dir
         :param output_name: output file name
         :return: None
         """
-        pdf_file = "{}/pdf/{}.pdf".format(output_dir, output_name)
-        with open(pdf_file, "wb") as f:
-            f.write(content)
+        if self.__persist_pdf:
+            self.__write(self.get_storage(output_dir).write, pdf_kind, "{}.pdf".format(output_name), content)
+        self.__extract(content, output_dir, output_name)
+
+    def save_stream(self, output_dir: str, output_name: str, stream: IO[bytes]) -> None:
+        """
+        same as save_result for body spooled into (temporary) file object, e.g. streamed from response. Handler takes
+        ownership of stream and closes it
+        :param output_dir: output dir
+        :param output_name: output file name
+        :param stream: seekable file object with pdf content
+        :return: None
+        """
+        # stream is closed when both workers and writer are done with it
+        release = self.__closer(stream, (1 if self.__pool else 0) + (1 if self.__persist_pdf else 0))
+        try:
+            if self.__pool:
+                self.__submit_file(stream, output_dir, output_name, release)
+            else:
+                self.__extract(stream, output_dir, output_name)
+        except Exception:
+            stream.close()
+            raise
+        if self.__persist_pdf:
+            self.__write(self.__write_stream, output_dir, output_name, stream, release)
+        elif not self.__pool:
+            stream.close()
 
-        text = self.__read_pdf(pdf_file)
+    def spool_file(self) -> Optional[IO[bytes]]:
+        """
+        :return: with pool, named temporary file (removed when closed), workers read body spooled into it by its path,
+                 None otherwise
+        """
+        if self.__pool:
+            return NamedTemporaryFile(prefix="spider-pdf-", suffix=".pdf")
+        return None
+
+    @classmethod
+    def raw_file(cls, output_dir: str, output_name: str) -> str:
+        """
+        :param output_dir: output dir
+        :param output_name: output file name
+        :return: path of original pdf file in directory layout
+        """
+        return "{}/pdf/{}.pdf".format(output_dir, output_name)
+
+    def __submit_file(self, stream: IO[bytes], output_dir: str, output_name: str, release: Callable[[], None]) -> None:
+        # workers in other processes can't read our file object, they get path of file body was spooled into (see
+        # spool_file) or of its copy, so pdf waiting for workers is not kept in memory
+        name = getattr(stream, "name", None)
+        if isinstance(name, str) and os.path.isfile(name):
+            stream.flush()
+            result = self.__extract(name, output_dir, output_name)
+            result.add_done_callback(lambda _: release())
+            return
+        stream.seek(0)
+        with NamedTemporaryFile(prefix="spider-pdf-", suffix=".pdf", delete=False) as f:
+            shutil.copyfileobj(stream, f)
+        try:
+            result = self.__extract(f.name, output_dir, output_name)
+        except Exception:
+            os.remove(f.name)
+            raise
+        result.add_done_callback(lambda _: os.remove(f.name))
+        release()
+
+    def __extract(self, source: Union[str, bytes, IO[bytes]], output_dir: str,
+                  output_name: str) -> Optional[Future]:
+        storage = self.get_storage(output_dir)
+        name = self.raw_file(output_dir, output_name)
+
+        def save_text(text: str) -> None:
+            storage.write(pdf2txt_kind, "{}.txt".format(output_name), text.encode("UTF-8"))
+
+        if self.__pool:
+            return self.__pool.submit(source, save_text, name)
+
+        text = self.__read_pdf(source, name)
         if text:
-            with open("{}/pdf2txt/{}.txt".format(output_dir, output_name), "w") as f:
-                try:
-                    f.write(text)
-                except UnicodeEncodeError:
-                    self._err_logger.error("Encoding problem for file {}".format(pdf_file))
+            try:
+                save_text(text)
+            except UnicodeEncodeError:
+                self._err_logger.error("Encoding problem for file {}".format(name))
+        return None
+
+    def __write(self, write, *args) -> None:
+        if self.__writer:
+            self.__writer.submit(write, *args)
+        else:
+            write(*args)
+
+    def __write_stream(self, output_dir: str, output_name: str, stream: IO[bytes],
+                       release: Callable[[], None]) -> None:
+        try:
+            stream.seek(0)
+            self.get_storage(output_dir).write_stream(pdf_kind, "{}.pdf".format(output_name), stream)
+        finally:
+            release()
+
+    @staticmethod
+    def __closer(stream: IO[bytes], users: int) -> Callable[[], None]:
+        """
+        :param stream: file object
+        :param users: number of users of stream
+        :return: function which closes stream when all users called it
+        """
+        lock = threading.Lock()
+        left = [users]
+
+        def release() -> None:
+            with lock:
+                left[0] -= 1
+                if left[0] > 0:
+                    return
+            stream.close()
+
+        return release
 
-    def __read_pdf(self, pdf_file: str, password: str="", encoding: str='utf-8', la_params=LAParams()) -> Optional[str]:
+    def __read_pdf(self, source: Union[str, bytes, IO[bytes]], name: str, password: str = "",
+                   encoding: str = 'utf-8', la_params=LAParams()) -> Optional[str]:
         """
-        read pdf content from bytes stream. If you want to
-        :param pdf_file: path to pdf file
+        read pdf content from bytes, file object or file
+        :param source: path to pdf file, pdf content or file object
+        :param name: name of pdf in logs
         :param password: password if pdf is encrypted
         :param encoding: pdf encoding
         :param la_params: parameters for converter
@@ -49,7 +176,7 @@ class PdfHandler(ContentTypeHandler):
             with TextConverter(resource_mgr, return_string, codec=encoding, laparams=la_params) as device:
                 interpreter = PDFPageInterpreter(resource_mgr, device)
                 try:
-                    with open(pdf_file, 'rb') as fp:
+                    with open_pdf(source) as fp:
                         i = 1
                         pages = [p for p in self.__get_pages(fp, password=password)]
                         for page in pages:
@@ -58,7 +185,7 @@ class PdfHandler(ContentTypeHandler):
                             i += 1
                         return return_string.getvalue()
                 except PDFTextExtractionNotAllowed:
-                    self._err_logger.error("Text extraction is not allowed for: {}".format(pdf_file))
+                    self._err_logger.error("Text extraction is not allowed for: {}".format(name))
                     return None
 
     @classmethod
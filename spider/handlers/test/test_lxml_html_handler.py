@@ -0,0 +1,52 @@
+import os
+import shutil
+from unittest import TestCase
+
+from spider.handlers.lxml_html_handler import LxmlHtmlHandler
+from spider.utils import file_utils
+
+
+class TestLxmlHtmlHandler(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.output_dir = 'spider/handlers/test/outdir'
+        self.output_name = 'lxml_html_handler'
+        self.html = b"<html>" \
+                    b"   <head><style>div {color: red}</style></head>" \
+                    b"   <body>" \
+                    b"       <div>some text</div>" \
+                    b"       <div>bla bla bla<script>var x = 'script text';<b>in script</b></script>after</div>" \
+                    b"       <!-- some comment -->" \
+                    b"       <a href='/next'>next article</a>" \
+                    b"       <a href=''>empty</a>" \
+                    b"       <div>some text</div>" \
+                    b"   </body>" \
+                    b"</html>"
+
+    def setUp(self):
+        if os.path.exists(self.output_dir):
+            shutil.rmtree(self.output_dir)
+        file_utils.create_dir_if_not_exist('{}/html'.format(self.output_dir))
+        file_utils.create_dir_if_not_exist('{}/txt'.format(self.output_dir))
+
+    def test_parse(self):
+        hrefs, texts = LxmlHtmlHandler().parse(self.html)
+        self.assertEqual(['/next'], hrefs)
+        self.assertEqual(['some text', 'bla bla bla', 'after', 'next article', 'empty'], texts)
+
+    def test_parse_empty_page(self):
+        self.assertEqual(([], []), LxmlHtmlHandler().parse(b''))
+
+    def test_save_content(self):
+        html_file = "{}/html/{}.html".format(self.output_dir, self.output_name)
+        txt_file = "{}/txt/{}.txt".format(self.output_dir, self.output_name)
+
+        hrefs = LxmlHtmlHandler().save_content(self.output_dir, self.output_name, self.html)
+
+        self.assertEqual(['/next'], hrefs)
+        # original page is saved
+        with open(html_file, "rb") as f:
+            self.assertEqual(self.html, f.read())
+        with open(txt_file, "r", encoding="UTF-8") as f:
+            self.assertEqual("some text\nbla bla bla\nafter\nnext article\nempty", f.read())
@@ -0,0 +1,124 @@
+import os
+import shutil
+import time
+from concurrent.futures import Future
+from io import BytesIO
+from unittest import TestCase, mock
+
+from spider.handlers.pdf_extraction_pool import PdfExtractionPool, count_pages, extract_pages
+from spider.handlers.pdf_handler import PdfHandler
+from spider.utils import file_utils
+
+
+def slow_count_pages(source: str) -> int:
+    # runs in worker process, pdf which never ends
+    if source == 'stuck.pdf':
+        time.sleep(60)
+    return count_pages(source)
+
+
+class TestPdfExtractionPool(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.output_dir = 'spider/handlers/test/outdir'
+        self.output_name = 'pdf_pool'
+        self.test_file = 'spider/handlers/test/test.pdf'
+        self.test_file2 = 'spider/handlers/test/test2.pdf'
+        self.txt_file = "{}/pdf2txt/{}.txt".format(self.output_dir, self.output_name)
+
+    def save_text(self, text: str) -> None:
+        with open(self.txt_file, "w", encoding="UTF-8") as f:
+            f.write(text)
+
+    def setUp(self):
+        if os.path.exists(self.output_dir):
+            shutil.rmtree(self.output_dir)
+        file_utils.create_dir_if_not_exist('{}/pdf'.format(self.output_dir))
+        file_utils.create_dir_if_not_exist('{}/pdf2txt'.format(self.output_dir))
+
+    def test_extract_by_page_ranges(self):
+        with PdfExtractionPool(2, pages_per_task=1) as pool:
+            result = pool.submit(self.test_file2, self.save_text)
+        self.assertTrue(result.result())
+
+        with open(self.txt_file, "r", encoding="UTF-8") as f:
+            self.assertEqual(extract_pages(self.test_file2, 0, 1000), f.read())
+
+    def test_max_pages(self):
+        with PdfExtractionPool(1, max_pages=1) as pool:
+            self.assertTrue(pool.submit(self.test_file2, self.save_text).result())
+
+        with open(self.txt_file, "r", encoding="UTF-8") as f:
+            self.assertEqual(extract_pages(self.test_file2, 0, 1), f.read())
+
+    def test_text_extraction_is_not_allowed(self):
+        with PdfExtractionPool(1) as pool:
+            self.assertFalse(pool.submit(self.test_file, self.save_text).result())
+        self.assertFalse(os.path.exists(self.txt_file))
+
+    def test_timeout(self):
+        with PdfExtractionPool(1, timeout=0.0) as pool:
+            self.assertFalse(pool.submit(self.test_file2, self.save_text).result())
+        self.assertFalse(os.path.exists(self.txt_file))
+
+    def test_pdf_handler_with_pool(self):
+        with open(self.test_file2, "rb") as f:
+            content = f.read()
+
+        with PdfExtractionPool(2) as pool:
+            PdfHandler(pool).save_result(self.output_dir, self.output_name, content)
+
+        with open(self.txt_file, "r", encoding="UTF-8") as f:
+            self.assertTrue("PDF files always print correctly on any printing device." in f.read())
+
+    @mock.patch('spider.handlers.pdf_extraction_pool.count_pages', new=slow_count_pages)
+    def test_stuck_workers_are_recycled(self):
+        started = time.monotonic()
+        with PdfExtractionPool(1, timeout=2.0) as pool:
+            stuck = pool.submit('stuck.pdf', self.save_text)
+            time.sleep(1.0)
+            # document waiting behind stuck one loses its task with killed worker and is started again
+            result = pool.submit(self.test_file2, self.save_text)
+            self.assertFalse(stuck.result(timeout=10))
+            self.assertTrue(result.result(timeout=10))
+        self.assertLess(time.monotonic() - started, 10)
+
+    @mock.patch('spider.handlers.pdf_extraction_pool.count_pages', new=slow_count_pages)
+    def test_max_pending(self):
+        with PdfExtractionPool(1, timeout=1.0, max_pending=1) as pool:
+            stuck = pool.submit('stuck.pdf', self.save_text)
+            # submit waits until stuck document is dropped
+            pool.submit(self.test_file2, self.save_text)
+            self.assertTrue(stuck.done())
+
+    def test_pdf_handler_sends_file_to_pool(self):
+        pool = mock.Mock()
+        pool.submit.return_value = Future()
+        with open(self.test_file2, "rb") as f:
+            PdfHandler(pool, persist_pdf=False).save_stream(self.output_dir, self.output_name, BytesIO(f.read()))
+        source = pool.submit.call_args[0][0]
+        with open(self.test_file2, "rb") as f, open(source, "rb") as copy:
+            self.assertEqual(f.read(), copy.read())
+        # copy is removed when text is extracted
+        pool.submit.return_value.set_result(True)
+        self.assertFalse(os.path.exists(source))
+
+    def test_pdf_handler_sends_spool_file_to_pool(self):
+        pool = mock.Mock()
+        pool.submit.return_value = Future()
+        handler = PdfHandler(pool)
+        stream = handler.spool_file()
+        with open(self.test_file2, "rb") as f:
+            content = f.read()
+        stream.write(content)
+        stream.seek(0)
+        handler.save_stream(self.output_dir, self.output_name, stream)
+        # workers get path of file body was spooled into, it is not copied
+        self.assertEqual(stream.name, pool.submit.call_args[0][0])
+        with open(PdfHandler.raw_file(self.output_dir, self.output_name), "rb") as f:
+            self.assertEqual(content, f.read())
+        # pdf is saved, but spool file is kept until text is extracted
+        self.assertTrue(os.path.exists(stream.name))
+        pool.submit.return_value.set_result(True)
+        self.assertFalse(os.path.exists(stream.name))
@@ -1,5 +1,7 @@
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
 from unittest import TestCase
 
 from spider.handlers.pdf_handler import PdfHandler
@@ -66,3 +68,33 @@ class TestPdfHandler(TestCase):
             self.assertTrue("PDF files always print correctly on any printing device." in content)
             self.assertTrue("Compact  PDF  files  are  smaller  than  their  source  files  and  download" in content)
             self.assertFalse("any printing device. PDF  files  always" in content)
+
+    def test_save_stream(self):
+        pdf_file = "{}/pdf/{}.pdf".format(self.output_dir, self.output_name)
+        txt_file = "{}/pdf2txt/{}.txt".format(self.output_dir, self.output_name)
+
+        with open(self.test_file2, "rb") as f:
+            content = f.read()
+        stream = SpooledTemporaryFile()
+        stream.write(content)
+        stream.seek(0)
+
+        with ThreadPoolExecutor(1) as writer:
+            PdfHandler(writer=writer).save_stream(self.output_dir, self.output_name, stream)
+
+        # original pdf is written in background and stream is closed
+        self.assertTrue(stream.closed)
+        with open(pdf_file, "rb") as f:
+            self.assertEqual(content, f.read())
+        with open(txt_file, "r") as f:
+            self.assertTrue("PDF files always print correctly on any printing device." in f.read())
+
+    def test_do_not_persist_pdf(self):
+        pdf_file = "{}/pdf/{}.pdf".format(self.output_dir, self.output_name)
+        txt_file = "{}/pdf2txt/{}.txt".format(self.output_dir, self.output_name)
+
+        with open(self.test_file2, "rb") as f:
+            PdfHandler(persist_pdf=False).save_result(self.output_dir, self.output_name, f.read())
+
+        self.assertFalse(os.path.exists(pdf_file))
+        self.assertTrue(os.path.exists(txt_file))
@@ -1,7 +1,11 @@
 import os
 import shutil
+import threading
+import zipfile
+from io import BytesIO
 from unittest import TestCase, mock
 
+from spider.crawler.output_manifest import OutputManifest, sharded_name, url_hash
 from spider.handlers.html_handler import HtmlHandler
 from spider.handlers.pdf_handler import PdfHandler
 from spider.handlers.zip_handler import ZipHandler
@@ -21,7 +25,12 @@ class TestZipHandler(TestCase):
             shutil.rmtree(self.output_dir)
         file_utils.create_dir_if_not_exist('{}/zip'.format(self.output_dir))
         file_utils.create_dir_if_not_exist('{}/txt'.format(self.output_dir))
-        file_utils.create_dir_if_not_exist('{}/unzipped'.format(self.output_dir))
+
+    def member_name(self, path, archive=None):
+        return sharded_name(url_hash('{}!/{}'.format(archive or self.output_name, path)))
+
+    def txt_file(self, path, archive=None):
+        return '{}/txt/{}.txt'.format(self.output_dir, self.member_name(path, archive))
 
     @mock.patch.object(PdfHandler, "save_result")
     @mock.patch.object(HtmlHandler, "save_result")
@@ -30,27 +39,109 @@ class TestZipHandler(TestCase):
         mock_pdf_handler.return_value = None
 
         zip_file = "{}/zip/{}.zip".format(self.output_dir, self.output_name)
-        img_file = "{}/unzipped/image.png".format(self.output_dir)
-        pdf_file = "{}/unzipped/test2.pdf".format(self.output_dir)
-        txt_file1 = "{}/txt/file1.txt".format(self.output_dir)
-        txt_file2 = "{}/txt/file2.txt".format(self.output_dir)
-        zip_in_zip_file = "{}/unzipped/child.zip".format(self.output_dir)
+        txt_file1 = self.txt_file("file1.txt")
+        txt_file2 = self.txt_file("file2.txt")
 
         # check if we start with empty dirs
         self.assertFalse(os.path.exists(zip_file))
-        self.assertFalse(os.path.exists(img_file))
-        self.assertFalse(os.path.exists(pdf_file))
         self.assertFalse(os.path.exists(txt_file1))
         self.assertFalse(os.path.exists(txt_file2))
-        self.assertFalse(os.path.exists(zip_in_zip_file))
 
         with open(self.zip_file, "rb") as f:
             handler = ZipHandler(mock_html_handler, mock_pdf_handler)
             handler.save_result(self.output_dir, self.output_name, f.read())
 
-        # unzipped dir must be cleaned at the end
+        # nothing is unzipped on disk
         self.assertTrue(os.path.exists(zip_file))
         self.assertTrue(os.path.exists(txt_file1))
         self.assertTrue(os.path.exists(txt_file2))
+        self.assertEqual(["zip"], [d for d in os.listdir(self.output_dir) if d not in ("txt",)])
 
         # we also do not check result for pdf_handler and html_handler, because there are tests for it
+        self.assertEqual([self.member_name("index.html")],
+                         [c[0][1] for c in mock_html_handler.save_content.call_args_list])
+        # path of pdf from nested zip contains path of nested zip
+        self.assertEqual({self.member_name("test2.pdf"), self.member_name("child.zip!/test2.pdf")},
+                         {c[0][1] for c in mock_pdf_handler.save_result.call_args_list})
+
+    def test_max_depth(self):
+        html_handler = mock.Mock()
+        pdf_handler = mock.Mock()
+        ZipHandler(html_handler, pdf_handler, max_depth=0).save_stream(self.output_dir, self.output_name,
+                                                                       open(self.zip_file, "rb"))
+
+        self.assertTrue(os.path.exists(self.txt_file("file1.txt")))
+        # nested zip is skipped
+        self.assertEqual([self.member_name("test2.pdf")], [c[0][1] for c in pdf_handler.save_result.call_args_list])
+
+    def test_size_limits(self):
+        html_handler = mock.Mock()
+        pdf_handler = mock.Mock()
+        # test2.pdf has 7945 bytes
+        ZipHandler(html_handler, pdf_handler, max_member_size=5000).save_stream(self.output_dir, self.output_name,
+                                                                                open(self.zip_file, "rb"))
+        self.assertFalse(pdf_handler.save_result.called)
+        self.assertTrue(html_handler.save_content.called)
+
+        # child.zip is bigger than what is left from total size
+        pdf_handler.reset_mock()
+        ZipHandler(html_handler, pdf_handler, max_total_size=10000).save_stream(self.output_dir, self.output_name,
+                                                                                open(self.zip_file, "rb"))
+        self.assertEqual([self.member_name("test2.pdf")], [c[0][1] for c in pdf_handler.save_result.call_args_list])
+
+    def test_compression_ratio(self):
+        html_handler = mock.Mock()
+        pdf_handler = mock.Mock()
+        content = BytesIO()
+        with zipfile.ZipFile(content, "w", zipfile.ZIP_DEFLATED) as f:
+            f.writestr("bomb.txt", b"0" * 1024 * 1024)
+            f.writestr("ok.txt", b"some text")
+
+        ZipHandler(html_handler, pdf_handler).save_result(self.output_dir, self.output_name, content.getvalue())
+
+        self.assertFalse(os.path.exists(self.txt_file("bomb.txt")))
+        self.assertTrue(os.path.exists(self.txt_file("ok.txt")))
+
+    def test_members_with_the_same_path(self):
+        manifest_file = '{}/manifest.tsv'.format(self.output_dir)
+        long_path = '/'.join(['directory'] * 40) + '/report.txt'
+        with OutputManifest(manifest_file) as manifest:
+            handler = ZipHandler(mock.Mock(), mock.Mock(), manifest=manifest)
+            for archive, text in (('first', b'first report'), ('second', b'second report')):
+                content = BytesIO()
+                with zipfile.ZipFile(content, "w") as f:
+                    f.writestr("report.txt", text)
+                    f.writestr(long_path, text)
+                handler.save_result(self.output_dir, archive, content.getvalue())
+
+        # members of different archives don't overwrite each other, long paths fit into file names
+        for archive, text in (('first', b'first report'), ('second', b'second report')):
+            for path in ('report.txt', long_path):
+                with open(self.txt_file(path, archive), 'rb') as f:
+                    self.assertEqual(text, f.read())
+        with open(manifest_file, encoding='UTF-8') as f:
+            self.assertEqual({'{}\t{}!/{}'.format(url_hash('{}!/{}'.format(archive, path)), archive, path)
+                              for archive in ('first', 'second') for path in ('report.txt', long_path)},
+                             {line.rstrip('\n') for line in f})
+
+    def test_members_waiting_for_handlers(self):
+        released = threading.Event()
+        html_handler = mock.Mock()
+        html_handler.save_content.side_effect = lambda *args: released.wait()
+        content = BytesIO()
+        with zipfile.ZipFile(content, "w") as f:
+            for i in range(10):
+                f.writestr("page{}.html".format(i), b"<html></html>")
+
+        read = zipfile.ZipFile.read
+        with mock.patch.object(zipfile.ZipFile, "read", autospec=True, side_effect=read) as mock_read:
+            handler = ZipHandler(html_handler, mock.Mock(), workers=1)
+            thread = threading.Thread(target=handler.save_result,
+                                      args=(self.output_dir, self.output_name, content.getvalue()))
+            thread.start()
+            thread.join(0.2)
+            # one member in handler and one waiting for it, next member is not read yet
+            self.assertEqual(2, mock_read.call_count)
+            released.set()
+            thread.join()
+        self.assertEqual(10, html_handler.save_content.call_count)
@@ -1,27 +1,82 @@
-import shutil
-from shutil import copyfile
-
-from bs4 import BeautifulSoup
-
+import os
+import threading
+import zipfile
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from typing import IO, Callable, List, Optional, Union
+
+from spider.crawler.output_manifest import OutputManifest, sharded_name, url_hash
 from spider.handlers.content_type_handler import ContentTypeHandler
 from spider.handlers.html_handler import HtmlHandler
+from spider.handlers.lxml_html_handler import LxmlHtmlHandler
 from spider.handlers.pdf_handler import PdfHandler
-from spider.utils.zip_utils import unzip_file
+from spider.storage.storage import Storage, txt_kind, zip_kind
+
+
+class ZipBudget(object):
+
+    def __init__(self, max_total_size: Optional[int]):
+        """
+        Decompressed bytes left for one zip file together with nested zip files
+        :param max_total_size: max number of decompressed bytes, unlimited if not defined
+        """
+        super(ZipBudget, self).__init__()
+        self.left = max_total_size
+
+    def take(self, size: int) -> bool:
+        """
+        :param size: decompressed size of member
+        :return: False if member doesn't fit into budget
+        """
+        if self.left is None:
+            return True
+        if size > self.left:
+            return False
+        self.left -= size
+        return True
 
 
 class ZipHandler(ContentTypeHandler):
 
-    def __init__(self, html_handler: HtmlHandler, pdf_handler: PdfHandler):
-        super().__init__()
+    def __init__(self, html_handler: Union[HtmlHandler, LxmlHtmlHandler], pdf_handler: PdfHandler,
+                 max_depth: int = 2, max_member_size: Optional[int] = 100 * 1024 * 1024,
+                 max_total_size: Optional[int] = 1024 * 1024 * 1024, max_ratio: Optional[float] = 100.0,
+                 workers: int = 4, storage: Storage = None, manifest: OutputManifest = None):
+        """
+        Zip members are read directly from archive (in memory or on disk), nothing is unzipped on disk.
+        Members are dispatched to html/pdf/txt handlers concurrently, at most 2 * `workers` decompressed members wait
+        for handlers (reading of next member waits until one of them is done). Member path `{archive}!/{path}` (output name of
+        archive, paths of nested zip files and of member) is hashed like url, so members of different archives don't
+        share output names and long paths fit into file names
+        :param html_handler: handler for html members
+        :param pdf_handler: handler for pdf members
+        :param max_depth: how deep we go into nested zip files, 0 means nested zip files are skipped
+        :param max_member_size: max decompressed size of single member, unlimited if not defined
+        :param max_total_size: max decompressed size of all members (nested zip files too), unlimited if not defined
+        :param max_ratio: max ratio of decompressed to compressed size of member (zip bombs), unlimited if not defined
+        :param workers: number of members processed at the same time
+        :param storage: where results are saved, files in output dir by default
+        :param manifest: if defined, path of every saved member is added, so its output name is mapped back
+        """
+        super().__init__(storage)
         self._ext_txt = '.txt'
         self._ext_html = '.html'
         self._ext_pdf = '.pdf'
-        self.__extensions = (self._ext_txt, self._ext_html, self._ext_pdf)
+        self._ext_zip = '.zip'
+        self.__extensions = (self._ext_txt, self._ext_html, self._ext_pdf, self._ext_zip)
 
         # inside zip we have to have reference to more specific handlers
         self.__html_handler = html_handler
         self.__pdf_handler = pdf_handler
 
+        self.__max_depth = max_depth
+        self.__max_member_size = max_member_size
+        self.__max_total_size = max_total_size
+        self.__max_ratio = max_ratio
+        self.__workers = max(workers, 1)
+        self.__manifest = manifest
+
     def save_result(self, output_dir: str, output_name: str, content: bytes) -> None:
         """
         save spider result as zip file (for debug purpose) and as txt file with words (for word2vec)
@@ -30,67 +85,122 @@ class ZipHandler(ContentTypeHandler):
         :param output_name: output file name
         :return: None
         """
-        structure = self.__save_and_unzip(output_dir, output_name, content)
-        self.__extract_text_from_files(output_dir, output_name, structure)
+        self.get_storage(output_dir).write(zip_kind, "{}.zip".format(output_name), content)
+        self.__process(BytesIO(content), output_dir, output_name)
 
-    def __extract_text_from_files(self, output_dir: str, output_name: str, structure: dict) -> None:
+    def save_stream(self, output_dir: str, output_name: str, stream: IO[bytes]) -> None:
         """
-        extracts text from each file extracted from zip file
-        :param output_dir: output directory
-        :param output_name: output name
-        :param structure: unzipped structure
+        same as save_result for body spooled into (temporary) file object, e.g. streamed from response. Members are
+        read directly from stream, handler takes ownership of stream and closes it
+        :param output_dir: output dir
+        :param output_name: output file name
+        :param stream: seekable file object with zip content
         :return: None
         """
-        # and iterate over unzipped files recursively
-        files = [f for f in structure['files'] if f.endswith(self.__extensions)]
-        for file in files:
-            file_name = "{}/{}".format(structure['root'], file)
-            if file_name.endswith(self._ext_html):
-                self.__extract_html(file_name, output_dir, file)
-
-            elif file_name.endswith(self._ext_pdf):
-                self.__extract_pdf(file_name, output_dir, file)
-
-            elif file_name.endswith(self._ext_txt):
-                self.__extract_txt(file_name, output_dir, file)
-
-            else:
-                self._err_logger.error("Weird extension for file: {}".format(file_name))
-
-        # clean unzipped dir for next zip files
-        shutil.rmtree(structure['root'])
-
-    @classmethod
-    def __extract_txt(cls, file_name, output_dir, r):
-        # TODO create txt handler
-        copyfile(file_name, "{}/txt/{}".format(output_dir, r))
-
-    def __extract_pdf(self, file_name, output_dir, output_name):
-        with open(file_name, "rb") as f:
-            content = f.read()
-            self.__pdf_handler.save_result(output_dir, output_name, content)
-
-    def __extract_html(self, file_name, output_dir, output_name):
-        with open(file_name, "r") as f:
-            content = f.read()
-            self.__html_handler.save_result(output_dir, output_name, BeautifulSoup(content, "lxml"))
-            # we do not go deeper even if html contain links
-
-    @classmethod
-    def __save_and_unzip(cls, output_dir: str, output_name: str, content: bytes) -> dict:
+        with stream:
+            self.__process(stream, output_dir, output_name)
+            stream.seek(0)
+            self.get_storage(output_dir).write_stream(zip_kind, "{}.zip".format(output_name), stream)
+
+    def __process(self, archive: IO[bytes], output_dir: str, output_name: str) -> None:
+        futures = []
+        pending = threading.BoundedSemaphore(2 * self.__workers)
+        with ThreadPoolExecutor(self.__workers, "zip") as executor:
+            self.__dispatch(archive, output_name, output_dir, 0, ZipBudget(self.__max_total_size), executor, pending,
+                            futures)
+        for future in futures:
+            if future.exception():
+                self._err_logger.error("Can't process member of zip file {}: {}".format(output_name,
+                                                                                       future.exception()))
+
+    def __dispatch(self, archive: IO[bytes], archive_path: str, output_dir: str, depth: int, budget: ZipBudget,
+                   executor: ThreadPoolExecutor, pending: threading.BoundedSemaphore, futures: List[Future]) -> None:
         """
-        we save zip file and unzip its content
-        :param content: zip file binary content
-        :param output_dir: output directory
-        :param output_name: output file name
-        :return: unzipped structure
+        reads members of zip file one by one and dispatches them to handlers
+        :param archive: zip file
+        :param archive_path: output name of zip file, followed by paths of nested zip files
+        :param output_dir: output dir
+        :param depth: depth of nested zip file
+        :param budget: decompressed bytes left
+        :param executor: executor for handlers
+        :param pending: members dispatched to handlers and not done yet
+        :param futures: futures of dispatched members
+        :return: None
+        """
+        try:
+            zip_file = zipfile.ZipFile(archive)
+        except zipfile.BadZipFile:
+            self._err_logger.error("Bad zip file: {}".format(archive_path))
+            return
+
+        with zip_file:
+            for info in zip_file.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(self.__extensions):
+                    continue
+                path = "{}!/{}".format(archive_path, info.filename)
+                extension = os.path.splitext(info.filename)[1].lower()
+                if extension == self._ext_zip and depth >= self.__max_depth:
+                    self._logger.info("Nested zip file {} is too deep, skip it".format(path))
+                    continue
+
+                if extension != self._ext_zip:
+                    # waits while handlers are behind, so decompressed members don't pile up in memory
+                    pending.acquire()
+                content = self.__read(zip_file, info, path, budget)
+                if content is None:
+                    if extension != self._ext_zip:
+                        pending.release()
+                    continue
+
+                if extension == self._ext_zip:
+                    self.__dispatch(BytesIO(content), path, output_dir, depth + 1, budget, executor, pending, futures)
+                    continue
+                if extension == self._ext_html:
+                    save = self.__extract_html
+                elif extension == self._ext_pdf:
+                    save = self.__pdf_handler.save_result
+                else:
+                    save = self.__extract_txt
+                future = executor.submit(self.__save_member, save, output_dir, path, content)
+                future.add_done_callback(lambda _: pending.release())
+                futures.append(future)
+
+    def __read(self, zip_file: zipfile.ZipFile, info: zipfile.ZipInfo, name: str,
+               budget: ZipBudget) -> Optional[bytes]:
         """
-        # we save zip file
-        zip_file = "{}/zip/{}.zip".format(output_dir, output_name)
-        with open(zip_file, "wb") as f:
-            f.write(content)
-
-        # we extract zip file
-        zip_output_dir = "{}/unzipped".format(output_dir)
-        structure = unzip_file(zip_file, zip_output_dir)
-        return structure
+        reads member if it passes size limits
+        :return: decompressed member, None if member is too big
+        """
+        if self.__max_member_size and info.file_size > self.__max_member_size:
+            self._err_logger.warning("Member {} has {} bytes, skip it".format(name, info.file_size))
+            return None
+        if self.__max_ratio and info.file_size > self.__max_ratio * max(info.compress_size, 1):
+            self._err_logger.warning("Member {} has compression ratio over {}, skip it".format(name,
+                                                                                               self.__max_ratio))
+            return None
+        if not budget.take(info.file_size):
+            self._err_logger.warning("Zip file is bigger than {} bytes, skip member {}".format(self.__max_total_size,
+                                                                                               name))
+            return None
+
+        # zipfile never decompresses more than declared size, member with wrong size fails on crc check
+        try:
+            return zip_file.read(info)
+        except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+            self._err_logger.error("Can't read member {}: {}".format(name, e))
+            return None
+
+    def __save_member(self, save: Callable[[str, str, bytes], None], output_dir: str, path: str,
+                      content: bytes) -> None:
+        # member is named like downloaded url, manifest maps hash back to path of member
+        save(output_dir, sharded_name(url_hash(path)), content)
+        if self.__manifest:
+            self.__manifest.add(path)
+
+    def __extract_txt(self, output_dir: str, output_name: str, content: bytes) -> None:
+        # TODO create txt handler
+        self.get_storage(output_dir).write(txt_kind, "{}.txt".format(output_name), content)
+
+    def __extract_html(self, output_dir: str, output_name: str, content: bytes) -> None:
+        # we do not go deeper even if html contain links
+        self.__html_handler.save_content(output_dir, output_name, content)
@@ -0,0 +1,73 @@
+import logging
+import os
+from typing import IO, Iterator, Tuple
+
+from spider.storage.storage import DirectoryStorage, Storage
+from spider.utils.zip_utils import ZipArchiver
+
+
+class ArchivingStorage(Storage):
+
+    def __init__(self, storage: Storage, archiver: ZipArchiver, output_dir: str):
+        """
+        Every record saved into `storage` is appended into zip file as soon as it is written, so output doesn't have
+        to be zipped after crawl. Members are named {output_dir}/{kind}/{name} as files zipped from output dir
+        :param storage: storage records are saved into
+        :param archiver: zip file
+        :param output_dir: output dir, prefix of member names
+        """
+        super(ArchivingStorage, self).__init__()
+        self._logger = logging.getLogger(__name__)
+        self.__storage = storage
+        self.__archiver = archiver
+        self.__prefix = os.path.normpath(os.path.splitdrive(output_dir)[1]).lstrip(os.sep).replace(os.sep, "/")
+
+    def write(self, kind: str, name: str, content: bytes) -> None:
+        self.__storage.write(kind, name, content)
+        self.__archiver.add(self.arcname(kind, name), content)
+
+    def write_stream(self, kind: str, name: str, stream: IO[bytes]) -> None:
+        position = stream.tell()
+        self.__storage.write_stream(kind, name, stream)
+        stream.seek(position)
+        self.__archiver.add_stream(self.arcname(kind, name), stream)
+
+    def read(self, kind: str, name: str) -> bytes:
+        return self.__storage.read(kind, name)
+
+    def open(self, kind: str, name: str) -> IO[bytes]:
+        return self.__storage.open(kind, name)
+
+    def exists(self, kind: str, name: str) -> bool:
+        return self.__storage.exists(kind, name)
+
+    def remove(self, kind: str, name: str) -> None:
+        # member which is archived already stays in zip file
+        self.__storage.remove(kind, name)
+
+    def records(self) -> Iterator[Tuple[str, str]]:
+        return self.__storage.records()
+
+    def archive_existing(self) -> int:
+        """
+        appends records saved before (e.g. by previous crawl on resume) into zip file
+        :return: number of archived records
+        """
+        count = 0
+        for kind, name in self.__storage.records():
+            if isinstance(self.__storage, DirectoryStorage):
+                # file is read by archiver worker
+                self.__archiver.add_file(self.__storage.path(kind, name), self.arcname(kind, name))
+            else:
+                self.__archiver.add(self.arcname(kind, name), self.__storage.read(kind, name))
+            count += 1
+        self._logger.info("Archived {} records saved before".format(count))
+        return count
+
+    def arcname(self, kind: str, name: str) -> str:
+        """
+        :param kind: kind of record
+        :param name: file name
+        :return: name of zip member
+        """
+        return "{}/{}/{}".format(self.__prefix, kind, name)
@@ -0,0 +1,40 @@
+from typing import IO, Iterator, Tuple
+
+from spider.crawler.metrics import Metrics, write_stage
+from spider.storage.storage import Storage
+
+
+class MeteredStorage(Storage):
+
+    def __init__(self, storage: Storage, metrics: Metrics):
+        """
+        Measures time of writes into `storage` (write stage, labelled by kind of record)
+        :param storage: storage records are saved into
+        :param metrics: metrics
+        """
+        super(MeteredStorage, self).__init__()
+        self.__storage = storage
+        self.__metrics = metrics
+
+    def write(self, kind: str, name: str, content: bytes) -> None:
+        with self.__metrics.time(write_stage, kind=kind):
+            self.__storage.write(kind, name, content)
+
+    def write_stream(self, kind: str, name: str, stream: IO[bytes]) -> None:
+        with self.__metrics.time(write_stage, kind=kind):
+            self.__storage.write_stream(kind, name, stream)
+
+    def read(self, kind: str, name: str) -> bytes:
+        return self.__storage.read(kind, name)
+
+    def open(self, kind: str, name: str) -> IO[bytes]:
+        return self.__storage.open(kind, name)
+
+    def exists(self, kind: str, name: str) -> bool:
+        return self.__storage.exists(kind, name)
+
+    def remove(self, kind: str, name: str) -> None:
+        self.__storage.remove(kind, name)
+
+    def records(self) -> Iterator[Tuple[str, str]]:
+        return self.__storage.records()
@@ -0,0 +1,123 @@
+import logging
+import threading
+from io import BytesIO
+from queue import Queue
+from typing import IO, Dict, Iterator, List, Tuple
+
+from spider.storage.storage import Storage
+
+
+class QueuedStorage(Storage):
+
+    def __init__(self, storage: Storage, workers: int = 2, queue_size: int = 100):
+        """
+        Records are written into `storage` by writer threads, so slow disk doesn't block download and parsing.
+        Queue of records is bounded, when writers fall behind, write blocks (backpressure). Record waiting in queue
+        can be read already. Streams (big pdf and zip files spooled into temporary file) are written directly.
+        After close, records are written directly too (e.g. text of pdf files finished by workers later)
+        :param storage: storage records are saved into
+        :param workers: number of writer threads
+        :param queue_size: max number of records waiting for write
+        """
+        super(QueuedStorage, self).__init__()
+        self._err_logger = logging.getLogger("spider.errors")
+        self.__storage = storage
+        self.__queue = Queue(queue_size)
+        self.__pending: Dict[Tuple[str, str], bytes] = {}
+        self.__lock = threading.Condition()
+        self.__closed = False
+        # writes which are putting record into queue
+        self.__putting = 0
+        self.__threads: List[threading.Thread] = []
+        for number in range(max(workers, 1)):
+            thread = threading.Thread(target=self.__run, name="writer-{}".format(number), daemon=True)
+            thread.start()
+            self.__threads.append(thread)
+
+    def write(self, kind: str, name: str, content: bytes) -> None:
+        with self.__lock:
+            closed = self.__closed
+            if not closed:
+                self.__pending[(kind, name)] = content
+                self.__putting += 1
+        if closed:
+            self.__storage.write(kind, name, content)
+            return
+        try:
+            self.__queue.put((kind, name, content))
+        finally:
+            with self.__lock:
+                self.__putting -= 1
+                self.__lock.notify_all()
+
+    def write_stream(self, kind: str, name: str, stream: IO[bytes]) -> None:
+        with self.__lock:
+            self.__pending.pop((kind, name), None)
+        self.__storage.write_stream(kind, name, stream)
+
+    def read(self, kind: str, name: str) -> bytes:
+        with self.__lock:
+            content = self.__pending.get((kind, name))
+        return content if content is not None else self.__storage.read(kind, name)
+
+    def open(self, kind: str, name: str) -> IO[bytes]:
+        with self.__lock:
+            content = self.__pending.get((kind, name))
+        return BytesIO(content) if content is not None else self.__storage.open(kind, name)
+
+    def exists(self, kind: str, name: str) -> bool:
+        with self.__lock:
+            if (kind, name) in self.__pending:
+                return True
+        return self.__storage.exists(kind, name)
+
+    def remove(self, kind: str, name: str) -> None:
+        # queued write of the record can't recreate it after remove
+        self.flush()
+        self.__storage.remove(kind, name)
+
+    def records(self) -> Iterator[Tuple[str, str]]:
+        self.flush()
+        return self.__storage.records()
+
+    def flush(self) -> None:
+        """
+        waits until all queued records are written
+        :return: None
+        """
+        self.__queue.join()
+
+    def close(self) -> None:
+        """
+        writes queued records and stops writers
+        :return: None
+        """
+        with self.__lock:
+            if self.__closed:
+                return
+            self.__closed = True
+            # records of running writes are queued before writers are stopped
+            self.__lock.wait_for(lambda: self.__putting == 0)
+        for _ in self.__threads:
+            self.__queue.put(None)
+        for thread in self.__threads:
+            thread.join()
+        self.__threads = []
+
+    def __run(self) -> None:
+        while True:
+            item = self.__queue.get()
+            try:
+                if item is None:
+                    return
+                kind, name, content = item
+                try:
+                    self.__storage.write(kind, name, content)
+                except Exception as e:
+                    self._err_logger.error("Can't write {}/{}: {}".format(kind, name, e))
+                with self.__lock:
+                    # record can be queued again meanwhile
+                    if self.__pending.get((kind, name)) is content:
+                        del self.__pending[(kind, name)]
+            finally:
+                self.__queue.task_done()
@@ -0,0 +1,247 @@
+import gzip
+import json
+import logging
+import os
+import shutil
+import threading
+import zlib
+from tempfile import SpooledTemporaryFile
+from typing import IO, Dict, Iterator, Optional, Tuple, Union
+
+from spider.storage.storage import DirectoryStorage, Storage
+
+ShardRecord = Tuple[str, str, bytes]
+# compressed record of streamed content bigger than this is spooled into temporary file
+spool_size = 8 * 1024 * 1024
+
+
+def iter_shard(shard_file: str, chunk_size: int = 64 * 1024) -> Iterator[Tuple[int, int, str, str, bytes]]:
+    """
+    reads shard file record by record, without index
+    :param shard_file: path to shard file
+    :param chunk_size: size of chunks read from file
+    :return: offset and compressed length of record, kind, name and content of record
+    """
+    offset = 0
+    with open(shard_file, "rb") as f:
+        while True:
+            f.seek(offset)
+            decompressor = zlib.decompressobj(wbits=31)
+            parts = []
+            read = 0
+            while not decompressor.eof:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    # shard which was not closed properly ends with partial record
+                    return
+                try:
+                    parts.append(decompressor.decompress(chunk))
+                except zlib.error:
+                    return
+                read += len(chunk)
+            length = read - len(decompressor.unused_data)
+            yield (offset, length) + parse_record(b"".join(parts))
+            offset += length
+
+
+def parse_record(record: bytes) -> ShardRecord:
+    """
+    :param record: decompressed record, json header line followed by content
+    :return: kind, name and content of record
+    """
+    header_end = record.index(b"\n")
+    header = json.loads(record[:header_end].decode("UTF-8"))
+    return header["kind"], header["name"], record[header_end + 1:header_end + 1 + header["size"]]
+
+
+class ShardedStorage(Storage):
+
+    def __init__(self, storage_dir: str, shard_size: int = 256 * 1024 * 1024, compress_level: int = 6):
+        """
+        Records are appended into few big shard files instead of one file per page. Every record is separate gzip
+        member (json header line with kind, name and size followed by content), so shard can be read as one gzip
+        stream and every record can be decompressed alone. Position of every record is kept in index file
+        (json lines), index is loaded into memory for random access.
+        Shards of previous crawl are kept and new records go into new shard. Records written after last flush of
+        index are lost if crawl is killed, index is rebuilt from shards if index file is missing
+        :param storage_dir: directory with shard files and index
+        :param shard_size: new shard file is started when current one is bigger than this (in bytes)
+        :param compress_level: gzip compression level of records
+        """
+        super(ShardedStorage, self).__init__()
+        self._logger = logging.getLogger(__name__)
+        self.__storage_dir = storage_dir
+        self.__shard_size = shard_size
+        self.__compress_level = compress_level
+        self.__index_file = "{}/index.jsonl".format(storage_dir)
+        # (kind, name) -> (shard, offset, length)
+        self.__index: Dict[Tuple[str, str], Tuple[int, int, int]] = {}
+        self.__lock = threading.Lock()
+        self.__shard: Optional[IO[bytes]] = None
+        self.__shard_number = -1
+        self.__index_writer: Optional[IO[str]] = None
+
+        os.makedirs(storage_dir, exist_ok=True)
+        shards = self.__shard_numbers()
+        if os.path.isfile(self.__index_file):
+            self.__load_index()
+        elif shards:
+            self.__rebuild_index(shards)
+        self.__next_shard = shards[-1] + 1 if shards else 0
+
+    def write(self, kind: str, name: str, content: bytes) -> None:
+        header = json.dumps({"kind": kind, "name": name, "size": len(content)}).encode("UTF-8")
+        record = gzip.compress(header + b"\n" + content, self.__compress_level, mtime=0)
+        self.__append(kind, name, record, len(record))
+
+    def write_stream(self, kind: str, name: str, stream: IO[bytes], chunk_size: int = 64 * 1024) -> None:
+        # record is compressed chunk by chunk (big one into temporary file), so body is never whole in memory
+        start = stream.tell()
+        size = stream.seek(0, os.SEEK_END) - start
+        stream.seek(start)
+        header = json.dumps({"kind": kind, "name": name, "size": size}).encode("UTF-8")
+        compressor = zlib.compressobj(self.__compress_level, zlib.DEFLATED, 31)
+        with SpooledTemporaryFile(max_size=spool_size, prefix="spider-record-") as record:
+            record.write(compressor.compress(header + b"\n"))
+            for chunk in iter(lambda: stream.read(chunk_size), b""):
+                record.write(compressor.compress(chunk))
+            record.write(compressor.flush())
+            length = record.tell()
+            record.seek(0)
+            self.__append(kind, name, record, length)
+
+    def read(self, kind: str, name: str) -> bytes:
+        with self.__lock:
+            shard, offset, length = self.__index[(kind, name)]
+        with open(self.shard_file(shard), "rb") as f:
+            f.seek(offset)
+            return parse_record(gzip.decompress(f.read(length)))[2]
+
+    def exists(self, kind: str, name: str) -> bool:
+        with self.__lock:
+            return (kind, name) in self.__index
+
+    def remove(self, kind: str, name: str) -> None:
+        with self.__lock:
+            if self.__index.pop((kind, name), None) is None:
+                return
+            # record stays in shard, only index forgets it
+            self.__open_index_writer()
+            self.__index_writer.write(json.dumps({"kind": kind, "name": name, "removed": True}) + "\n")
+
+    def records(self) -> Iterator[Tuple[str, str]]:
+        with self.__lock:
+            keys = sorted(self.__index)
+        return iter(keys)
+
+    def flush(self) -> None:
+        """
+        writes index and current shard to disk
+        :return: None
+        """
+        with self.__lock:
+            if self.__shard:
+                self.__shard.flush()
+            if self.__index_writer:
+                self.__index_writer.flush()
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__shard:
+                self.__shard.close()
+                self.__shard = None
+            if self.__index_writer:
+                self.__index_writer.close()
+                self.__index_writer = None
+
+    def shard_file(self, shard: int) -> str:
+        """
+        :param shard: number of shard
+        :return: path of shard file
+        """
+        return "{}/shard-{:05d}.gz".format(self.__storage_dir, shard)
+
+    def __append(self, kind: str, name: str, record: Union[bytes, IO[bytes]], length: int) -> None:
+        with self.__lock:
+            if self.__shard is None or self.__shard.tell() >= self.__shard_size:
+                self.__roll()
+            offset = self.__shard.tell()
+            if isinstance(record, bytes):
+                self.__shard.write(record)
+            else:
+                shutil.copyfileobj(record, self.__shard)
+            # record can be read right after it is written
+            self.__shard.flush()
+            self.__index[(kind, name)] = (self.__shard_number, offset, length)
+            self.__index_writer.write(json.dumps({"kind": kind, "name": name, "shard": self.__shard_number,
+                                                  "offset": offset, "length": length}) + "\n")
+
+    def __roll(self) -> None:
+        if self.__shard:
+            self.__shard.close()
+            self._logger.info("Shard {} is full".format(self.shard_file(self.__shard_number)))
+        self.__shard_number = self.__next_shard
+        self.__next_shard += 1
+        self.__shard = open(self.shard_file(self.__shard_number), "ab")
+        self.__open_index_writer()
+        self.__index_writer.flush()
+
+    def __open_index_writer(self) -> None:
+        if self.__index_writer is None:
+            partial = False
+            if os.path.isfile(self.__index_file) and os.path.getsize(self.__index_file):
+                with open(self.__index_file, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    partial = f.read(1) != b"\n"
+            self.__index_writer = open(self.__index_file, "a", encoding="UTF-8")
+            if partial:
+                # partial line of killed crawl must not swallow our first entry
+                self.__index_writer.write("\n")
+
+    def __shard_numbers(self):
+        numbers = []
+        for file_name in os.listdir(self.__storage_dir):
+            if file_name.startswith("shard-") and file_name.endswith(".gz"):
+                numbers.append(int(file_name[len("shard-"):-len(".gz")]))
+        return sorted(numbers)
+
+    def __load_index(self) -> None:
+        with open(self.__index_file, "r", encoding="UTF-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # last line is partial if crawl was killed
+                    continue
+                key = (entry["kind"], entry["name"])
+                if entry.get("removed"):
+                    self.__index.pop(key, None)
+                else:
+                    self.__index[key] = (entry["shard"], entry["offset"], entry["length"])
+
+    def __rebuild_index(self, shards) -> None:
+        self._logger.info("Index {} is missing, rebuild it from shards".format(self.__index_file))
+        self.__open_index_writer()
+        for shard in shards:
+            for offset, length, kind, name, _ in iter_shard(self.shard_file(shard)):
+                self.__index[(kind, name)] = (shard, offset, length)
+        for (kind, name), (shard, offset, length) in sorted(self.__index.items()):
+            self.__index_writer.write(json.dumps({"kind": kind, "name": name, "shard": shard,
+                                                  "offset": offset, "length": length}) + "\n")
+        self.__index_writer.flush()
+
+
+def convert_to_directory(storage: Storage, output_dir: str) -> int:
+    """
+    copies records into directory layout ({output_dir}/{kind}/{name}), e.g. from sharded storage
+    :param storage: source storage
+    :param output_dir: output dir
+    :return: number of copied records
+    """
+    directory = DirectoryStorage(output_dir)
+    directory.create_dirs()
+    count = 0
+    for kind, name in storage.records():
+        directory.write(kind, name, storage.read(kind, name))
+        count += 1
+    return count
@@ -0,0 +1,174 @@
+import os
+import shutil
+import threading
+from abc import ABCMeta, abstractmethod
+from io import BytesIO
+from typing import IO, Iterator, Tuple
+
+from spider.utils import file_utils
+
+html_kind = "html"
+txt_kind = "txt"
+pdf_kind = "pdf"
+pdf2txt_kind = "pdf2txt"
+zip_kind = "zip"
+kinds = (html_kind, txt_kind, pdf_kind, pdf2txt_kind, zip_kind)
+
+
+class Storage(metaclass=ABCMeta):
+    """
+    Output of crawl. Every record is identified by kind (html, txt, pdf, pdf2txt, zip) and name of file
+    """
+
+    @abstractmethod
+    def write(self, kind: str, name: str, content: bytes) -> None:
+        """
+        saves record, record with the same kind and name is replaced
+        :param kind: kind of record
+        :param name: file name
+        :param content: content
+        :return: None
+        """
+        pass
+
+    def write_stream(self, kind: str, name: str, stream: IO[bytes]) -> None:
+        """
+        same as write for content in file object, stream is read from its current position
+        :param kind: kind of record
+        :param name: file name
+        :param stream: file object
+        :return: None
+        """
+        self.write(kind, name, stream.read())
+
+    @abstractmethod
+    def read(self, kind: str, name: str) -> bytes:
+        """
+        :param kind: kind of record
+        :param name: file name
+        :return: content of record, KeyError if record doesn't exist
+        """
+        pass
+
+    def open(self, kind: str, name: str) -> IO[bytes]:
+        """
+        :param kind: kind of record
+        :param name: file name
+        :return: seekable file object with content of record, caller closes it
+        """
+        return BytesIO(self.read(kind, name))
+
+    @abstractmethod
+    def exists(self, kind: str, name: str) -> bool:
+        """
+        :param kind: kind of record
+        :param name: file name
+        :return: True if record exists
+        """
+        pass
+
+    @abstractmethod
+    def remove(self, kind: str, name: str) -> None:
+        """
+        removes record if it exists
+        :param kind: kind of record
+        :param name: file name
+        :return: None
+        """
+        pass
+
+    @abstractmethod
+    def records(self) -> Iterator[Tuple[str, str]]:
+        """
+        :return: kind and name of every record
+        """
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class DirectoryStorage(Storage):
+
+    def __init__(self, output_dir: str):
+        """
+        One file per record, records of one kind are in the same directory: {output_dir}/{kind}/{name}. Name can
+        contain subdirectories (e.g. shard directories of output names), they are created on first write
+        :param output_dir: output dir
+        """
+        super(DirectoryStorage, self).__init__()
+        self.__output_dir = output_dir
+        # subdirectories created by this storage, so we don't check them on every write
+        self.__dirs = set()
+        self.__lock = threading.Lock()
+
+    def write(self, kind: str, name: str, content: bytes) -> None:
+        with open(self.__create_path(kind, name), "wb") as f:
+            f.write(content)
+
+    def write_stream(self, kind: str, name: str, stream: IO[bytes]) -> None:
+        with open(self.__create_path(kind, name), "wb") as f:
+            shutil.copyfileobj(stream, f)
+
+    def read(self, kind: str, name: str) -> bytes:
+        try:
+            with open(self.path(kind, name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError((kind, name))
+
+    def open(self, kind: str, name: str) -> IO[bytes]:
+        try:
+            return open(self.path(kind, name), "rb")
+        except FileNotFoundError:
+            raise KeyError((kind, name))
+
+    def exists(self, kind: str, name: str) -> bool:
+        return os.path.isfile(self.path(kind, name))
+
+    def remove(self, kind: str, name: str) -> None:
+        file_name = self.path(kind, name)
+        if os.path.isfile(file_name):
+            os.remove(file_name)
+
+    def records(self) -> Iterator[Tuple[str, str]]:
+        for kind in kinds:
+            kind_dir = "{}/{}".format(self.__output_dir, kind)
+            names = []
+            for root, dirs, files in os.walk(kind_dir):
+                directory = os.path.relpath(root, kind_dir).replace(os.sep, "/")
+                names.extend(name if directory == "." else "{}/{}".format(directory, name) for name in files)
+            for name in sorted(names):
+                yield kind, name
+
+    def create_dirs(self) -> None:
+        """
+        creates directories of all kinds
+        :return: None
+        """
+        for kind in kinds:
+            file_utils.create_dir_if_not_exist("{}/{}".format(self.__output_dir, kind))
+
+    def path(self, kind: str, name: str) -> str:
+        """
+        :param kind: kind of record
+        :param name: file name
+        :return: path of record
+        """
+        return "{}/{}/{}".format(self.__output_dir, kind, name)
+
+    def __create_path(self, kind: str, name: str) -> str:
+        directory, _, _ = name.rpartition("/")
+        if directory:
+            key = (kind, directory)
+            if key not in self.__dirs:
+                os.makedirs("{}/{}/{}".format(self.__output_dir, kind, directory), exist_ok=True)
+                with self.__lock:
+                    self.__dirs.add(key)
+        return self.path(kind, name)
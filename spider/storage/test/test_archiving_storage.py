@@ -0,0 +1,39 @@
+import shutil
+import zipfile
+from io import BytesIO
+from unittest import TestCase
+
+from spider.storage.archiving_storage import ArchivingStorage
+from spider.storage.storage import DirectoryStorage
+from spider.utils.zip_utils import ZipArchiver
+
+
+class TestArchivingStorage(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.output_dir = 'spider/storage/test/outdir'
+        self.output_zip = 'spider/storage/test/outdir/output.zip'
+
+    def setUp(self):
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+        directory = DirectoryStorage(self.output_dir)
+        directory.create_dirs()
+        directory.write("txt", "old.txt", b"saved before")
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def test_records_are_archived_when_written(self):
+        with ZipArchiver(self.output_zip) as archiver:
+            storage = ArchivingStorage(DirectoryStorage(self.output_dir), archiver, "./" + self.output_dir)
+            self.assertEqual(1, storage.archive_existing())
+            storage.write("html", "page.html", b"<html></html>")
+            storage.write_stream("pdf", "file.pdf", BytesIO(b"%PDF"))
+            self.assertEqual(b"%PDF", storage.read("pdf", "file.pdf"))
+
+        with zipfile.ZipFile(self.output_zip) as f:
+            self.assertEqual({"{}/txt/old.txt".format(self.output_dir), "{}/html/page.html".format(self.output_dir),
+                              "{}/pdf/file.pdf".format(self.output_dir)}, set(f.namelist()))
+            self.assertEqual(b"saved before", f.read("{}/txt/old.txt".format(self.output_dir)))
+            self.assertEqual(b"%PDF", f.read("{}/pdf/file.pdf".format(self.output_dir)))
@@ -0,0 +1,73 @@
+import threading
+from unittest import TestCase
+
+from spider.storage.queued_storage import QueuedStorage
+from spider.storage.storage import Storage
+
+
+class SlowStorage(Storage):
+
+    def __init__(self):
+        self.records_ = {}
+        self.released = threading.Event()
+
+    def write(self, kind, name, content):
+        self.released.wait()
+        self.records_[(kind, name)] = content
+
+    def read(self, kind, name):
+        return self.records_[(kind, name)]
+
+    def exists(self, kind, name):
+        return (kind, name) in self.records_
+
+    def remove(self, kind, name):
+        self.records_.pop((kind, name), None)
+
+    def records(self):
+        return iter(sorted(self.records_))
+
+
+class TestQueuedStorage(TestCase):
+
+    def test_queued_record_can_be_read(self):
+        slow = SlowStorage()
+        storage = QueuedStorage(slow, workers=1, queue_size=10)
+        storage.write('html', 'page.html', b'<html></html>')
+        # writer waits for disk, record is still in queue
+        self.assertFalse(slow.exists('html', 'page.html'))
+        self.assertTrue(storage.exists('html', 'page.html'))
+        self.assertEqual(b'<html></html>', storage.read('html', 'page.html'))
+        with storage.open('html', 'page.html') as f:
+            self.assertEqual(b'<html></html>', f.read())
+
+        slow.released.set()
+        storage.flush()
+        self.assertEqual(b'<html></html>', slow.read('html', 'page.html'))
+        self.assertEqual([('html', 'page.html')], list(storage.records()))
+        storage.close()
+
+    def test_backpressure(self):
+        slow = SlowStorage()
+        storage = QueuedStorage(slow, workers=1, queue_size=1)
+        # first record is taken by writer, second one waits in queue, third write blocks
+        storage.write('txt', '1.txt', b'1')
+        storage.write('txt', '2.txt', b'2')
+        writer = threading.Thread(target=storage.write, args=('txt', '3.txt', b'3'))
+        writer.start()
+        writer.join(0.2)
+        self.assertTrue(writer.is_alive())
+
+        slow.released.set()
+        writer.join()
+        storage.close()
+        self.assertEqual([('txt', '1.txt'), ('txt', '2.txt'), ('txt', '3.txt')], list(slow.records()))
+
+    def test_write_after_close(self):
+        slow = SlowStorage()
+        slow.released.set()
+        storage = QueuedStorage(slow)
+        storage.close()
+        # e.g. text of pdf finished by worker after crawl
+        storage.write('pdf2txt', 'file.txt', b'text')
+        self.assertEqual(b'text', slow.read('pdf2txt', 'file.txt'))
@@ -0,0 +1,107 @@
+import gzip
+import io
+import os
+import shutil
+from unittest import TestCase, mock
+
+from spider.handlers.lxml_html_handler import LxmlHtmlHandler
+from spider.storage.sharded_storage import ShardedStorage, convert_to_directory, iter_shard
+
+
+class TestShardedStorage(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.output_dir = 'spider/storage/test/outdir'
+        self.storage_dir = '{}/shards'.format(self.output_dir)
+
+    def setUp(self):
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def test_write_and_read(self):
+        with ShardedStorage(self.storage_dir) as storage:
+            storage.write("html", "page.html", b"<html></html>")
+            storage.write("txt", "page.txt", "zażółć".encode("UTF-8"))
+            storage.write("html", "page.html", b"<html>new</html>")
+
+            self.assertEqual(b"<html>new</html>", storage.read("html", "page.html"))
+            self.assertEqual("zażółć", storage.read("txt", "page.txt").decode("UTF-8"))
+            self.assertTrue(storage.exists("txt", "page.txt"))
+            self.assertFalse(storage.exists("txt", "other.txt"))
+            self.assertRaises(KeyError, storage.read, "txt", "other.txt")
+
+        # shard is one gzip stream
+        with gzip.open('{}/shard-00000.gz'.format(self.storage_dir)) as f:
+            self.assertTrue(f.read().endswith(b"<html>new</html>"))
+
+    @mock.patch('spider.storage.sharded_storage.spool_size', 1024)
+    def test_write_stream(self):
+        content = os.urandom(200 * 1024)
+        stream = io.BytesIO(b"skipped" + content)
+        stream.seek(7)
+        with ShardedStorage(self.storage_dir) as storage:
+            storage.write("html", "page.html", b"<html></html>")
+            storage.write_stream("pdf", "file.pdf", stream, chunk_size=1000)
+            storage.write("txt", "page.txt", b"text")
+            self.assertEqual(content, storage.read("pdf", "file.pdf"))
+
+        records = [record[2:] for record in iter_shard('{}/shard-00000.gz'.format(self.storage_dir))]
+        self.assertEqual([("html", "page.html", b"<html></html>"), ("pdf", "file.pdf", content),
+                          ("txt", "page.txt", b"text")], records)
+        with ShardedStorage(self.storage_dir) as storage:
+            self.assertEqual(content, storage.read("pdf", "file.pdf"))
+
+    def test_reopen(self):
+        with ShardedStorage(self.storage_dir) as storage:
+            storage.write("html", "page.html", b"<html></html>")
+            storage.write("zip", "file.zip", b"zip")
+            storage.remove("zip", "file.zip")
+
+        with ShardedStorage(self.storage_dir) as storage:
+            self.assertEqual([("html", "page.html")], list(storage.records()))
+            storage.write("txt", "page.txt", b"text")
+        # records of new crawl go into new shard
+        self.assertTrue(os.path.isfile('{}/shard-00001.gz'.format(self.storage_dir)))
+
+        # index is rebuilt from shards
+        os.remove('{}/index.jsonl'.format(self.storage_dir))
+        with ShardedStorage(self.storage_dir) as storage:
+            self.assertEqual(b"text", storage.read("txt", "page.txt"))
+            # removed record is back, it is still in shard
+            self.assertTrue(storage.exists("zip", "file.zip"))
+
+    def test_rolling_shards(self):
+        with ShardedStorage(self.storage_dir, shard_size=100, compress_level=0) as storage:
+            for i in range(5):
+                storage.write("txt", "{}.txt".format(i), bytes(100))
+            self.assertEqual(bytes(100), storage.read("txt", "3.txt"))
+
+        shards = sorted(f for f in os.listdir(self.storage_dir) if f.startswith("shard-"))
+        self.assertEqual(5, len(shards))
+        records = [(name, content) for _, _, _, name, content in iter_shard('{}/{}'.format(self.storage_dir,
+                                                                                          shards[2]))]
+        self.assertEqual([("2.txt", bytes(100))], records)
+
+    def test_partial_record(self):
+        with ShardedStorage(self.storage_dir) as storage:
+            storage.write("txt", "1.txt", b"first")
+            storage.write("txt", "2.txt", b"second")
+        shard_file = '{}/shard-00000.gz'.format(self.storage_dir)
+        with open(shard_file, "r+b") as f:
+            f.truncate(os.path.getsize(shard_file) - 5)
+
+        self.assertEqual(["1.txt"], [name for _, _, _, name, _ in iter_shard(shard_file)])
+
+    def test_handler_and_conversion(self):
+        with ShardedStorage(self.storage_dir) as storage:
+            LxmlHtmlHandler(storage=storage).save_result(self.output_dir, "page", b"<html><p>some text</p></html>")
+            self.assertEqual(2, convert_to_directory(storage, '{}/converted'.format(self.output_dir)))
+
+        # nothing is written into output dir directly
+        self.assertFalse(os.path.exists('{}/html'.format(self.output_dir)))
+        with open('{}/converted/txt/page.txt'.format(self.output_dir)) as f:
+            self.assertEqual("some text", f.read())
+        self.assertTrue(os.path.isfile('{}/converted/html/page.html'.format(self.output_dir)))
@@ -0,0 +1,31 @@
+import io
+import shutil
+from unittest import TestCase
+
+from spider.storage.storage import DirectoryStorage
+
+
+class TestDirectoryStorage(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.output_dir = 'spider/storage/test/outdir/directory'
+
+    def setUp(self):
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+        DirectoryStorage(self.output_dir).create_dirs()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def test_names_with_shard_directories(self):
+        storage = DirectoryStorage(self.output_dir)
+        storage.write("html", "ab/cd/abcd.html", b"<html></html>")
+        storage.write_stream("pdf", "ab/ef/abef.pdf", io.BytesIO(b"%PDF"))
+        storage.write("html", "ab/cd/abce.html", b"<html>2</html>")
+        storage.write("html", "page.html", b"<html>3</html>")
+
+        self.assertTrue(storage.exists("html", "ab/cd/abcd.html"))
+        self.assertEqual(b"%PDF", storage.read("pdf", "ab/ef/abef.pdf"))
+        self.assertEqual([("html", "ab/cd/abcd.html"), ("html", "ab/cd/abce.html"), ("html", "page.html"),
+                          ("pdf", "ab/ef/abef.pdf")], list(storage.records()))
@@ -1,22 +1,76 @@
-from typing import List
+import os
+import shutil
+import zipfile
+from typing import Dict, List
 from unittest import TestCase, mock
 
+from requests import Session
+
 from spider.app import App
+from spider.benchmark.site import SiteConfig, SiteServer
+from spider.crawler.checkpoint import Checkpoint
+from spider.crawler.content_store import ContentStore
+from spider.crawler.frontier import Frontier
+from spider.crawler.metrics import Metrics
+from spider.crawler.output_manifest import OutputManifest
+from spider.crawler.profiler import Profiler
+from spider.crawler.scheduler import HostScheduler
+from spider.crawler.seen_set import BloomSeenSet
+from spider.crawler.url_filter import UrlFilter
+from spider.crawler.validator_store import ValidatorStore
+from spider.handlers.content_type_handler import ContentTypeHandler
+from spider.storage.storage import DirectoryStorage
 
 
 # noinspection PyUnusedLocal
 def get_pages(urls: set, downloaded_urls: set, output_dir: str, depth: int,
               exclude_prefixes: List[str], exclude_contains: List[str],
               exclude_content_types: List[str], include_contains: List[str],
-              proxies: dict = None, max_depth: int = 1000):
+              proxies: dict = None, max_depth: int = 1000, session: Session = None, frontier: Frontier = None,
+              checkpoint: Checkpoint = None, scheduler: HostScheduler = None, url_filter: UrlFilter = None,
+              max_sizes: Dict[str, int] = None, handlers: Dict[str, ContentTypeHandler] = None,
+              content_store: ContentStore = None, validators: ValidatorStore = None,
+              metrics: Metrics = None, profiler: Profiler = None, manifest: OutputManifest = None):
     pass
 
 
 # noinspection PyUnusedLocal
-def zip_dir(path: str, output_file: str) -> None:
+def get_pages_async(urls: set, downloaded_urls: set, output_dir: str, depth: int,
+                    exclude_prefixes: List[str], exclude_contains: List[str],
+                    exclude_content_types: List[str], include_contains: List[str],
+                    proxies: dict = None, max_depth: int = 1000, concurrency: int = 64,
+                    session: Session = None, frontier: Frontier = None, checkpoint: Checkpoint = None,
+                    scheduler: HostScheduler = None, url_filter: UrlFilter = None,
+                    max_sizes: Dict[str, int] = None, handlers: Dict[str, ContentTypeHandler] = None,
+                    content_store: ContentStore = None, validators: ValidatorStore = None,
+                    metrics: Metrics = None, profiler: Profiler = None, manifest: OutputManifest = None):
     pass
 
 
+# noinspection PyUnusedLocal
+def get_pages_pipeline(urls: set, downloaded_urls: set, output_dir: str, depth: int,
+                       exclude_prefixes: List[str], exclude_contains: List[str],
+                       exclude_content_types: List[str], include_contains: List[str],
+                       proxies: dict = None, max_depth: int = 1000, concurrency: int = 64,
+                       session: Session = None, frontier: Frontier = None, checkpoint: Checkpoint = None,
+                       scheduler: HostScheduler = None, url_filter: UrlFilter = None,
+                       max_sizes: Dict[str, int] = None, handlers: Dict[str, ContentTypeHandler] = None,
+                       content_store: ContentStore = None, validators: ValidatorStore = None,
+                       metrics: Metrics = None, profiler: Profiler = None, manifest: OutputManifest = None,
+                       workers: Dict[str, int] = None, queue_size: int = 100):
+    # page written by handler goes through queue of writers
+    handlers['text/html'].get_storage(output_dir).write('html', 'page.html', b'<html></html>')
+
+
+# noinspection PyUnusedLocal
+def zip_dir(path: str, output_file: str, workers: int = 1, store_compressed: bool = False) -> None:
+    pass
+
+
+def output_names(output_dir: str, kind: str) -> list:
+    return [name for record_kind, name in DirectoryStorage(output_dir).records() if record_kind == kind]
+
+
 class TestApp(TestCase):
 
     def __init__(self, *args, **kwargs):
@@ -54,3 +108,278 @@ class TestApp(TestCase):
                   include_contains=['http'])
         self.assertIsNotNone(app)
         app.main()
+
+    # noinspection PyUnusedLocal
+    @mock.patch('spider.app.get_pages', side_effect=get_pages)
+    @mock.patch('spider.app.get_pages_async', side_effect=get_pages_async)
+    @mock.patch('spider.app.zip_dir', side_effect=zip_dir)
+    def test_run_app_with_async_engine(self, mock_zip_dir, mock_get_pages_async, mock_get_pages):
+        app = App(url=self.url,
+                  max_depth=2,
+                  include_contains=['http'],
+                  engine='async',
+                  concurrency=8)
+        app.main()
+        self.assertTrue(mock_get_pages_async.called)
+        self.assertFalse(mock_get_pages.called)
+        self.assertEqual(8, mock_get_pages_async.call_args[0][10])
+        self.assertIsInstance(mock_get_pages_async.call_args[0][11], Session)
+
+    # noinspection PyUnusedLocal
+    @mock.patch('spider.app.get_pages', side_effect=get_pages)
+    @mock.patch('spider.app.get_pages_pipeline', side_effect=get_pages_pipeline)
+    @mock.patch('spider.app.zip_dir', side_effect=zip_dir)
+    def test_run_app_with_pipeline_engine(self, mock_zip_dir, mock_get_pages_pipeline, mock_get_pages):
+        output_dir = 'spider/test/outdir'
+        app = App(url=self.url,
+                  output_dir=output_dir,
+                  include_contains=['http'],
+                  engine='pipeline',
+                  concurrency=8,
+                  pipeline_workers={'application/pdf': 4},
+                  pipeline_queue_size=10)
+        app.main()
+        self.assertFalse(mock_get_pages.called)
+        self.assertEqual(8, mock_get_pages_pipeline.call_args[0][10])
+        self.assertEqual({'application/pdf': 4}, mock_get_pages_pipeline.call_args[0][23])
+        self.assertEqual(10, mock_get_pages_pipeline.call_args[0][24])
+        # queued writes are done when crawl finishes
+        self.assertTrue(os.path.isfile('{}/html/page.html'.format(output_dir)))
+
+    def test_unknown_engine(self):
+        self.assertRaises(ValueError, App, url=self.url, include_contains=['http'], engine='fast')
+
+    def test_unknown_html_parser(self):
+        self.assertRaises(ValueError, App, url=self.url, include_contains=['http'], html_parser='regex')
+
+    # noinspection PyUnusedLocal
+    @mock.patch('spider.app.get_pages', side_effect=get_pages)
+    @mock.patch('spider.app.zip_dir', side_effect=zip_dir)
+    def test_resume(self, mock_zip_dir, mock_get_pages):
+        output_dir = 'spider/test/outdir'
+        checkpoint_file = 'spider/test/outdir.checkpoint'
+        App(url=self.url, include_contains=['http'], output_dir=output_dir, checkpoint_file=checkpoint_file).main()
+        self.assertTrue(os.path.isfile(checkpoint_file))
+        with open('{}/html/downloaded.html'.format(output_dir), 'w') as f:
+            f.write('<html></html>')
+
+        # on resume we keep downloaded files
+        App(url=self.url, include_contains=['http'], output_dir=output_dir, checkpoint_file=checkpoint_file,
+            resume=True).main()
+        self.assertTrue(os.path.isfile('{}/html/downloaded.html'.format(output_dir)))
+
+        # without resume, we start from scratch
+        App(url=self.url, include_contains=['http'], output_dir=output_dir, checkpoint_file=checkpoint_file)
+        self.assertFalse(os.path.isfile('{}/html/downloaded.html'.format(output_dir)))
+        self.assertFalse(os.path.isfile(checkpoint_file))
+
+    @mock.patch('spider.app.zip_dir', side_effect=zip_dir)
+    def test_resume_with_seen_set(self, mock_zip_dir):
+        output_dir = 'spider/test/outdir'
+        checkpoint_file = 'spider/test/outdir.checkpoint'
+
+        # noinspection PyUnusedLocal
+        def crawl(urls: set, downloaded_urls: set, *args):
+            checkpoint = args[10]
+            for url in ('http://some.url/a', 'http://some.url/b'):
+                downloaded_urls.add(url)
+                checkpoint.queued(url, 1)
+            checkpoint.done('http://some.url/a')
+
+        with mock.patch('spider.app.get_pages', side_effect=crawl):
+            App(url=self.url, include_contains=['http'], output_dir=output_dir, checkpoint_file=checkpoint_file,
+                seen_set='fingerprint').main()
+        restored = []
+
+        # noinspection PyUnusedLocal
+        def resume(urls: set, downloaded_urls: set, *args):
+            restored.append('http://some.url/a' in downloaded_urls)
+            restored.extend(url for url, depth in args[9].items())
+
+        with mock.patch('spider.app.get_pages', side_effect=resume):
+            App(url=self.url, include_contains=['http'], output_dir=output_dir, checkpoint_file=checkpoint_file,
+                seen_set='fingerprint', resume=True).main()
+        # done url is known from seen set, queued url is back in frontier
+        self.assertEqual([True, 'http://some.url/b'], restored)
+        os.remove(checkpoint_file)
+
+    def test_resume_without_checkpoint_file(self):
+        self.assertRaises(ValueError, App, url=self.url, include_contains=['http'], resume=True)
+
+    # noinspection PyUnusedLocal
+    @mock.patch('spider.app.get_pages', side_effect=get_pages)
+    @mock.patch('spider.app.zip_dir', side_effect=zip_dir)
+    def test_recrawl(self, mock_zip_dir, mock_get_pages):
+        output_dir = 'spider/test/outdir'
+        validators_file = 'spider/test/outdir.validators'
+        App(url=self.url, include_contains=['http'], output_dir=output_dir, validators_file=validators_file).main()
+        self.assertTrue(os.path.isfile(validators_file))
+        self.assertIsInstance(mock_get_pages.call_args[0][18], ValidatorStore)
+        with open('{}/html/downloaded.html'.format(output_dir), 'w') as f:
+            f.write('<html></html>')
+
+        # on recrawl we keep output from previous crawl
+        App(url=self.url, include_contains=['http'], output_dir=output_dir, validators_file=validators_file,
+            recrawl=True).main()
+        self.assertTrue(os.path.isfile('{}/html/downloaded.html'.format(output_dir)))
+
+        # without recrawl, we start from scratch
+        App(url=self.url, include_contains=['http'], output_dir=output_dir, validators_file=validators_file)
+        self.assertFalse(os.path.isfile('{}/html/downloaded.html'.format(output_dir)))
+        self.assertFalse(os.path.isfile(validators_file))
+
+    # noinspection PyUnusedLocal
+    @mock.patch('spider.app.get_pages', side_effect=get_pages)
+    @mock.patch('spider.app.zip_dir', side_effect=zip_dir)
+    def test_sharded_storage(self, mock_zip_dir, mock_get_pages):
+        output_dir = 'spider/test/outdir'
+        App(url=self.url, include_contains=['http'], output_dir=output_dir, storage='sharded').main()
+        self.assertTrue(os.path.isdir('{}/shards'.format(output_dir)))
+        self.assertFalse(os.path.exists('{}/html'.format(output_dir)))
+        self.assertRaises(ValueError, App, url=self.url, include_contains=['http'], storage='s3')
+
+    # noinspection PyUnusedLocal
+    @mock.patch('spider.app.get_pages', side_effect=get_pages)
+    @mock.patch('spider.app.zip_dir', side_effect=zip_dir)
+    def test_incremental_archive(self, mock_zip_dir, mock_get_pages):
+        output_dir = 'spider/test/outdir'
+        output_zip = 'spider/test/outdir.zip'
+        App(url=self.url, include_contains=['http'], output_dir=output_dir, output_zip=output_zip,
+            archive='incremental').main()
+        # output is not zipped after crawl
+        self.assertFalse(mock_zip_dir.called)
+        with zipfile.ZipFile(output_zip) as f:
+            self.assertEqual([], f.namelist())
+        os.remove(output_zip)
+        self.assertRaises(ValueError, App, url=self.url, include_contains=['http'], archive='never')
+
+    # noinspection PyUnusedLocal
+    @mock.patch('spider.app.get_pages', side_effect=get_pages)
+    @mock.patch('spider.app.zip_dir', side_effect=zip_dir)
+    def test_metrics(self, mock_zip_dir, mock_get_pages):
+        metrics_file = 'spider/test/outdir.prom'
+        app = App(url=self.url, include_contains=['http'], metrics_file=metrics_file)
+        app.main()
+        metrics = mock_get_pages.call_args[0][19]
+        self.assertIs(app.metrics, metrics)
+        metrics.inc('spider_pages_total', host='some.url')
+        self.assertEqual([{'labels': {'host': 'some.url'}, 'value': 1}],
+                         app.get_metrics()['counters']['spider_pages_total'])
+        # file is written when crawl finishes
+        self.assertTrue(os.path.isfile(metrics_file))
+        os.remove(metrics_file)
+
+    # noinspection PyUnusedLocal
+    @mock.patch('spider.app.zip_dir', side_effect=zip_dir)
+    def test_cassette(self, mock_zip_dir):
+        output_dir = 'spider/test/outdir'
+        cassette_dir = 'spider/test/cassette'
+        shutil.rmtree(cassette_dir, ignore_errors=True)
+        try:
+            with SiteServer(SiteConfig(pages=7, fan_out=2, depth=2, page_size=512)) as server:
+                App(url=server.url, include_contains=['127.0.0.1'], output_dir=output_dir,
+                    cassette_dir=cassette_dir).main()
+                recorded = server.requests
+            recorded_pages = sorted(output_names(output_dir, 'html'))
+            self.assertEqual(7, len(recorded_pages))
+
+            # server is closed, crawl is replayed from cassette
+            App(url=server.url, include_contains=['127.0.0.1'], output_dir=output_dir, cassette_dir=cassette_dir,
+                cassette_mode='replay').main()
+            self.assertEqual(recorded_pages, sorted(output_names(output_dir, 'html')))
+            self.assertEqual(recorded, server.requests)
+        finally:
+            shutil.rmtree(cassette_dir, ignore_errors=True)
+        self.assertRaises(ValueError, App, url=self.url, include_contains=['http'], cassette_dir=cassette_dir,
+                          cassette_mode='replay')
+        self.assertRaises(ValueError, App, url=self.url, include_contains=['http'], cassette_mode='rewind')
+
+    # noinspection PyUnusedLocal
+    @mock.patch('spider.app.get_pages', side_effect=get_pages)
+    @mock.patch('spider.app.zip_dir', side_effect=zip_dir)
+    def test_distributed(self, mock_zip_dir, mock_get_pages):
+        output_dir = 'spider/test/outdir'
+        frontier_file = 'spider/test/outdir.frontier'
+        if os.path.isfile(frontier_file):
+            os.remove(frontier_file)
+        try:
+            with SiteServer(SiteConfig(pages=7, fan_out=2, depth=2, page_size=512)) as server:
+                App(url=server.url, include_contains=['127.0.0.1'], output_dir=output_dir,
+                    frontier_url='sqlite:///{}'.format(frontier_file), node='first', node_index=1, nodes=2).main()
+            self.assertFalse(mock_get_pages.called)
+            self.assertEqual(7, len(output_names(output_dir, 'html')))
+        finally:
+            os.remove(frontier_file)
+        self.assertRaises(ValueError, App, url=self.url, include_contains=['http'], frontier_url=frontier_file,
+                          engine='async')
+        self.assertRaises(ValueError, App, url=self.url, include_contains=['http'], frontier_url=frontier_file,
+                          checkpoint_file='spider/test/outdir.checkpoint')
+        self.assertRaises(ValueError, App, url=self.url, include_contains=['http'], frontier_url=frontier_file,
+                          node_index=2, nodes=2)
+
+    # noinspection PyUnusedLocal
+    @mock.patch('spider.app.zip_dir', side_effect=zip_dir)
+    def test_crawl_order_and_budgets(self, mock_zip_dir):
+        output_dir = 'spider/test/outdir'
+        with SiteServer(SiteConfig(pages=40, fan_out=3, depth=3, page_size=512)) as server:
+            App(url=server.url, include_contains=['127.0.0.1'], output_dir=output_dir, crawl_order='best-first',
+                max_pages=5).main()
+            self.assertEqual(5, len(output_names(output_dir, 'html')))
+            # root page and one page of depth 1
+            App(url=server.url, include_contains=['127.0.0.1'], output_dir=output_dir,
+                max_pages_per_depth={1: 1}, max_depth=2).main()
+            self.assertEqual(2, len(output_names(output_dir, 'html')))
+        self.assertRaises(ValueError, App, url=self.url, include_contains=['http'], crawl_order='random')
+        self.assertRaises(ValueError, App, url=self.url, include_contains=['http'], crawl_order='best-first',
+                          frontier_url='spider/test/outdir.frontier')
+
+    # noinspection PyUnusedLocal
+    @mock.patch('spider.app.zip_dir', side_effect=zip_dir)
+    def test_body_sizes_are_not_limited_by_default(self, mock_zip_dir):
+        output_dir = 'spider/test/outdir'
+        # html page bigger than 10MB (limit of html bodies in earlier versions)
+        try:
+            with SiteServer(SiteConfig(pages=1, page_size=11 * 1024 * 1024)) as server:
+                App(url=server.url, include_contains=['127.0.0.1'], output_dir=output_dir).main()
+            self.assertEqual(1, len(output_names(output_dir, 'html')))
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    # noinspection PyUnusedLocal
+    @mock.patch('spider.app.zip_dir', side_effect=zip_dir)
+    def test_exclude_by_extension(self, mock_zip_dir):
+        output_dir = 'spider/test/outdir'
+        config = SiteConfig(pages=20, fan_out=3, depth=3, page_size=512, pdf_ratio=0.5, zip_ratio=0.5)
+        requests = []
+        for exclude_by_extension in (False, True):
+            with SiteServer(config) as server:
+                App(url=server.url, include_contains=['127.0.0.1'], output_dir=output_dir,
+                    exclude_content_types=['application/pdf', 'application/zip'],
+                    exclude_by_extension=exclude_by_extension).main()
+                requests.append(server.requests)
+            self.assertEqual(0, len(output_names(output_dir, 'pdf')))
+        # links to pdf and zip files are not requested at all
+        self.assertEqual(20, requests[1])
+        self.assertGreater(requests[0], requests[1])
+
+    # noinspection PyUnusedLocal
+    @mock.patch('spider.app.get_pages', side_effect=get_pages)
+    @mock.patch('spider.app.zip_dir', side_effect=zip_dir)
+    def test_profiler(self, mock_zip_dir, mock_get_pages):
+        App(url=self.url, include_contains=['http']).main()
+        self.assertIsNone(mock_get_pages.call_args[0][20])
+        App(url=self.url, include_contains=['http'], profile_every=100, profile_stages=['html_parse']).main()
+        self.assertIsInstance(mock_get_pages.call_args[0][20], Profiler)
+        self.assertRaises(ValueError, App, url=self.url, include_contains=['http'], profile_slower_than=500,
+                          profile_stages=['get_links'])
+
+    def test_recrawl_without_validators_file(self):
+        self.assertRaises(ValueError, App, url=self.url, include_contains=['http'], recrawl=True)
+
+    # noinspection PyUnusedLocal
+    @mock.patch('spider.app.get_pages', side_effect=get_pages)
+    @mock.patch('spider.app.zip_dir', side_effect=zip_dir)
+    def test_seen_set(self, mock_zip_dir, mock_get_pages):
+        App(url=self.url, include_contains=['http'], seen_set='bloom', seen_set_error_rate=0.01).main()
+        self.assertIsInstance(mock_get_pages.call_args[0][1], BloomSeenSet)
+        self.assertRaises(ValueError, App, url=self.url, include_contains=['http'], seen_set='fast')
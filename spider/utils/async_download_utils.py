@@ -0,0 +1,143 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import requests
+
+from spider.crawler.checkpoint import Checkpoint
+from spider.crawler.content_store import ContentStore
+from spider.crawler.frontier import Frontier
+from spider.crawler.metrics import Metrics
+from spider.crawler.output_manifest import OutputManifest
+from spider.crawler.profiler import Profiler
+from spider.crawler.scheduler import HostScheduler
+from spider.crawler.url_filter import UrlFilter
+from spider.crawler.validator_store import ValidatorStore
+from spider.handlers.content_type_handler import ContentTypeHandler
+from spider.utils.download_utils import get_page, push_urls
+
+__logger = logging.getLogger(__name__)
+__err_logger = logging.getLogger("spider.errors")
+
+
+def get_pages_async(urls: set, downloaded_urls: set, output_dir: str, depth: int,
+                    exclude_prefixes: List[str], exclude_contains: List[str],
+                    exclude_content_types: List[str], include_contains: List[str],
+                    proxies: dict = None, max_depth: int = 1000, concurrency: int = 64,
+                    session: requests.Session = None, frontier: Frontier = None,
+                    checkpoint: Checkpoint = None, scheduler: HostScheduler = None,
+                    url_filter: UrlFilter = None, max_sizes: Dict[str, int] = None,
+                    handlers: Dict[str, ContentTypeHandler] = None, content_store: ContentStore = None,
+                    validators: ValidatorStore = None, metrics: Metrics = None,
+                    profiler: Profiler = None, manifest: OutputManifest = None) -> None:
+    """
+    asyncio counterpart of get_pages. Pages from one depth level are downloaded concurrently (up to `concurrency`
+    downloads in flight), next level starts when current level is done, so output is the same as for get_pages
+    :param urls: url addresses to download
+    :param downloaded_urls: downloaded (or already queued) urls, set or SeenSet modified in place
+    :param output_dir: output dir
+    :param depth: current depth
+    :param exclude_prefixes: prefixes for url which should be excluded
+    :param exclude_contains: phrases in url which should be excluded
+    :param exclude_content_types: excluded content types
+    :param include_contains: url must contain
+    :param proxies: proxies for connection if required
+    :param max_depth: how deep we want to download pages
+    :param concurrency: max number of pages downloaded at the same time
+    :param session: http session shared by all downloads, its pool size should be at least `concurrency`
+    :param frontier: queue of urls waiting for download, new in-memory frontier by default
+    :param checkpoint: if defined, crawl state is saved into it, so crawl can be resumed
+    :param scheduler: decides which url from frontier is downloaded next, no host limits by default
+    :param url_filter: compiled include/exclude rules, compiled from lists above if not defined
+    :param max_sizes: max body size in bytes by content type, bigger responses are dropped
+    :param handlers: handlers by content type, handlers created by create_handlers by default
+    :param content_store: if defined, pdf and zip files with the same content are extracted once
+    :param validators: if defined, conditional requests are sent for urls downloaded in previous crawl
+    :param metrics: if defined, pages, bytes, errors and time of download stages are measured
+    :param profiler: if defined, stages of sampled pages are profiled
+    :param manifest: if defined, urls with output in manifest are not downloaded again and downloaded urls are added
+    :return: None
+    """
+    own_frontier = frontier is None
+    frontier = Frontier() if own_frontier else frontier
+    if scheduler is None:
+        scheduler = HostScheduler(session=session, window=max(concurrency * 4, 1000))
+    url_filter = url_filter if url_filter else UrlFilter(include_contains, exclude_prefixes, exclude_contains)
+    try:
+        asyncio.run(fetch_pages(urls, downloaded_urls, output_dir, depth,
+                                exclude_prefixes, exclude_contains, exclude_content_types, include_contains,
+                                proxies, max_depth, concurrency, session, frontier, checkpoint,
+                                scheduler, url_filter, max_sizes, handlers, content_store, validators,
+                                metrics, profiler, manifest))
+    finally:
+        if own_frontier:
+            frontier.close()
+
+
+async def fetch_pages(urls: set, downloaded_urls: set, output_dir: str, depth: int,
+                      exclude_prefixes: List[str], exclude_contains: List[str],
+                      exclude_content_types: List[str], include_contains: List[str],
+                      proxies: dict, max_depth: int, concurrency: int,
+                      session: requests.Session, frontier: Frontier, checkpoint: Checkpoint,
+                      scheduler: HostScheduler, url_filter: UrlFilter, max_sizes: Dict[str, int],
+                      handlers: Dict[str, ContentTypeHandler], content_store: ContentStore,
+                      validators: ValidatorStore, metrics: Metrics = None, profiler: Profiler = None,
+                      manifest: OutputManifest = None) -> None:
+    """
+    crawls pages from frontier. Blocking downloads (requests) are executed in thread pool, so event loop can keep
+    `concurrency` of them in flight. Frontier and scheduler queues are touched only from event loop thread
+    :return: None
+    """
+    loop = asyncio.get_running_loop()
+    tasks = set()
+
+    def download(url: str) -> set:
+        if not scheduler.allowed(url):
+            return set()
+        return get_page(url, downloaded_urls, output_dir, exclude_prefixes, exclude_contains,
+                        exclude_content_types, include_contains, proxies, session, scheduler, url_filter,
+                        max_sizes, handlers, content_store, validators, metrics, profiler, manifest)
+
+    async def fetch_page(url: str, url_depth: int) -> None:
+        try:
+            links = await loop.run_in_executor(executor, download, url)
+            push_urls(frontier, links, downloaded_urls, url_depth + 1, max_depth, checkpoint)
+        finally:
+            # url is released after its links are queued, otherwise scheduler could see its depth level done and
+            # start next one without them
+            scheduler.release(url)
+        if checkpoint:
+            checkpoint.done(url)
+            checkpoint.flush_if_due()
+
+    def on_done(task: asyncio.Task, url: str) -> None:
+        tasks.discard(task)
+        # get_page handles download errors, so exception comes from frontier or checkpoint and links of url are lost
+        if not task.cancelled() and task.exception():
+            __err_logger.error("Can't queue links of page '{}'".format(url), exc_info=task.exception())
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="fetch") as executor:
+        push_urls(frontier, urls, downloaded_urls, depth, max_depth, checkpoint)
+        current_depth = None
+        while True:
+            # scheduler takes next depth level from frontier only when current level is done
+            scheduler.fill(frontier)
+            if len(scheduler) == 0 and not tasks:
+                break
+
+            url, url_depth, wait = scheduler.next() if len(tasks) < concurrency else (None, None, None)
+            if not url:
+                if tasks:
+                    await asyncio.wait(tasks, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                else:
+                    await asyncio.sleep(wait if wait else 0)
+                continue
+
+            if url_depth != current_depth:
+                current_depth = url_depth
+                __logger.info("current depth: {}".format(current_depth))
+
+            task = loop.create_task(fetch_page(url, url_depth))
+            tasks.add(task)
+            task.add_done_callback(lambda done, page_url=url: on_done(done, page_url))
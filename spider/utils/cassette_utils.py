@@ -0,0 +1,206 @@
+import json
+import os
+from collections import namedtuple
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+from typing import IO, Callable, List, Optional, Tuple
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from urllib3 import HTTPResponse
+
+from spider.storage.sharded_storage import ShardedStorage, spool_size
+
+response_kind = "response"
+
+# headers which describe encoding of original body, recorded body is already decoded
+__dropped_headers = ("content-encoding", "transfer-encoding", "content-length")
+
+# truncated body was not read whole by crawler (e.g. it was dropped by max size), declared Content-Length is kept
+RecordedResponse = namedtuple("RecordedResponse", ["url", "status", "reason", "headers", "body", "truncated"],
+                              defaults=[False])
+
+
+class Cassette(object):
+
+    def __init__(self, cassette_dir: str, shard_size: int = 256 * 1024 * 1024):
+        """
+        Recorded http responses (url, status, headers and decoded body), so crawl can be replayed without network.
+        Responses are records of sharded storage (compressed shards with index), response recorded later for the
+        same request replaces the earlier one
+        :param cassette_dir: directory with shards and index
+        :param shard_size: size of shard file in bytes
+        """
+        super(Cassette, self).__init__()
+        self.__storage = ShardedStorage(cassette_dir, shard_size)
+
+    def record(self, method: str, response: RecordedResponse) -> None:
+        """
+        :param method: http method of request
+        :param response: response to record
+        :return: None
+        """
+        self.record_stream(method, response, BytesIO(response.body))
+
+    def record_stream(self, method: str, response: RecordedResponse, body: IO[bytes]) -> None:
+        """
+        records response with body in file object, header of record is appended at the end of body, so body is not
+        copied
+        :param method: http method of request
+        :param response: response to record, its body is ignored
+        :param body: writable file object with body
+        :return: None
+        """
+        header = json.dumps({"url": response.url, "status": response.status, "reason": response.reason,
+                             "headers": response.headers, "truncated": response.truncated}).encode("UTF-8")
+        body.seek(0, os.SEEK_END)
+        body.write(b"\n" + header)
+        body.seek(0)
+        self.__storage.write_stream(response_kind, self.key(method, response.url), body)
+
+    def replay(self, method: str, url: str) -> Optional[RecordedResponse]:
+        """
+        :param method: http method of request
+        :param url: url of request
+        :return: recorded response, None if request was not recorded
+        """
+        key = self.key(method, url)
+        if not self.__storage.exists(response_kind, key):
+            return None
+        record = self.__storage.read(response_kind, key)
+        # header is the last line, json doesn't contain new lines
+        header_start = record.rindex(b"\n")
+        header = json.loads(record[header_start + 1:].decode("UTF-8"))
+        return RecordedResponse(header["url"], header["status"], header["reason"],
+                                [tuple(h) for h in header["headers"]], record[:header_start], header["truncated"])
+
+    @staticmethod
+    def key(method: str, url: str) -> str:
+        return "{} {}".format(method.upper(), url)
+
+    def close(self) -> None:
+        self.__storage.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def to_response(adapter: HTTPAdapter, request: requests.PreparedRequest,
+                recorded: RecordedResponse) -> requests.Response:
+    """
+    :param adapter: adapter which builds response
+    :param request: request
+    :param recorded: recorded response
+    :return: response whose body is streamed from recorded body
+    """
+    length = str(len(recorded.body))
+    if recorded.truncated:
+        # declared length, so body is dropped by max size before it is read as it was during recording
+        length = next((value for name, value in recorded.headers if name.lower() == "content-length"), length)
+    headers = [(name, value) for name, value in recorded.headers if name.lower() not in __dropped_headers]
+    headers.append(("Content-Length", length))
+    raw = HTTPResponse(body=BytesIO(recorded.body), headers=headers, status=recorded.status,
+                       reason=recorded.reason, preload_content=False, decode_content=False,
+                       request_url=request.url)
+    return adapter.build_response(request, raw)
+
+
+class RecordingBody(object):
+
+    def __init__(self, raw: HTTPResponse, on_done: Callable[[IO[bytes], bool], None]):
+        """
+        Raw body of response which copies decoded chunks read by crawler into spooled temporary file. When body is
+        read whole or response is closed, `on_done` is called with the file and flag if body is truncated
+        :param raw: raw body of response
+        :param on_done: called once with body
+        """
+        super(RecordingBody, self).__init__()
+        self.__raw = raw
+        self.__on_done = on_done
+        self.__body = SpooledTemporaryFile(max_size=spool_size, prefix="spider-recorded-")
+        self.__done = False
+
+    def read(self, amt: Optional[int] = None, **kwargs) -> bytes:
+        chunk = self.__raw.read(amt, decode_content=True)
+        if chunk:
+            self.__body.write(chunk)
+        else:
+            self.__finish(False)
+        return chunk
+
+    def close(self) -> None:
+        self.__finish(True)
+        self.__raw.close()
+
+    def release_conn(self) -> None:
+        self.__finish(True)
+        self.__raw.release_conn()
+
+    def __getattr__(self, name: str):
+        # without stream, requests reads body with read, so every chunk goes through this object
+        if name == "stream":
+            raise AttributeError(name)
+        return getattr(self.__raw, name)
+
+    def __finish(self, truncated: bool) -> None:
+        if self.__done:
+            return
+        self.__done = True
+        try:
+            self.__on_done(self.__body, truncated)
+        finally:
+            self.__body.close()
+
+
+class RecordingAdapter(BaseAdapter):
+
+    def __init__(self, adapter: HTTPAdapter, cassette: Cassette):
+        """
+        Sends requests with `adapter` and records every response into cassette. Body is recorded as crawler reads
+        it, body which is not read whole (e.g. dropped by max size or content type) is recorded truncated
+        :param adapter: adapter which sends requests
+        :param cassette: cassette
+        """
+        super(RecordingAdapter, self).__init__()
+        self.__adapter = adapter
+        self.__cassette = cassette
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        response = self.__adapter.send(request, **kwargs)
+        recorded = RecordedResponse(request.url, response.status_code, response.reason, self.__headers(response),
+                                    None)
+        response.raw = RecordingBody(response.raw, lambda body, truncated: self.__cassette.record_stream(
+            request.method, recorded._replace(truncated=truncated), body))
+        return response
+
+    @staticmethod
+    def __headers(response: requests.Response) -> List[Tuple[str, str]]:
+        # raw headers keep repeated headers (e.g. Set-Cookie)
+        if response.raw is not None and hasattr(response.raw.headers, "items"):
+            return list(response.raw.headers.items())
+        return list(response.headers.items())
+
+    def close(self) -> None:
+        self.__adapter.close()
+
+
+class ReplayAdapter(HTTPAdapter):
+
+    def __init__(self, cassette: Cassette):
+        """
+        Answers requests with responses from cassette, network is not used at all. Request which was not recorded
+        fails with ConnectionError as unreachable host would
+        :param cassette: cassette
+        """
+        super(ReplayAdapter, self).__init__()
+        self.__cassette = cassette
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        recorded = self.__cassette.replay(request.method, request.url)
+        if recorded is None:
+            raise requests.ConnectionError("{} {} is not recorded".format(request.method, request.url),
+                                           request=request)
+        return to_response(self, request, recorded)
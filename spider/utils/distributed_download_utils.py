@@ -0,0 +1,108 @@
+import logging
+from time import sleep
+from typing import Dict, List, Union
+
+import requests
+
+from spider.crawler.content_store import ContentStore
+from spider.crawler.coordinator import RemoteFrontier
+from spider.crawler.metrics import Metrics
+from spider.crawler.output_manifest import OutputManifest
+from spider.crawler.profiler import Profiler
+from spider.crawler.scheduler import HostScheduler
+from spider.crawler.shared_frontier import SharedFrontier
+from spider.crawler.url_filter import UrlFilter
+from spider.crawler.validator_store import ValidatorStore
+from spider.handlers.content_type_handler import ContentTypeHandler
+from spider.utils.download_utils import get_page
+
+__logger = logging.getLogger(__name__)
+
+
+def get_pages_distributed(shared_frontier: Union[SharedFrontier, RemoteFrontier], node: str, shard: int,
+                          urls: set, downloaded_urls: set, output_dir: str,
+                          exclude_prefixes: List[str], exclude_contains: List[str],
+                          exclude_content_types: List[str], include_contains: List[str],
+                          proxies: dict = None, max_depth: int = 1000, session: requests.Session = None,
+                          scheduler: HostScheduler = None, url_filter: UrlFilter = None,
+                          max_sizes: Dict[str, int] = None, handlers: Dict[str, ContentTypeHandler] = None,
+                          content_store: ContentStore = None, validators: ValidatorStore = None,
+                          metrics: Metrics = None, profiler: Profiler = None, manifest: OutputManifest = None,
+                          lease_size: int = 100, poll_interval: float = 1.0) -> None:
+    """
+    counterpart of get_pages for crawl running on more nodes: node leases batches of urls from shared frontier
+    (mostly urls of hosts in its shard), downloads them and reports found links back. Crawl ends when there is no
+    url waiting or leased by any node. Urls leased by node which are not done are returned when node stops
+    :param shared_frontier: frontier shared by nodes (sqlite file or coordinator)
+    :param node: unique name of node
+    :param shard: shard of node (0 <= shard < shards of frontier)
+    :param urls: seed urls, added into frontier unless they are already there
+    :param downloaded_urls: urls reported by this node (set or SeenSet modified in place), shared frontier keeps
+                            urls of whole crawl
+    :param output_dir: output dir
+    :param exclude_prefixes: prefixes for url which should be excluded
+    :param exclude_contains: phrases in url which should be excluded
+    :param exclude_content_types: excluded content types
+    :param include_contains: url must contain
+    :param proxies: proxies for connection if required
+    :param max_depth: how deep we want to download pages
+    :param session: http session shared by all downloads
+    :param scheduler: decides which leased url is downloaded next, no host limits by default
+    :param url_filter: compiled include/exclude rules, compiled from lists above if not defined
+    :param max_sizes: max body size in bytes by content type, bigger responses are dropped
+    :param handlers: handlers by content type, handlers created by create_handlers by default
+    :param content_store: if defined, pdf and zip files with the same content are extracted once
+    :param validators: if defined, conditional requests are sent for urls downloaded in previous crawl
+    :param metrics: if defined, pages, bytes, errors and time of download stages are measured
+    :param profiler: if defined, stages of sampled pages are profiled
+    :param manifest: if defined, urls with output in manifest are not downloaded again and downloaded urls are added
+    :param lease_size: max number of urls leased at once
+    :param poll_interval: how long (in seconds) node waits when other nodes have all remaining urls leased
+    :return: None
+    """
+    scheduler = scheduler if scheduler is not None else HostScheduler(session=session)
+    url_filter = url_filter if url_filter else UrlFilter(include_contains, exclude_prefixes, exclude_contains)
+    if max_depth > 0:
+        shared_frontier.add(urls, 0)
+    current_depth = None
+    try:
+        while True:
+            leased = shared_frontier.lease(node, shard, lease_size)
+            if not leased:
+                if shared_frontier.pending() == 0:
+                    break
+                # remaining urls are leased by other nodes, they can find new links or die
+                sleep(poll_interval)
+                continue
+
+            for url, url_depth in leased:
+                scheduler.add(url, url_depth)
+            while len(scheduler) > 0:
+                url, url_depth, wait = scheduler.next()
+                if not url:
+                    # every host has to wait (rate limit or backoff after error)
+                    sleep(wait if wait else 0)
+                    continue
+
+                if url_depth != current_depth:
+                    current_depth = url_depth
+                    __logger.info("current depth: {}".format(current_depth))
+
+                try:
+                    links = set()
+                    if scheduler.allowed(url):
+                        links = get_page(url, downloaded_urls, output_dir, exclude_prefixes, exclude_contains,
+                                         exclude_content_types, include_contains, proxies, session, scheduler,
+                                         url_filter, max_sizes, handlers, content_store, validators, metrics,
+                                         profiler, manifest)
+                finally:
+                    scheduler.release(url)
+                links = {link for link in links if link not in downloaded_urls} \
+                    if url_depth + 1 < max_depth else set()
+                for link in links:
+                    downloaded_urls.add(link)
+                shared_frontier.complete(node, url, links, url_depth + 1)
+    finally:
+        released = shared_frontier.release(node)
+        if released:
+            __logger.info("{} leased urls returned into shared frontier".format(released))
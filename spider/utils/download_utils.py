@@ -1,35 +1,96 @@
+import hashlib
 import logging
 import os
 import traceback
+from collections import namedtuple
+from concurrent.futures import Executor
+from tempfile import SpooledTemporaryFile
 from time import sleep
-from typing import List
+from typing import IO, Dict, List, Optional
 from urllib.parse import urlparse
 
 import requests
 from bs4 import BeautifulSoup
 
+from spider.crawler.checkpoint import Checkpoint
+from spider.crawler.content_store import ContentStore
+from spider.crawler.frontier import Frontier
+from spider.crawler.metrics import Metrics, NullMetrics, bytes_metric, download_stage, errors_metric, \
+    html_parse_stage, link_filter_stage, pages_metric, pdf_extraction_stage, ttfb_stage, zip_extraction_stage
+from spider.crawler.output_manifest import OutputManifest, sharded_name, url_hash
+from spider.crawler.profiler import NullProfiler, PageProfile, Profiler
+from spider.crawler.scheduler import HostScheduler
+from spider.crawler.url_filter import UrlFilter
+from spider.crawler.validator_store import Validator, ValidatorStore
+from spider.handlers.content_type_handler import ContentTypeHandler
 from spider.handlers.html_handler import HtmlHandler
+from spider.handlers.lxml_html_handler import LxmlHtmlHandler
+from spider.handlers.pdf_extraction_pool import PdfExtractionPool
 from spider.handlers.pdf_handler import PdfHandler
 from spider.handlers.zip_handler import ZipHandler
+from spider.storage.storage import Storage, html_kind, pdf2txt_kind, pdf_kind, zip_kind
 
 __logger = logging.getLogger(__name__)
 __ct_logger = logging.getLogger("spider.content.type")
-__ex_url_logger = logging.getLogger("spider.excluded.urls")
 __url_logger = logging.getLogger("spider.downloaded.urls")
 __err_logger = logging.getLogger("spider.errors")
-__extensions = ["html", "pdf"]
 html_content_type = "text/html"
 pdf_content_type = "application/pdf"
 zip_content_type = "application/zip"
+bs4_html_parser = "bs4"
+lxml_html_parser = "lxml"
+chunk_size = 64 * 1024
+# streamed bodies smaller than this are kept in memory, bigger ones in temporary file
+spool_size = 16 * 1024 * 1024
 
-__pdf_handler = PdfHandler()
-__html_handler = HtmlHandler()
-__zip_handler = ZipHandler(__html_handler, __pdf_handler)
+
+def create_handlers(pdf_pool: PdfExtractionPool = None, persist_pdf: bool = True, writer: Executor = None,
+                    zip_max_depth: int = 2, zip_max_member_size: Optional[int] = 100 * 1024 * 1024,
+                    zip_max_total_size: Optional[int] = 1024 * 1024 * 1024,
+                    zip_max_ratio: Optional[float] = 100.0,
+                    html_parser: str = bs4_html_parser, storage: Storage = None,
+                    manifest: OutputManifest = None) -> Dict[str, ContentTypeHandler]:
+    """
+    creates handlers for supported content types
+    :param pdf_pool: if defined, pdf text is extracted in worker processes
+    :param persist_pdf: if False, original pdf files are not saved
+    :param writer: if defined, original pdf files are saved asynchronously in this executor
+    :param zip_max_depth: how deep we go into nested zip files
+    :param zip_max_member_size: max decompressed size of single zip member
+    :param zip_max_total_size: max decompressed size of zip file (nested zip files too)
+    :param zip_max_ratio: max compression ratio of zip member
+    :param html_parser: bs4 (BeautifulSoup) or lxml (faster, single pass, original html is saved)
+    :param storage: where results are saved, files in output dir by default
+    :param manifest: if defined, paths of saved zip members are added
+    :return: handlers by content type
+    """
+    if html_parser not in (bs4_html_parser, lxml_html_parser):
+        raise ValueError("Unknown html parser: {}".format(html_parser))
+    pdf_handler = PdfHandler(pdf_pool, persist_pdf, writer, storage)
+    html_handler = LxmlHtmlHandler(storage=storage) if html_parser == lxml_html_parser else HtmlHandler(storage)
+    return {
+        html_content_type: html_handler,
+        pdf_content_type: pdf_handler,
+        zip_content_type: ZipHandler(html_handler, pdf_handler, zip_max_depth, zip_max_member_size,
+                                     zip_max_total_size, zip_max_ratio, storage=storage, manifest=manifest),
+    }
+
+
+__handlers = create_handlers()
+__null_metrics = NullMetrics()
+__null_profiler = NullProfiler()
+
+FetchedPage = namedtuple("FetchedPage", ["url", "host", "output_name", "content_type", "body", "headers", "digest",
+                                         "validator", "not_modified", "profile"])
+FetchedPage.__doc__ = """
+Page downloaded by fetch_page and waiting for process_page. Body is bytes for html, spooled file for pdf and zip
+(None for html not modified since previous crawl or saved before restart)
+"""
 
 
 def get_links(soup: BeautifulSoup, url: str, downloaded_urls: set,
               exclude_prefixes: List[str], exclude_contains: List[str],
-              include_contains: List[str]) -> set:
+              include_contains: List[str], url_filter: UrlFilter = None) -> set:
     """
     extracts links from downloaded page
     :param downloaded_urls: downloaded pages (for speedup)
@@ -38,50 +99,45 @@ def get_links(soup: BeautifulSoup, url: str, downloaded_urls: set,
     :param exclude_prefixes: some links we want to exclude
     :param exclude_contains: some links we want to exclude
     :param include_contains: urls need to contain at least one pattern from this list
+    :param url_filter: compiled include/exclude rules, compiled from lists above if not defined
+    :return: links
+    """
+    # sometimes we have <a></a>, we don't need it
+    hrefs = [link['href'] for link in soup.find_all('a', href=True) if link['href']]
+    return filter_links(hrefs, url, downloaded_urls, exclude_prefixes, exclude_contains, include_contains,
+                        url_filter)
+
+
+def filter_links(hrefs: List[str], url: str, downloaded_urls: set,
+                 exclude_prefixes: List[str], exclude_contains: List[str],
+                 include_contains: List[str], url_filter: UrlFilter = None) -> set:
+    """
+    builds absolute urls from hrefs found on page and filters them
+    :param hrefs: hrefs of <a> tags
+    :param url: parent url
+    :param downloaded_urls: downloaded pages (for speedup)
+    :param exclude_prefixes: some links we want to exclude
+    :param exclude_contains: some links we want to exclude
+    :param include_contains: urls need to contain at least one pattern from this list
+    :param url_filter: compiled include/exclude rules, compiled from lists above if not defined
     :return: links
     """
     parsed_uri = urlparse(url)
     domain = '{uri.scheme}://{uri.netloc}'.format(uri=parsed_uri)
 
-    links = set()
-    for link in soup.find_all('a'):
-        href = link.get('href')
-        include = False
-
-        # sometimes we have <a></a>, we don't need it
-        if href:
-            href = __build_url(domain, href)
-
-            for contain in include_contains:
-                if contain in href:
-                    include = True
-                    break
-
-            for prefix in exclude_prefixes:
-                if href.startswith(prefix) or href == "/":
-                    __ex_url_logger.info("Prefix '{}' is excluded, drop url: {}".format(prefix, href))
-                    include = False
-                    break
-
-            for contain in exclude_contains:
-                if contain in href:
-                    __ex_url_logger.info("Contains '{}', drop url: {}".format(contain, href))
-                    include = False
-                    break
-
-            if href in downloaded_urls:
-                __ex_url_logger.info("Href '{}' is downloaded, we skip it".format(href))
-                include = False
-
-            if include:
-                links.add(href)
-    return links
+    urls = [__build_url(domain, href) for href in hrefs]
+    url_filter = url_filter if url_filter else UrlFilter(include_contains, exclude_prefixes, exclude_contains)
+    return url_filter.filter(urls, downloaded_urls)
 
 
 def get_page(url: str, downloaded_urls: set, output_dir: str,
              exclude_prefixes: List[str], exclude_contains: List[str],
              exclude_content_types: List[str], include_contains: List[str],
-             proxies: dict = None) -> set:
+             proxies: dict = None, session: requests.Session = None, scheduler: HostScheduler = None,
+             url_filter: UrlFilter = None, max_sizes: Dict[str, int] = None,
+             handlers: Dict[str, ContentTypeHandler] = None, content_store: ContentStore = None,
+             validators: ValidatorStore = None, metrics: Metrics = None, profiler: Profiler = None,
+             manifest: OutputManifest = None) -> set:
     """
     get single page
     :param exclude_content_types: excluded content types
@@ -92,62 +148,287 @@ def get_page(url: str, downloaded_urls: set, output_dir: str,
     :param exclude_contains: phrases in url which should be excluded
     :param include_contains: url must contain
     :param proxies: proxies for connection if required
+    :param session: http session with pooled connections, if not defined new connection is opened
+    :param scheduler: if defined, host of url is blocked for a while after error instead of whole crawl
+    :param url_filter: compiled include/exclude rules, compiled from lists above if not defined
+    :param max_sizes: max body size in bytes by content type, bigger responses are dropped
+    :param handlers: handlers by content type, handlers created by create_handlers by default
+    :param content_store: if defined, pdf and zip files with the same content are extracted once
+    :param validators: if defined, conditional request is sent for url downloaded in previous crawl and its output
+                       is reused if url is not modified
+    :param metrics: if defined, pages, bytes, errors and time of download stages are measured
+    :param profiler: if defined, stages of sampled pages are profiled
+    :param manifest: if defined, url with output in manifest is not downloaded again and downloaded url is added
     :return: urls found on current url web page
     """
+    metrics = metrics if metrics else __null_metrics
+    handlers = handlers if handlers else __handlers
+    profile = (profiler if profiler else __null_profiler).page(url)
+    # noinspection PyBroadException
+    try:
+        page = __fetch(url, output_dir, exclude_content_types, proxies, session, max_sizes, handlers,
+                       content_store, validators, metrics, profile, manifest)
+        if not page:
+            return set()
+        return __process(page, downloaded_urls, output_dir, exclude_prefixes, exclude_contains, include_contains,
+                         url_filter, handlers, validators, metrics, manifest, content_store)
+
+    except Exception:
+        __on_error(url, metrics, scheduler)
+        return set()
+    finally:
+        profile.finish()
+
+
+def fetch_page(url: str, output_dir: str, exclude_content_types: List[str], proxies: dict = None,
+               session: requests.Session = None, scheduler: HostScheduler = None, max_sizes: Dict[str, int] = None,
+               handlers: Dict[str, ContentTypeHandler] = None, content_store: ContentStore = None,
+               validators: ValidatorStore = None, metrics: Metrics = None,
+               profiler: Profiler = None, manifest: OutputManifest = None) -> Optional[FetchedPage]:
+    """
+    first half of get_page: downloads page, html body is read into memory, pdf and zip bodies are spooled
+    :param url: url to download
+    :param output_dir: output dir
+    :param exclude_content_types: excluded content types
+    :param proxies: proxies for connection if required
+    :param session: http session with pooled connections, if not defined new connection is opened
+    :param scheduler: if defined, host of url is blocked for a while after error instead of whole crawl
+    :param max_sizes: max body size in bytes by content type, bigger responses are dropped
+    :param handlers: handlers by content type, handlers created by create_handlers by default
+    :param content_store: if defined, pdf and zip files with the same content are not downloaded again
+    :param validators: if defined, conditional request is sent for url downloaded in previous crawl
+    :param metrics: if defined, pages, bytes, errors and time of download stages are measured
+    :param profiler: if defined, stages of sampled pages are profiled
+    :param manifest: if defined, url with output in manifest is not downloaded again
+    :return: page which has to be processed by process_page, None if there is nothing to process
+    """
+    metrics = metrics if metrics else __null_metrics
+    handlers = handlers if handlers else __handlers
+    profile = (profiler if profiler else __null_profiler).page(url)
+    # noinspection PyBroadException
+    try:
+        page = __fetch(url, output_dir, exclude_content_types, proxies, session, max_sizes, handlers,
+                       content_store, validators, metrics, profile, manifest)
+    except Exception:
+        __on_error(url, metrics, scheduler)
+        page = None
+    if not page:
+        profile.finish()
+    return page
+
+
+def process_page(page: FetchedPage, downloaded_urls: set, output_dir: str,
+                 exclude_prefixes: List[str], exclude_contains: List[str], include_contains: List[str],
+                 url_filter: UrlFilter = None, handlers: Dict[str, ContentTypeHandler] = None,
+                 validators: ValidatorStore = None, metrics: Metrics = None,
+                 manifest: OutputManifest = None, content_store: ContentStore = None) -> set:
+    """
+    second half of get_page: saves page fetched by fetch_page (html is parsed, text of pdf and zip is extracted)
+    :param page: fetched page
+    :param downloaded_urls: list of downloaded pages (for speedup)
+    :param output_dir: output dir
+    :param exclude_prefixes: prefixes for url which should be excluded
+    :param exclude_contains: phrases in url which should be excluded
+    :param include_contains: url must contain
+    :param url_filter: compiled include/exclude rules, compiled from lists above if not defined
+    :param handlers: handlers by content type, handlers created by create_handlers by default
+    :param validators: if defined, validators of page are saved
+    :param metrics: if defined, time of processing stages is measured
+    :param manifest: if defined, url is added into manifest
+    :param content_store: if defined, content of saved pdf or zip is registered, so its duplicates are not extracted
+    :return: urls found on page
+    """
+    metrics = metrics if metrics else __null_metrics
+    handlers = handlers if handlers else __handlers
     # noinspection PyBroadException
     try:
-        output_name = get_output_name(url)
+        return __process(page, downloaded_urls, output_dir, exclude_prefixes, exclude_contains, include_contains,
+                         url_filter, handlers, validators, metrics, manifest, content_store)
+    except Exception:
+        __err_logger.error("Can't process page '{}'".format(page.url))
+        traceback.print_exc()
+        metrics.inc(errors_metric, host=page.host)
+        return set()
+    finally:
+        page.profile.finish()
 
-        # we check if we have downloaded url (result.html exists)
-        for e in __extensions:
-            if os.path.isfile("{}/{}.{}".format(output_dir, output_name, e)):
-                __err_logger.warning("File {} is downloaded, skip it!".format(output_name))
-                return set()
 
-        links = set()
-        response = requests.get(url, proxies=proxies)
+def __fetch(url: str, output_dir: str, exclude_content_types: List[str], proxies: Optional[dict],
+            session: Optional[requests.Session], max_sizes: Optional[Dict[str, int]],
+            handlers: Dict[str, ContentTypeHandler], content_store: Optional[ContentStore],
+            validators: Optional[ValidatorStore], metrics: Metrics, profile: PageProfile,
+            manifest: Optional[OutputManifest]) -> Optional[FetchedPage]:
+    host = urlparse(url).netloc
+    output_name = get_output_name(url)
+
+    # we check if we have downloaded url (manifest is in memory), on recrawl validators decide
+    if manifest and not validators and manifest.contains(url):
+        if manifest.content_type(url) == html_content_type:
+            # url restored from checkpoint can have output while its links were not saved, links are taken from
+            # saved html (like for page not modified since previous crawl)
+            __logger.info("File {} is downloaded, take links from it".format(output_name))
+            return FetchedPage(url, host, output_name, html_content_type, None, None, None, None, True, profile)
+        __err_logger.warning("File {} is downloaded, skip it!".format(output_name))
+        return None
+
+    max_sizes = max_sizes if max_sizes else {}
+    http = session if session else requests
+    storage = handlers[html_content_type].get_storage(output_dir)
+    validator = validators.get(url) if validators else None
+    if validator and not __has_output(storage, output_name, validator.content_type):
+        # output from previous crawl is missing, we need whole body
+        validator = None
+    request_headers = ValidatorStore.conditional_headers(validator) if validator else None
+    # body is streamed, so we can decide what to do with response before it is downloaded
+    with metrics.time(ttfb_stage, host=host), profile.stage(ttfb_stage):
+        response = http.get(url, proxies=proxies, stream=True, headers=request_headers)
+    try:
         __url_logger.info("Download page '{}' with status {}".format(url, response.status_code))
-        if response.ok:
+        if response.status_code == 304 and validator:
+            metrics.inc(pages_metric, content_type=validator.content_type, host=host, status=304)
+            # not modified since previous crawl, we reuse its output, links are taken from saved html
+            if validator.content_type == html_content_type:
+                return FetchedPage(url, host, output_name, html_content_type, None, None, None, validator, True,
+                                   profile)
+
+        elif response.ok:
             headers = response.headers
             content_type = str(headers['content-type'])
+            digest = hashlib.sha256() if content_store or validators else None
+            metrics.inc(pages_metric, content_type=__content_type_label(content_type), host=host,
+                        status=response.status_code)
+
+            excluded = next((excluded for excluded in exclude_content_types if excluded in content_type), None)
+            if excluded:
+                # decided by headers, body is not downloaded, connection is dropped when response is closed
+                __ct_logger.info("ContentType {} is excluded, url: {}".format(content_type, url))
 
-            if html_content_type in content_type and html_content_type not in exclude_content_types:
-                soup = BeautifulSoup(response.content, "lxml")
-                __html_handler.save_result(output_dir, output_name, soup)
-                links |= get_links(soup, url, downloaded_urls, exclude_prefixes, exclude_contains, include_contains)
+            elif html_content_type in content_type:
+                with metrics.time(download_stage, content_type=html_content_type, host=host), \
+                        profile.stage(download_stage):
+                    content = read_body(response, max_sizes.get(html_content_type))
+                if content is not None:
+                    metrics.inc(bytes_metric, len(content), content_type=html_content_type, host=host)
+                    if digest:
+                        digest.update(content)
+                    return FetchedPage(url, host, output_name, html_content_type, content, headers, digest,
+                                       validator, False, profile)
 
-            elif pdf_content_type in content_type and pdf_content_type not in exclude_content_types:
-                __pdf_handler.save_result(output_dir, output_name, response.content)
+            elif pdf_content_type in content_type:
+                return __fetch_document(url, host, output_name, pdf_content_type, response, max_sizes, handlers,
+                                        content_store, validators, validator, digest, metrics, profile)
 
-            elif zip_content_type in content_type and zip_content_type not in exclude_content_types:
-                __zip_handler.save_result(output_dir, output_name, response.content)
+            elif zip_content_type in content_type:
+                return __fetch_document(url, host, output_name, zip_content_type, response, max_sizes, handlers,
+                                        content_store, validators, validator, digest, metrics, profile)
 
             else:
                 __ct_logger.warning("ContentType {} is not implemented, url: {}".format(content_type, url))
 
         else:
+            metrics.inc(pages_metric, host=host, status=response.status_code)
             __err_logger.warning("Response is invalid, code: {}, url: {}".format(response.status_code, url))
-        return links
+        return None
+    finally:
+        # body which was not read is dropped together with connection
+        response.close()
 
-    except Exception:
-        # most exceptions occur because of proxy delay, we take some time and continue
-        __err_logger.error("Can't download page '{}'".format(url))
-        traceback.print_exc()
+
+def __fetch_document(url: str, host: str, output_name: str, content_type: str, response: requests.Response,
+                     max_sizes: Dict[str, int], handlers: Dict[str, ContentTypeHandler],
+                     content_store: Optional[ContentStore], validators: Optional[ValidatorStore],
+                     validator: Optional[Validator], digest, metrics: Metrics,
+                     profile: PageProfile) -> Optional[FetchedPage]:
+    headers = response.headers
+    # duplicate known by headers is not downloaded at all
+    if __is_duplicate(url, output_name, headers, content_store):
+        return None
+    # pdf and zip are processed from spooled body (big body is spooled into temporary file), they are not read back
+    # from output dir
+    with metrics.time(download_stage, content_type=content_type, host=host), profile.stage(download_stage):
+        body = spool_body(response, max_sizes.get(content_type), digest, handlers[content_type].spool_file())
+    if body is None:
+        return None
+    metrics.inc(bytes_metric, __body_size(body), content_type=content_type, host=host)
+    if __is_duplicate(url, output_name, headers, content_store, digest) or __is_unchanged(url, validator, digest):
+        body.close()
+        __save_validator(validators, url, output_name, content_type, headers, digest)
+        return None
+    return FetchedPage(url, host, output_name, content_type, body, headers, digest, validator, False, profile)
+
+
+def __process(page: FetchedPage, downloaded_urls: set, output_dir: str,
+              exclude_prefixes: List[str], exclude_contains: List[str], include_contains: List[str],
+              url_filter: Optional[UrlFilter], handlers: Dict[str, ContentTypeHandler],
+              validators: Optional[ValidatorStore], metrics: Metrics, manifest: Optional[OutputManifest],
+              content_store: Optional[ContentStore]) -> set:
+    url, host, output_name, profile = page.url, page.host, page.output_name, page.profile
+    links = set()
+    if page.content_type == html_content_type:
+        # html parse includes write of page (measured as write stage too)
+        with metrics.time(html_parse_stage, content_type=html_content_type, host=host), \
+                profile.stage(html_parse_stage):
+            if page.not_modified:
+                storage = handlers[html_content_type].get_storage(output_dir)
+                hrefs = handlers[html_content_type].get_hrefs(storage.read(html_kind, "{}.html".format(output_name)))
+            elif __is_unchanged(url, page.validator, page.digest):
+                hrefs = handlers[html_content_type].get_hrefs(page.body)
+            else:
+                hrefs = handlers[html_content_type].save_content(output_dir, output_name, page.body)
+        with metrics.time(link_filter_stage, content_type=html_content_type, host=host), \
+                profile.stage(link_filter_stage):
+            links |= filter_links(hrefs, url, downloaded_urls, exclude_prefixes, exclude_contains,
+                                  include_contains, url_filter)
+        if not page.not_modified:
+            __save_validator(validators, url, output_name, html_content_type, page.headers, page.digest)
+
+    elif page.content_type == pdf_content_type:
+        # with pdf pool, only time until pdf is handed over to workers is measured
+        with metrics.time(pdf_extraction_stage, content_type=pdf_content_type, host=host), \
+                profile.stage(pdf_extraction_stage):
+            handlers[pdf_content_type].save_stream(output_dir, output_name, page.body)
+        __add_content(page, content_store)
+        __save_validator(validators, url, output_name, pdf_content_type, page.headers, page.digest)
+
+    elif page.content_type == zip_content_type:
+        with metrics.time(zip_extraction_stage, content_type=zip_content_type, host=host), \
+                profile.stage(zip_extraction_stage):
+            handlers[zip_content_type].save_stream(output_dir, output_name, page.body)
+        __add_content(page, content_store)
+        __save_validator(validators, url, output_name, zip_content_type, page.headers, page.digest)
+    if manifest:
+        manifest.add(url, page.content_type)
+    return links
+
+
+def __on_error(url: str, metrics: Metrics, scheduler: Optional[HostScheduler]) -> None:
+    # most exceptions occur because of proxy delay, we take some time and continue
+    __err_logger.error("Can't download page '{}'".format(url))
+    traceback.print_exc()
+    metrics.inc(errors_metric, host=urlparse(url).netloc)
+    # scheduler without queued urls is empty, but it is still scheduler
+    if scheduler is not None:
+        scheduler.backoff(url, 2)
+    else:
         sleep(2)
-        return set()
 
 
 def get_pages(urls: set, downloaded_urls: set, output_dir: str, depth: int,
               exclude_prefixes: List[str], exclude_contains: List[str],
               exclude_content_types: List[str], include_contains: List[str],
-              proxies: dict = None, max_depth: int = 1000) -> None:
+              proxies: dict = None, max_depth: int = 1000, session: requests.Session = None,
+              frontier: Frontier = None, checkpoint: Checkpoint = None, scheduler: HostScheduler = None,
+              url_filter: UrlFilter = None, max_sizes: Dict[str, int] = None,
+              handlers: Dict[str, ContentTypeHandler] = None, content_store: ContentStore = None,
+              validators: ValidatorStore = None, metrics: Metrics = None, profiler: Profiler = None,
+              manifest: OutputManifest = None) -> None:
     """
-    allows to get pages from urls defined as parameter
+    allows to get pages from urls defined as parameter. Pages are downloaded in breadth-first order from frontier,
+    found links are pushed at the end of frontier with incremented depth
     :param exclude_content_types: excluded content types
     :param urls: url addresses to download
-    :param downloaded_urls: downloaded urls. Because of recursive calls, we don't want to download again the same
-                            urls. We collect all downloaded urls and we put it into next iteration for subtraction
-                            and saving time.
+    :param downloaded_urls: downloaded urls. We don't want to download again the same urls, so every url pushed into
+                            frontier is added here (set or SeenSet, modified in place)
     :param output_dir: output dir
     :param depth: current depth
     :param exclude_prefixes: prefixes for url which should be excluded
@@ -155,24 +436,228 @@ def get_pages(urls: set, downloaded_urls: set, output_dir: str, depth: int,
     :param include_contains: url must contain
     :param proxies: proxies for connection if required
     :param max_depth: how deep we want to download pages
+    :param session: http session shared by all downloads
+    :param frontier: queue of urls waiting for download, new in-memory frontier by default
+    :param checkpoint: if defined, crawl state is saved into it, so crawl can be resumed
+    :param scheduler: decides which url from frontier is downloaded next, no host limits by default
+    :param url_filter: compiled include/exclude rules, compiled from lists above if not defined
+    :param max_sizes: max body size in bytes by content type, bigger responses are dropped
+    :param handlers: handlers by content type, handlers created by create_handlers by default
+    :param content_store: if defined, pdf and zip files with the same content are extracted once
+    :param validators: if defined, conditional requests are sent for urls downloaded in previous crawl
+    :param metrics: if defined, pages, bytes, errors and time of download stages are measured
+    :param profiler: if defined, stages of sampled pages are profiled
+    :param manifest: if defined, urls with output in manifest are not downloaded again and downloaded urls are added
+    :return: None
+    """
+    own_frontier = frontier is None
+    frontier = Frontier() if own_frontier else frontier
+    scheduler = scheduler if scheduler is not None else HostScheduler(session=session)
+    url_filter = url_filter if url_filter else UrlFilter(include_contains, exclude_prefixes, exclude_contains)
+    try:
+        push_urls(frontier, urls, downloaded_urls, depth, max_depth, checkpoint)
+        current_depth = None
+        while True:
+            scheduler.fill(frontier)
+            if len(scheduler) == 0:
+                break
+
+            url, url_depth, wait = scheduler.next()
+            if not url:
+                # every host has to wait (rate limit or backoff after error)
+                sleep(wait if wait else 0)
+                continue
+
+            if url_depth != current_depth:
+                current_depth = url_depth
+                __logger.info("current depth: {}".format(current_depth))
+
+            try:
+                links = set()
+                if scheduler.allowed(url):
+                    links = get_page(url, downloaded_urls, output_dir, exclude_prefixes, exclude_contains,
+                                     exclude_content_types, include_contains, proxies, session, scheduler,
+                                     url_filter, max_sizes, handlers, content_store, validators, metrics,
+                                     profiler, manifest)
+            finally:
+                scheduler.release(url)
+            push_urls(frontier, links, downloaded_urls, url_depth + 1, max_depth, checkpoint)
+            if checkpoint:
+                checkpoint.done(url)
+                checkpoint.flush_if_due()
+    finally:
+        if own_frontier:
+            frontier.close()
+
+
+def push_urls(frontier: Frontier, urls: set, downloaded_urls: set, depth: int, max_depth: int,
+              checkpoint: Checkpoint = None) -> None:
+    """
+    pushes not seen urls into frontier and marks them as downloaded
+    :param frontier: frontier
+    :param urls: found urls
+    :param downloaded_urls: downloaded (or already queued) urls, modified in place
+    :param depth: depth of urls
+    :param max_depth: urls at this depth (and deeper) are not downloaded at all
+    :param checkpoint: if defined, pushed urls are saved into it
     :return: None
     """
-    __logger.info("current depth: {}".format(depth))
-    urls_list = urls - downloaded_urls
-    if depth < max_depth and len(urls_list) > 0:
-        child_links = set()
+    if depth >= max_depth:
+        return
+    for url in urls:
+        if url not in downloaded_urls:
+            downloaded_urls.add(url)
+            frontier.push(url, depth)
+            if checkpoint:
+                checkpoint.queued(url, depth)
+
+
+def read_body(response: requests.Response, max_size: Optional[int] = None) -> Optional[bytes]:
+    """
+    reads whole body of streamed response
+    :param response: streamed response
+    :param max_size: max body size in bytes, unlimited if not defined
+    :return: body, None if body is bigger than max_size
+    """
+    if __too_large(response, max_size):
+        return None
+    chunks = []
+    size = 0
+    for chunk in response.iter_content(chunk_size):
+        size += len(chunk)
+        if max_size and size > max_size:
+            __err_logger.warning("Body is bigger than {} bytes, drop url: {}".format(max_size, response.url))
+            return None
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def spool_body(response: requests.Response, max_size: Optional[int] = None, digest=None,
+               spool: IO[bytes] = None) -> Optional[IO[bytes]]:
+    """
+    reads body of streamed response into spooled temporary file: small bodies stay in memory, bigger than
+    `spool_size` are moved into temporary file
+    :param response: streamed response
+    :param max_size: max body size in bytes, unlimited if not defined
+    :param digest: if defined, hash object (e.g. hashlib.sha256()) updated with body
+    :param spool: if defined, body is written into this file object instead (e.g. named temporary file), it is
+                  closed when body is dropped
+    :return: file object positioned at the beginning, None if body is bigger than max_size
+    """
+    if __too_large(response, max_size):
+        if spool is not None:
+            spool.close()
+        return None
+    size = 0
+    body = spool if spool is not None else SpooledTemporaryFile(max_size=spool_size, prefix="spider-body-")
+    for chunk in response.iter_content(chunk_size):
+        size += len(chunk)
+        if max_size and size > max_size:
+            body.close()
+            __err_logger.warning("Body is bigger than {} bytes, drop url: {}".format(max_size, response.url))
+            return None
+        body.write(chunk)
+        if digest:
+            digest.update(chunk)
+    body.seek(0)
+    return body
+
+
+def get_output_name(url: str) -> str:
+    """
+    :param url: url
+    :return: output name of url: hash of url in two-level shard directories (e.g. 3f/a1/3fa1...), manifest maps hash
+             back to url (see OutputManifest)
+    """
+    return sharded_name(url_hash(url))
+
+
+def __is_duplicate(url: str, output_name: str, headers, content_store: Optional[ContentStore],
+                   digest=None) -> bool:
+    """
+    checks if content of url was downloaded before, duplicate is recorded as reference
+    :param url: url
+    :param output_name: output name of url
+    :param headers: response headers
+    :param content_store: content store, nothing is duplicate if not defined
+    :param digest: hash of downloaded body, if not defined only headers are checked
+    :return: True if content was downloaded before
+    """
+    if not content_store:
+        return False
+    original = content_store.find(url, headers, digest.hexdigest() if digest else None)
+    if original:
+        content_store.reference(url, output_name, original)
+        return True
+    return False
+
+
+def __add_content(page: FetchedPage, content_store: Optional[ContentStore]) -> None:
+    # content is registered only when handler saved it, otherwise duplicates would reference missing output
+    if content_store and page.digest:
+        content_store.add(page.url, page.output_name, page.digest.hexdigest(), page.headers)
+
+
+def __content_type_label(content_type: str) -> str:
+    for known in (html_content_type, pdf_content_type, zip_content_type):
+        if known in content_type:
+            return known
+    return "other"
+
+
+def __body_size(body: IO[bytes]) -> int:
+    body.seek(0, os.SEEK_END)
+    size = body.tell()
+    body.seek(0)
+    return size
+
+
+def __has_output(storage: Storage, output_name: str, content_type: str) -> bool:
+    """
+    checks if output of url from previous crawl exists
+    :param storage: storage of results
+    :param output_name: output name of url
+    :param content_type: content type of url in previous crawl
+    :return: True if output exists
+    """
+    if content_type == html_content_type:
+        return storage.exists(html_kind, "{}.html".format(output_name))
+    if content_type == pdf_content_type:
+        return storage.exists(pdf2txt_kind, "{}.txt".format(output_name)) or \
+            storage.exists(pdf_kind, "{}.pdf".format(output_name))
+    if content_type == zip_content_type:
+        return storage.exists(zip_kind, "{}.zip".format(output_name))
+    return False
+
+
+def __is_unchanged(url: str, validator: Optional[Validator], digest) -> bool:
+    """
+    checks if body is the same as in previous crawl (for servers which don't support conditional requests)
+    :param url: url
+    :param validator: validator from previous crawl
+    :param digest: hash of downloaded body
+    :return: True if body is not changed, its output can be reused
+    """
+    if validator and digest and validator.digest == digest.hexdigest():
+        __logger.info("Url {} is not changed since previous crawl".format(url))
+        return True
+    return False
 
-        for i, u in enumerate(urls_list):
-            child_links |= get_page(u, downloaded_urls, output_dir, exclude_prefixes, exclude_contains,
-                                    exclude_content_types, include_contains, proxies)
 
-        get_pages(child_links, downloaded_urls | urls, output_dir, depth + 1,
-                  exclude_prefixes, exclude_contains, exclude_content_types, include_contains, proxies, max_depth)
+def __save_validator(validators: Optional[ValidatorStore], url: str, output_name: str, content_type: str, headers,
+                     digest) -> None:
+    if validators:
+        validators.put(url, Validator(output_name, content_type, headers.get('etag'), headers.get('last-modified'),
+                                      digest.hexdigest() if digest else None))
 
 
-def get_output_name(url: str):
-    return url.replace("://", "_").replace(".", "_").replace("/", "_").replace("#", "_").replace("?", "_") \
-        .replace("=", "_").replace(":", "_").replace("%", "_").replace("&", "_").replace("-", "_")
+def __too_large(response: requests.Response, max_size: Optional[int]) -> bool:
+    content_length = response.headers.get('content-length')
+    if max_size and content_length and content_length.isdigit() and int(content_length) > max_size:
+        __err_logger.warning("Content-Length {} is bigger than {} bytes, drop url: {}".format(content_length,
+                                                                                             max_size, response.url))
+        return True
+    return False
 
 
 def __build_url(domain: str, href: str) -> str:
@@ -1,6 +1,23 @@
+import mmap
 import os
+from contextlib import contextmanager
 
 
 def create_dir_if_not_exist(dirname: str):
     if not os.path.exists(dirname):
         os.makedirs(dirname)
+
+
+@contextmanager
+def map_file(file_name: str):
+    """
+    memory-maps file for reading, so it is not copied into memory
+    :param file_name: file name
+    :return: read-only file-like object (mmap, or file object for empty file which can't be mapped)
+    """
+    with open(file_name, "rb") as fp:
+        if os.fstat(fp.fileno()).st_size == 0:
+            yield fp
+        else:
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield mm
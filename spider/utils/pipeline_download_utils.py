@@ -0,0 +1,243 @@
+import logging
+import os
+import threading
+import traceback
+from queue import Empty, Queue
+from time import sleep
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+from spider.crawler.checkpoint import Checkpoint
+from spider.crawler.content_store import ContentStore
+from spider.crawler.frontier import Frontier
+from spider.crawler.metrics import Metrics
+from spider.crawler.output_manifest import OutputManifest
+from spider.crawler.profiler import Profiler
+from spider.crawler.scheduler import HostScheduler
+from spider.crawler.url_filter import UrlFilter
+from spider.crawler.validator_store import ValidatorStore
+from spider.handlers.content_type_handler import ContentTypeHandler
+from spider.utils.download_utils import FetchedPage, fetch_page, html_content_type, pdf_content_type, \
+    process_page, push_urls, zip_content_type
+
+__logger = logging.getLogger(__name__)
+
+# workers processing fetched pages, by content type
+default_pipeline_workers = {
+    html_content_type: os.cpu_count() or 1,
+    pdf_content_type: 2,
+    zip_content_type: 1,
+}
+
+
+class Stage(object):
+
+    def __init__(self, name: str, workers: int, queue_size: int, process: Callable[[Any], None]):
+        """
+        Worker threads taking items from bounded queue. When queue is full, put blocks, so stage which feeds this
+        one slows down (backpressure)
+        :param name: name of stage (prefix of thread names)
+        :param workers: number of worker threads
+        :param queue_size: max number of items waiting in queue
+        :param process: called for every item in worker thread
+        """
+        super(Stage, self).__init__()
+        self._err_logger = logging.getLogger("spider.errors")
+        self.name = name
+        self.__queue = Queue(max(queue_size, 1))
+        self.__process = process
+        self.__threads: List[threading.Thread] = []
+        for number in range(max(workers, 1)):
+            thread = threading.Thread(target=self.__run, name="{}-{}".format(name, number), daemon=True)
+            thread.start()
+            self.__threads.append(thread)
+
+    def put(self, item: Any) -> None:
+        """
+        adds item into queue, waits while queue is full
+        :param item: item
+        :return: None
+        """
+        self.__queue.put(item)
+
+    def close(self) -> None:
+        """
+        processes queued items and stops workers
+        :return: None
+        """
+        for _ in self.__threads:
+            self.__queue.put(None)
+        for thread in self.__threads:
+            thread.join()
+        self.__threads = []
+
+    def __run(self) -> None:
+        while True:
+            item = self.__queue.get()
+            if item is None:
+                return
+            # noinspection PyBroadException
+            try:
+                self.__process(item)
+            except Exception:
+                self._err_logger.error("Stage {} failed".format(self.name))
+                traceback.print_exc()
+
+
+def get_pages_pipeline(urls: set, downloaded_urls: set, output_dir: str, depth: int,
+                       exclude_prefixes: List[str], exclude_contains: List[str],
+                       exclude_content_types: List[str], include_contains: List[str],
+                       proxies: dict = None, max_depth: int = 1000, concurrency: int = 64,
+                       session: requests.Session = None, frontier: Frontier = None,
+                       checkpoint: Checkpoint = None, scheduler: HostScheduler = None,
+                       url_filter: UrlFilter = None, max_sizes: Dict[str, int] = None,
+                       handlers: Dict[str, ContentTypeHandler] = None, content_store: ContentStore = None,
+                       validators: ValidatorStore = None, metrics: Metrics = None, profiler: Profiler = None,
+                       manifest: OutputManifest = None, workers: Dict[str, int] = None,
+                       queue_size: int = 100) -> None:
+    """
+    counterpart of get_pages where download and processing of pages are separate stages: `concurrency` fetchers
+    download pages, fetched pages wait in bounded queue of their content type for its workers (html parsers, pdf
+    and zip extractors). When queue of content type is full, fetchers wait, so crawl doesn't download faster than
+    pages are processed. Frontier and scheduler queues are touched only from calling thread
+    :param urls: url addresses to download
+    :param downloaded_urls: downloaded (or already queued) urls, set or SeenSet modified in place
+    :param output_dir: output dir
+    :param depth: current depth
+    :param exclude_prefixes: prefixes for url which should be excluded
+    :param exclude_contains: phrases in url which should be excluded
+    :param exclude_content_types: excluded content types
+    :param include_contains: url must contain
+    :param proxies: proxies for connection if required
+    :param max_depth: how deep we want to download pages
+    :param concurrency: number of fetchers (max number of pages downloaded at the same time)
+    :param session: http session shared by all downloads, its pool size should be at least `concurrency`
+    :param frontier: queue of urls waiting for download, new in-memory frontier by default
+    :param checkpoint: if defined, crawl state is saved into it, so crawl can be resumed
+    :param scheduler: decides which url from frontier is downloaded next, no host limits by default
+    :param url_filter: compiled include/exclude rules, compiled from lists above if not defined
+    :param max_sizes: max body size in bytes by content type, bigger responses are dropped
+    :param handlers: handlers by content type, handlers created by create_handlers by default
+    :param content_store: if defined, pdf and zip files with the same content are extracted once
+    :param validators: if defined, conditional requests are sent for urls downloaded in previous crawl
+    :param metrics: if defined, pages, bytes, errors and time of download stages are measured
+    :param profiler: if defined, stages of sampled pages are profiled
+    :param manifest: if defined, urls with output in manifest are not downloaded again and downloaded urls are added
+    :param workers: number of workers by content type (see default_pipeline_workers)
+    :param queue_size: max number of fetched pages waiting for workers of single content type
+    :return: None
+    """
+    own_frontier = frontier is None
+    frontier = Frontier() if own_frontier else frontier
+    if scheduler is None:
+        scheduler = HostScheduler(session=session, window=max(concurrency * 4, 1000))
+    url_filter = url_filter if url_filter else UrlFilter(include_contains, exclude_prefixes, exclude_contains)
+    workers = dict(default_pipeline_workers, **workers) if workers else default_pipeline_workers
+    # fetchers and processors report to calling thread: ("fetched",) when fetcher is free again and
+    # ("done", url, depth, links) when page is finished
+    events = Queue()
+
+    def process(item) -> None:
+        page, url_depth = item
+        links = set()
+        try:
+            links = process_page(page, downloaded_urls, output_dir, exclude_prefixes, exclude_contains,
+                                 include_contains, url_filter, handlers, validators, metrics, manifest,
+                                 content_store)
+        finally:
+            events.put(("done", page.url, url_depth, links))
+
+    processors = {content_type: Stage(content_type.split("/")[-1], count, queue_size, process)
+                  for content_type, count in workers.items()}
+
+    def fetch(item) -> None:
+        url, url_depth = item
+        page: Optional[FetchedPage] = None
+        queued = False
+        try:
+            try:
+                if scheduler.allowed(url):
+                    page = fetch_page(url, output_dir, exclude_content_types, proxies, session, scheduler,
+                                      max_sizes, handlers, content_store, validators, metrics, profiler,
+                                      manifest)
+            finally:
+                # host is free for next download while page is processed, depth level is done after its links are
+                # queued
+                scheduler.release(url, processed=False)
+            if page:
+                # waits while workers of content type are behind
+                processors[page.content_type].put((page, url_depth))
+                queued = True
+        finally:
+            if page and not queued:
+                # page which is not processed releases its profile sample here
+                page.profile.finish()
+            events.put(("fetched",))
+            if not queued:
+                events.put(("done", url, url_depth, set()))
+
+    fetchers = Stage("fetch", concurrency, concurrency, fetch)
+    try:
+        __crawl(urls, downloaded_urls, depth, max_depth, concurrency, frontier, checkpoint, scheduler, fetchers,
+                events)
+    finally:
+        fetchers.close()
+        for stage in processors.values():
+            stage.close()
+        if own_frontier:
+            frontier.close()
+
+
+def __crawl(urls: set, downloaded_urls: set, depth: int, max_depth: int, concurrency: int, frontier: Frontier,
+            checkpoint: Optional[Checkpoint], scheduler: HostScheduler, fetchers: Stage, events: Queue) -> None:
+    fetching = 0
+    in_flight = 0
+    current_depth = None
+    push_urls(frontier, urls, downloaded_urls, depth, max_depth, checkpoint)
+
+    def handle(event) -> None:
+        nonlocal fetching, in_flight
+        if event[0] == "fetched":
+            fetching -= 1
+            return
+        _, url, url_depth, links = event
+        in_flight -= 1
+        try:
+            push_urls(frontier, links, downloaded_urls, url_depth + 1, max_depth, checkpoint)
+        finally:
+            scheduler.processed(url)
+        if checkpoint:
+            checkpoint.done(url)
+            checkpoint.flush_if_due()
+
+    while True:
+        while True:
+            try:
+                handle(events.get_nowait())
+            except Empty:
+                break
+
+        scheduler.fill(frontier)
+        if len(scheduler) == 0 and in_flight == 0:
+            break
+
+        url, url_depth, wait = scheduler.next() if fetching < concurrency else (None, None, None)
+        if not url:
+            if in_flight:
+                # waits for fetcher or page, or until some host is ready
+                try:
+                    handle(events.get(timeout=wait))
+                except Empty:
+                    pass
+            else:
+                sleep(wait if wait else 0)
+            continue
+
+        if url_depth != current_depth:
+            current_depth = url_depth
+            __logger.info("current depth: {}".format(current_depth))
+
+        fetching += 1
+        in_flight += 1
+        fetchers.put((url, url_depth))
@@ -0,0 +1,100 @@
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from spider.crawler.metrics import Metrics, connect_stage, stage_metric
+from spider.utils.cassette_utils import Cassette, RecordingAdapter, ReplayAdapter
+
+
+def metered_pool(pool_class, metrics: Metrics):
+    """
+    :param pool_class: urllib3 connection pool class
+    :param metrics: metrics
+    :return: subclass of `pool_class` whose connections measure time of connect (dns, tcp and tls handshake)
+    """
+    class MeteredConnection(pool_class.ConnectionCls):
+
+        def connect(self):
+            start = time.monotonic()
+            try:
+                super(MeteredConnection, self).connect()
+            finally:
+                metrics.observe(stage_metric, time.monotonic() - start, stage=connect_stage, host=self.host)
+
+    return type("Metered" + pool_class.__name__, (pool_class,), {"ConnectionCls": MeteredConnection})
+
+
+class MeteredHTTPAdapter(HTTPAdapter):
+
+    def __init__(self, metrics: Metrics, *args, **kwargs):
+        """
+        HTTPAdapter which measures time of new connections (kept alive connections are reused without connect)
+        :param metrics: metrics
+        """
+        self.__pool_classes = {
+            "http": metered_pool(HTTPConnectionPool, metrics),
+            "https": metered_pool(HTTPSConnectionPool, metrics),
+        }
+        super(MeteredHTTPAdapter, self).__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(MeteredHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self.__pool_classes
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super(MeteredHTTPAdapter, self).proxy_manager_for(proxy, **proxy_kwargs)
+        manager.pool_classes_by_scheme = self.__pool_classes
+        return manager
+
+
+class SessionManager(object):
+
+    def __init__(self, proxies: dict = None, pool_connections: int = 10, pool_maxsize: int = 10,
+                 max_retries: int = 0, metrics: Metrics = None, cassette: Cassette = None, replay: bool = False):
+        """
+        Owns http session shared by all downloads. Connections (also to proxy) are kept alive and reused,
+        so we do not pay for tcp and tls handshake for every url
+        :param proxies: proxies for connection if required
+        :param pool_connections: number of hosts for which connection pool is kept
+        :param pool_maxsize: max number of kept alive connections for single host
+        :param max_retries: how many times failed connection is retried
+        :param metrics: if defined, time of new connections is measured
+        :param cassette: if defined, every response is recorded into it
+        :param replay: if True, responses are replayed from cassette instead of network
+        """
+        super(SessionManager, self).__init__()
+        self.__session = requests.Session()
+        if proxies:
+            self.__session.proxies.update(proxies)
+
+        if metrics:
+            adapter = MeteredHTTPAdapter(metrics, pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                         max_retries=max_retries)
+        else:
+            adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                  max_retries=max_retries)
+        if cassette and replay:
+            adapter = ReplayAdapter(cassette)
+        elif cassette:
+            adapter = RecordingAdapter(adapter, cassette)
+        self.__session.mount("http://", adapter)
+        self.__session.mount("https://", adapter)
+
+    @property
+    def session(self) -> requests.Session:
+        return self.__session
+
+    def close(self) -> None:
+        """
+        closes all pooled connections
+        :return: None
+        """
+        self.__session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,104 @@
+import threading
+from typing import Dict, List
+from unittest import TestCase, mock
+
+from requests import Session
+
+from spider.crawler.content_store import ContentStore
+from spider.crawler.frontier import Frontier
+from spider.crawler.metrics import Metrics
+from spider.crawler.output_manifest import OutputManifest
+from spider.crawler.profiler import Profiler
+from spider.crawler.scheduler import HostScheduler
+from spider.crawler.url_filter import UrlFilter
+from spider.crawler.validator_store import ValidatorStore
+from spider.handlers.content_type_handler import ContentTypeHandler
+from spider.utils.async_download_utils import get_pages_async
+
+site = {
+    'http://some.url': {'http://some.url/a', 'http://some.url/b'},
+    'http://some.url/a': {'http://some.url', 'http://some.url/c'},
+    'http://some.url/b': {'http://some.url/c', 'http://some.url/d'},
+    'http://some.url/c': {'http://some.url/e'},
+    'http://some.url/d': set(),
+    'http://some.url/e': set(),
+}
+
+downloaded = []
+lock = threading.Lock()
+
+
+# noinspection PyUnusedLocal
+def get_page(url: str, downloaded_urls: set, output_dir: str,
+             exclude_prefixes: List[str], exclude_contains: List[str],
+             exclude_content_types: List[str], include_contains: List[str],
+             proxies: dict = None, session: Session = None, scheduler: HostScheduler = None,
+             url_filter: UrlFilter = None, max_sizes: Dict[str, int] = None,
+             handlers: Dict[str, ContentTypeHandler] = None,
+             content_store: ContentStore = None, validators: ValidatorStore = None,
+             metrics: Metrics = None, profiler: Profiler = None, manifest: OutputManifest = None) -> set:
+    with lock:
+        downloaded.append(url)
+    return site[url] - downloaded_urls
+
+
+class TestAsyncDownloadUtils(TestCase):
+
+    def setUp(self):
+        downloaded.clear()
+
+    # noinspection PyUnusedLocal
+    @mock.patch('spider.utils.async_download_utils.get_page', side_effect=get_page)
+    def test_get_pages_async(self, mock_get_page):
+        get_pages_async({'http://some.url'}, set(), 'outdir', 0, [], [], [], ['http'], concurrency=4)
+        self.assertEqual(len(site), len(downloaded))
+        self.assertEqual(set(site.keys()), set(downloaded))
+
+    # noinspection PyUnusedLocal
+    @mock.patch('spider.utils.async_download_utils.get_page', side_effect=get_page)
+    def test_max_depth(self, mock_get_page):
+        get_pages_async({'http://some.url'}, set(), 'outdir', 0, [], [], [], ['http'], max_depth=2, concurrency=4)
+        self.assertEqual({'http://some.url', 'http://some.url/a', 'http://some.url/b'}, set(downloaded))
+        self.assertEqual(3, len(downloaded))
+
+    # noinspection PyUnusedLocal
+    @mock.patch('spider.utils.async_download_utils.get_page', side_effect=get_page)
+    def test_frontier_spill(self, mock_get_page):
+        with Frontier(memory_limit=1) as frontier:
+            get_pages_async({'http://some.url'}, set(), 'outdir', 0, [], [], [], ['http'], concurrency=4,
+                            frontier=frontier)
+        self.assertEqual(len(site), len(downloaded))
+        self.assertEqual(set(site.keys()), set(downloaded))
+
+    # noinspection PyUnusedLocal
+    @mock.patch('spider.utils.async_download_utils.get_page', side_effect=get_page)
+    def test_url_is_released_after_its_links_are_queued(self, mock_get_page):
+        downloaded_urls = set()
+        missing = []
+
+        class CheckingScheduler(HostScheduler):
+
+            def release(self, url: str) -> None:
+                if not site[url] <= downloaded_urls:
+                    missing.append(url)
+                super().release(url)
+
+        get_pages_async({'http://some.url'}, downloaded_urls, 'outdir', 0, [], [], [], ['http'], concurrency=4,
+                        scheduler=CheckingScheduler())
+        self.assertEqual(set(site.keys()), set(downloaded))
+        self.assertEqual([], missing)
+
+    # noinspection PyUnusedLocal
+    @mock.patch('spider.utils.async_download_utils.get_page', side_effect=get_page)
+    def test_failed_task_is_logged(self, mock_get_page):
+        def done(url: str) -> None:
+            if url == 'http://some.url/b':
+                raise IOError('disk full')
+
+        checkpoint = mock.Mock()
+        checkpoint.done.side_effect = done
+        with self.assertLogs('spider.errors') as logs:
+            get_pages_async({'http://some.url'}, set(), 'outdir', 0, [], [], [], ['http'], concurrency=4,
+                            checkpoint=checkpoint)
+        self.assertEqual(["ERROR:spider.errors:Can't queue links of page 'http://some.url/b'"],
+                         [line.split('\n')[0] for line in logs.output])
@@ -0,0 +1,117 @@
+import gzip
+import shutil
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+
+import requests
+
+from spider.utils.cassette_utils import Cassette, RecordedResponse
+from spider.utils.session_utils import SessionManager
+
+
+large_body = b'x' * (1024 * 1024)
+
+
+class GzipHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    # noinspection PyPep8Naming
+    def do_GET(self):
+        if self.path == '/large':
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/pdf')
+            self.send_header('Content-Length', str(len(large_body)))
+            self.end_headers()
+            self.wfile.write(large_body)
+            return
+        body = gzip.compress('<html><body>{}</body></html>'.format(self.path).encode('UTF-8'))
+        self.send_response(200 if self.path != '/missing' else 404)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Set-Cookie', 'a=1')
+        self.send_header('Set-Cookie', 'b=2')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestCassetteUtils(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cassette_dir = 'spider/utils/test/outdir/cassette'
+
+    def setUp(self):
+        shutil.rmtree(self.cassette_dir, ignore_errors=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.cassette_dir, ignore_errors=True)
+
+    def test_record_and_replay(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), GzipHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        url = 'http://127.0.0.1:{}/page'.format(server.server_port)
+        missing_url = 'http://127.0.0.1:{}/missing'.format(server.server_port)
+        try:
+            with Cassette(self.cassette_dir) as cassette, SessionManager(cassette=cassette) as manager:
+                response = manager.session.get(url, stream=True)
+                self.assertEqual(b'<html><body>/page</body></html>', b''.join(response.iter_content(4)))
+                self.assertEqual(404, manager.session.get(missing_url).status_code)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        # server is gone, responses come from cassette
+        with Cassette(self.cassette_dir) as cassette, SessionManager(cassette=cassette, replay=True) as manager:
+            response = manager.session.get(url, stream=True)
+            self.assertEqual(200, response.status_code)
+            self.assertEqual('text/html', response.headers['content-type'])
+            # body is recorded decoded
+            self.assertNotIn('content-encoding', response.headers)
+            self.assertEqual(str(len(response.content)), response.headers['content-length'])
+            self.assertEqual(b'<html><body>/page</body></html>', response.content)
+            self.assertEqual(['a=1', 'b=2'], response.raw.headers.getlist('Set-Cookie'))
+            self.assertEqual(404, manager.session.get(missing_url).status_code)
+
+            with self.assertRaises(requests.ConnectionError):
+                manager.session.get(url + '?other')
+
+    def test_recorded_response_replaces_earlier_one(self):
+        with Cassette(self.cassette_dir) as cassette:
+            self.assertIsNone(cassette.replay('GET', 'http://some.url'))
+            for body in [b'first', b'second']:
+                cassette.record('get', RecordedResponse('http://some.url', 200, 'OK', [('Content-Type', 'text/plain')],
+                                                        body))
+        with Cassette(self.cassette_dir) as cassette:
+            recorded = cassette.replay('GET', 'http://some.url')
+            self.assertEqual((200, 'OK', [('Content-Type', 'text/plain')], b'second', False), recorded[1:])
+
+    def test_body_which_is_not_read_whole(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), GzipHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        url = 'http://127.0.0.1:{}/large'.format(server.server_port)
+        try:
+            with Cassette(self.cassette_dir) as cassette, SessionManager(cassette=cassette) as manager:
+                # crawler drops body after first chunk
+                response = manager.session.get(url, stream=True)
+                next(response.iter_content(1024))
+                response.close()
+                # only read part of body is recorded
+                recorded = cassette.replay('GET', url)
+                self.assertTrue(recorded.truncated)
+                self.assertLess(len(recorded.body), len(large_body))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        with Cassette(self.cassette_dir) as cassette, SessionManager(cassette=cassette, replay=True) as manager:
+            # declared size is replayed, so body is dropped by max size again
+            response = manager.session.get(url, stream=True)
+            self.assertEqual(str(len(large_body)), response.headers['content-length'])
+            response.close()
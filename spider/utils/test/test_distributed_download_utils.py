@@ -0,0 +1,76 @@
+import os
+import shutil
+import threading
+from unittest import TestCase
+
+from spider.benchmark.site import SiteConfig, SiteServer
+from spider.crawler.shared_frontier import SharedFrontier
+from spider.storage.storage import DirectoryStorage
+from spider.utils.distributed_download_utils import get_pages_distributed
+from spider.utils.download_utils import get_pages
+
+
+def output_names(output_dir: str, kind: str) -> list:
+    return [name for record_kind, name in DirectoryStorage(output_dir).records() if record_kind == kind]
+
+
+class TestDistributedDownloadUtils(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.output_dirs = ['spider/utils/test/outdir/node{}'.format(number) for number in range(2)]
+        self.sync_output_dir = 'spider/utils/test/outdir/sync'
+        self.frontier_file = 'spider/utils/test/outdir/frontier.sqlite'
+
+    def setUp(self):
+        self.tearDown()
+        for output_dir in self.output_dirs + [self.sync_output_dir]:
+            DirectoryStorage(output_dir).create_dirs()
+
+    def tearDown(self):
+        for output_dir in self.output_dirs + [self.sync_output_dir]:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        if os.path.isfile(self.frontier_file):
+            os.remove(self.frontier_file)
+
+    def test_nodes_share_crawl(self):
+        def crawl(number: int) -> None:
+            # every node opens its own connection, like node running on other machine
+            with SharedFrontier(self.frontier_file, shards=2) as frontier:
+                get_pages_distributed(frontier, 'node{}'.format(number), number, {server.url}, set(),
+                                      self.output_dirs[number], [], [], [], ['127.0.0.1'], lease_size=3,
+                                      poll_interval=0.05)
+
+        config = SiteConfig(pages=30, fan_out=3, depth=3, page_size=512)
+        with SiteServer(config) as server:
+            nodes = [threading.Thread(target=crawl, args=(number,)) for number in range(2)]
+            for node in nodes:
+                node.start()
+            for node in nodes:
+                node.join()
+            get_pages({server.url}, set(), self.sync_output_dir, 0, [], [], [], ['127.0.0.1'])
+
+        pages = [set(output_names(output_dir, 'html')) for output_dir in self.output_dirs]
+        # every page is downloaded by one node
+        self.assertEqual(set(), pages[0] & pages[1])
+        self.assertEqual(set(output_names(self.sync_output_dir, 'html')), pages[0] | pages[1])
+        with SharedFrontier(self.frontier_file) as frontier:
+            self.assertEqual(0, frontier.pending())
+
+    def test_expired_lease(self):
+        with SiteServer(SiteConfig(pages=7, fan_out=2, depth=2)) as server, \
+                SharedFrontier(self.frontier_file, lease_time=0.2) as frontier:
+            frontier.add([server.url], 0)
+            # node died with leased root page, page is leased again when lease expires
+            frontier.lease('dead', 0, 10)
+            get_pages_distributed(frontier, 'live', 0, {server.url}, set(), self.output_dirs[0], [], [], [],
+                                  ['127.0.0.1'], poll_interval=0.05)
+        self.assertEqual(7, len(output_names(self.output_dirs[0], 'html')))
+
+    def test_max_depth(self):
+        with SiteServer(SiteConfig(pages=40, fan_out=3, depth=3)) as server, \
+                SharedFrontier(self.frontier_file) as frontier:
+            get_pages_distributed(frontier, 'node', 0, {server.url}, set(), self.output_dirs[0], [], [], [],
+                                  ['127.0.0.1'], max_depth=2)
+        # root page and its children
+        self.assertEqual(4, len(output_names(self.output_dirs[0], 'html')))
@@ -1,15 +1,31 @@
+import hashlib
+import os
+import shutil
 from unittest import TestCase, mock
 
 from bs4 import BeautifulSoup
 
+from spider.crawler.checkpoint import Checkpoint
+from spider.crawler.content_store import ContentStore
+from spider.crawler.frontier import Frontier
+from spider.crawler.metrics import Metrics
+from spider.crawler.output_manifest import OutputManifest
+from spider.crawler.scheduler import HostScheduler
 from spider.handlers.html_handler import HtmlHandler
 from spider.handlers.pdf_handler import PdfHandler
-from spider.handlers.zip_handler import ZipHandler
-from spider.utils.download_utils import get_output_name, get_links, get_page
+from spider.utils import file_utils
+from spider.utils.download_utils import create_handlers, get_output_name, get_links, get_page, get_pages, \
+    html_content_type, lxml_html_parser, pdf_content_type
 
 
 class Object(object):
-    pass
+
+    def iter_content(self, chunk_size=1):
+        content = self.content if isinstance(self.content, bytes) else self.content.encode()
+        return (content[i:i + chunk_size] for i in range(0, len(content), chunk_size))
+
+    def close(self):
+        pass
 
 
 # noinspection PyUnusedLocal
@@ -25,6 +41,7 @@ def mock_get_invalid_code(url, data=None, **kwargs):
 def mock_get_txt(url, data=None, **kwargs):
     assert kwargs is not None
     response = Object()
+    response.url = url
     response.ok = True
     response.text = 'OK'
     response.status_code = 200
@@ -38,9 +55,10 @@ def mock_get_txt(url, data=None, **kwargs):
 def mock_get_zip(url, data=None, **kwargs):
     assert kwargs is not None
     response = Object()
+    response.url = url
     response.ok = True
     response.status_code = 200
-    response.content = 'some binary content'
+    response.content = b'some binary content'
     response.headers = {
         'content-type': 'application/zip'
     }
@@ -51,9 +69,10 @@ def mock_get_zip(url, data=None, **kwargs):
 def mock_get_pdf(url, data=None, **kwargs):
     assert kwargs is not None
     response = Object()
+    response.url = url
     response.ok = True
     response.status_code = 200
-    response.content = 'some binary content'
+    response.content = b'some binary content'
     response.headers = {
         'content-type': 'application/pdf'
     }
@@ -64,6 +83,7 @@ def mock_get_pdf(url, data=None, **kwargs):
 def mock_get_html(url, data=None, **kwargs):
     assert kwargs is not None
     response = Object()
+    response.url = url
     response.ok = True
     response.status_code = 200
     response.content = "<html>" \
@@ -81,6 +101,58 @@ def mock_get_html(url, data=None, **kwargs):
     return response
 
 
+site = {
+    'http://some.url': {'http://some.url/a', 'http://some.url/b'},
+    'http://some.url/a': {'http://some.url', 'http://some.url/c'},
+    'http://some.url/b': {'http://some.url/c'},
+    'http://some.url/c': {'http://some.url/d'},
+    'http://some.url/d': set(),
+}
+
+
+# noinspection PyUnusedLocal
+def mock_get_page(url, downloaded_urls, *args, **kwargs):
+    return site[url] - downloaded_urls
+
+
+# noinspection PyUnusedLocal
+def mock_get_page_killed(url, downloaded_urls, *args, **kwargs):
+    if url == 'http://some.url/c':
+        raise KeyboardInterrupt()
+    return site[url] - downloaded_urls
+
+
+crash_site = {
+    'http://some.url': {'http://some.url/a', 'http://some.url/b'},
+    'http://some.url/a': {'http://some.url/c'},
+    'http://some.url/b': set(),
+    'http://some.url/c': set(),
+}
+
+
+# noinspection PyUnusedLocal
+def mock_get_crash_site(url, data=None, **kwargs):
+    response = Object()
+    response.url = url
+    response.ok = True
+    response.status_code = 200
+    response.content = "<html><body>{}</body></html>".format(
+        "".join("<a href='{}'>link</a>".format(link) for link in sorted(crash_site[url])))
+    response.headers = {
+        'content-type': 'text/html'
+    }
+    return response
+
+
+class CrashingCheckpoint(Checkpoint):
+
+    def done(self, url: str) -> None:
+        # process dies after output of page is saved, but before page is marked as done
+        if url == 'http://some.url/a':
+            raise KeyboardInterrupt()
+        super(CrashingCheckpoint, self).done(url)
+
+
 class TestDownloadUtils(TestCase):
 
     def __init__(self, *args, **kwargs):
@@ -99,9 +171,23 @@ class TestDownloadUtils(TestCase):
                     "   </body>" \
                     "</html>"
 
+    def setUp(self):
+        for d in ['pdf', 'zip', 'html', 'txt']:
+            path = '{}/{}'.format(self.output_dir, d)
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            file_utils.create_dir_if_not_exist(path)
+
+    def tearDown(self):
+        for d in ['html', 'txt']:
+            shutil.rmtree('{}/{}'.format(self.output_dir, d), ignore_errors=True)
+
     def test_get_output_name(self):
         result = get_output_name(self.url)
-        self.assertEqual(result, 'http_some_url_page_section_param_value_param2_weird_value_value')
+        self.assertEqual(result, '54/2d/542d8b4691cb07dd797898dd76d99d13')
+        # name is stable and urls which differ only in special characters have different names
+        self.assertEqual(result, get_output_name(self.url))
+        self.assertNotEqual(get_output_name('http://some.url/a-b'), get_output_name('http://some.url/a.b'))
 
     def test_get_all_links(self):
         soup = BeautifulSoup(self.html, "lxml")
@@ -142,6 +228,31 @@ class TestDownloadUtils(TestCase):
         self.assertIsNotNone(links)
         self.assertEqual(0, len(links))
 
+    @mock.patch('requests.get', side_effect=mock_get_html)
+    def test_get_page_with_manifest(self, mock_req_get):
+        manifest = OutputManifest()
+        get_page(self.url, set(), self.output_dir, [], [], [], ['http', 'page'], manifest=manifest)
+        self.assertTrue(manifest.contains(self.url))
+        self.assertTrue(os.path.isfile('{}/html/{}.html'.format(self.output_dir, get_output_name(self.url))))
+
+        # url in manifest is not downloaded again
+        get_page(self.url, set(), self.output_dir, [], [], [], ['http', 'page'], manifest=manifest)
+        self.assertEqual(1, mock_req_get.call_count)
+
+    # noinspection PyUnusedLocal
+    @mock.patch('requests.get', side_effect=mock_get_pdf)
+    def test_manifest_is_answered_from_memory(self, mock_req_get):
+        manifest = OutputManifest()
+        manifest.add(self.url, pdf_content_type)
+        storage = mock.Mock()
+        handlers = dict(create_handlers(storage=storage))
+        links = get_page(self.url, set(), self.output_dir, [], [], [], ['http', 'page'], handlers=handlers,
+                         manifest=manifest)
+        self.assertEqual(0, len(links))
+        # output is neither checked nor downloaded again
+        self.assertFalse(storage.exists.called)
+        self.assertFalse(mock_req_get.called)
+
     # noinspection PyUnusedLocal
     @mock.patch('requests.get', side_effect=mock_get_invalid_code)
     def test_get_invalid_code(self, mock_req_get):
@@ -150,7 +261,7 @@ class TestDownloadUtils(TestCase):
         self.assertEqual(0, len(links))
 
     # noinspection PyUnusedLocal
-    @mock.patch.object(PdfHandler, "save_result")
+    @mock.patch.object(PdfHandler, "save_stream")
     @mock.patch('requests.get', side_effect=mock_get_pdf)
     def test_get_pdf_page(self, mock_req_get, mock_pdf_handler):
         mock_pdf_handler.return_value = None
@@ -158,16 +269,104 @@ class TestDownloadUtils(TestCase):
         links = get_page(self.url, set(), self.output_dir, [], [], [], ['http', 'page'])
         self.assertIsNotNone(links)
         self.assertEqual(0, len(links))
+        # body is spooled in memory and handed to pdf handler
+        self.assertTrue(mock_pdf_handler.called)
+        body = mock_pdf_handler.call_args[0][2]
+        self.assertEqual(b'some binary content', body.read())
 
     # noinspection PyUnusedLocal
-    @mock.patch.object(ZipHandler, "save_result")
-    @mock.patch('requests.get', side_effect=mock_get_zip)
-    def test_get_zip(self, mock_req_get, mock_zip_handler):
-        mock_zip_handler.return_value = None
+    @mock.patch.object(PdfHandler, "save_stream")
+    @mock.patch('requests.get', side_effect=mock_get_pdf)
+    def test_duplicate_content(self, mock_req_get, mock_pdf_handler):
+        store = ContentStore()
+        get_page('http://some.url/a.pdf', set(), self.output_dir, [], [], [], ['http'], content_store=store)
+        get_page('http://some.url/a.pdf?utm=1', set(), self.output_dir, [], [], [], ['http'], content_store=store)
+        # the same body is extracted once
+        self.assertEqual(1, mock_pdf_handler.call_count)
 
+    # noinspection PyUnusedLocal
+    @mock.patch.object(PdfHandler, "save_stream", side_effect=[IOError('disk full'), None, None])
+    @mock.patch('requests.get', side_effect=mock_get_pdf)
+    def test_duplicate_of_failed_content(self, mock_req_get, mock_pdf_handler):
+        store = ContentStore()
+        get_page('http://some.url/a.pdf', set(), self.output_dir, [], [], [], ['http'], content_store=store)
+        # output of the first url was not saved, so the same body is extracted again
+        get_page('http://some.url/a.pdf?utm=1', set(), self.output_dir, [], [], [], ['http'], content_store=store)
+        get_page('http://some.url/a.pdf?utm=2', set(), self.output_dir, [], [], [], ['http'], content_store=store)
+        self.assertEqual(2, mock_pdf_handler.call_count)
+        self.assertEqual(get_output_name('http://some.url/a.pdf?utm=1'),
+                         store.find('http://some.url/b.pdf', {}, hashlib.sha256(b'some binary content').hexdigest()))
+
+    # noinspection PyUnusedLocal
+    @mock.patch.object(PdfHandler, "save_stream")
+    @mock.patch('requests.get', side_effect=mock_get_pdf)
+    def test_duplicate_content_by_etag(self, mock_req_get, mock_pdf_handler):
+        store = ContentStore()
+        store.add('http://some.url/a.pdf', 'a', 'abc', {'etag': '"v1"'})
+        response = mock_get_pdf(self.url)
+        response.headers['etag'] = '"v1"'
+        response.iter_content = mock.Mock()
+        mock_req_get.side_effect = None
+        mock_req_get.return_value = response
+
+        get_page(self.url, set(), self.output_dir, [], [], [], ['http'], content_store=store)
+        # body is not downloaded at all
+        self.assertFalse(response.iter_content.called)
+        self.assertFalse(mock_pdf_handler.called)
+
+    # noinspection PyUnusedLocal
+    @mock.patch('requests.get', side_effect=mock_get_zip)
+    def test_get_zip(self, mock_req_get):
         links = get_page(self.url, set(), self.output_dir, [], [], [], ['http', 'page'])
         self.assertIsNotNone(links)
         self.assertEqual(0, len(links))
+        # body is not valid zip file, but it is saved anyway
+        self.assertTrue(os.path.isfile('{}/zip/{}.zip'.format(self.output_dir, get_output_name(self.url))))
+
+    # noinspection PyUnusedLocal
+    @mock.patch.object(PdfHandler, "save_stream")
+    @mock.patch('requests.get', side_effect=mock_get_pdf)
+    def test_body_bigger_than_max_size(self, mock_req_get, mock_pdf_handler):
+        links = get_page(self.url, set(), self.output_dir, [], [], [], ['http', 'page'],
+                         max_sizes={pdf_content_type: 10})
+        self.assertEqual(0, len(links))
+        # body is dropped
+        self.assertFalse(mock_pdf_handler.called)
+        self.assertFalse(os.path.isfile(PdfHandler.raw_file(self.output_dir, get_output_name(self.url))))
+
+    # noinspection PyUnusedLocal
+    @mock.patch.object(HtmlHandler, "save_result")
+    @mock.patch('requests.get', side_effect=mock_get_html)
+    def test_content_length_bigger_than_max_size(self, mock_req_get, mock_html_handler):
+        response = mock_get_html(self.url)
+        response.headers['content-length'] = '1000000'
+        response.iter_content = mock.Mock()
+        mock_req_get.side_effect = None
+        mock_req_get.return_value = response
+
+        links = get_page(self.url, set(), self.output_dir, [], [], [], ['http', 'page'],
+                         max_sizes={html_content_type: 1000})
+        self.assertEqual(0, len(links))
+        # body is not downloaded at all
+        self.assertFalse(response.iter_content.called)
+        self.assertFalse(mock_html_handler.called)
+
+    # noinspection PyUnusedLocal
+    @mock.patch.object(PdfHandler, "save_stream")
+    @mock.patch('requests.get', side_effect=mock_get_pdf)
+    def test_excluded_content_type(self, mock_req_get, mock_pdf_handler):
+        response = mock_get_pdf(self.url)
+        response.iter_content = mock.Mock()
+        response.close = mock.Mock()
+        mock_req_get.side_effect = None
+        mock_req_get.return_value = response
+
+        links = get_page(self.url, set(), self.output_dir, [], [], [pdf_content_type], ['http', 'page'])
+        self.assertEqual(0, len(links))
+        # content type is decided by headers, body is not downloaded
+        self.assertFalse(response.iter_content.called)
+        self.assertTrue(response.close.called)
+        self.assertFalse(mock_pdf_handler.called)
 
     # noinspection PyUnusedLocal
     @mock.patch.object(HtmlHandler, "save_result")
@@ -179,7 +378,167 @@ class TestDownloadUtils(TestCase):
         self.assertIsNotNone(links)
         self.assertEqual(3, len(links))
 
+    # noinspection PyUnusedLocal
+    @mock.patch('requests.get', side_effect=mock_get_html)
+    def test_get_html_page_with_lxml(self, mock_req_get):
+        links = get_page(self.url, set(), self.output_dir, [], [], [], ['http', 'page'],
+                         handlers=create_handlers(html_parser=lxml_html_parser))
+        # the same links as with BeautifulSoup
+        self.assertEqual(get_page(self.url, set(), self.output_dir, [], [], [], ['http', 'page']), links)
+        self.assertEqual(3, len(links))
+
+    # noinspection PyUnusedLocal
+    @mock.patch('requests.get', side_effect=mock_get_html)
+    def test_get_page_metrics(self, mock_req_get):
+        metrics = Metrics()
+        get_page(self.url, set(), self.output_dir, [], [], [], ['http', 'page'], metrics=metrics)
+
+        snapshot = metrics.snapshot()
+        self.assertEqual([{'labels': {'content_type': html_content_type, 'host': 'some.url', 'status': '200'},
+                           'value': 1}], snapshot['counters']['spider_pages_total'])
+        self.assertTrue(snapshot['counters']['spider_bytes_total'][0]['value'] > 0)
+        self.assertEqual(['download', 'html_parse', 'link_filter', 'ttfb'],
+                         sorted(h['labels']['stage'] for h in snapshot['histograms']['spider_stage_seconds']))
+
+    # noinspection PyUnusedLocal
+    @mock.patch('requests.get', side_effect=mock_get_html)
+    def test_recrawl_not_modified(self, mock_req_get):
+        validators = mock.Mock()
+        validators.get.return_value = None
+        links = get_page(self.url, set(), self.output_dir, [], [], [], ['http', 'page'], validators=validators)
+        validator = validators.put.call_args[0][1]
+        self.assertEqual(html_content_type, validator.content_type)
+        self.assertIsNone(mock_req_get.call_args[1]['headers'])
+
+        # in next crawl page is not modified, links are taken from saved html
+        response = Object()
+        response.status_code = 304
+        mock_req_get.side_effect = None
+        mock_req_get.return_value = response
+        validators.get.return_value = validator._replace(etag='"v1"')
+        self.assertEqual(links, get_page(self.url, set(), self.output_dir, [], [], [], ['http', 'page'],
+                                         validators=validators))
+        self.assertEqual({'If-None-Match': '"v1"'}, mock_req_get.call_args[1]['headers'])
+
+    # noinspection PyUnusedLocal
+    @mock.patch.object(PdfHandler, "save_stream")
+    @mock.patch('requests.get', side_effect=mock_get_pdf)
+    def test_recrawl_unchanged_body(self, mock_req_get, mock_pdf_handler):
+        validators = mock.Mock()
+        validators.get.return_value = None
+        get_page(self.url, set(), self.output_dir, [], [], [], ['http', 'page'], validators=validators)
+        self.assertEqual(1, mock_pdf_handler.call_count)
+        validator = validators.put.call_args[0][1]
+
+        # server doesn't support conditional requests, body has the same hash, so pdf is not extracted again
+        raw_file = PdfHandler.raw_file(self.output_dir, get_output_name(self.url))
+        os.makedirs(os.path.dirname(raw_file), exist_ok=True)
+        with open(raw_file, 'wb') as f:
+            f.write(b'some binary content')
+        validators.get.return_value = validator
+        get_page(self.url, set(), self.output_dir, [], [], [], ['http', 'page'], validators=validators)
+        self.assertEqual(1, mock_pdf_handler.call_count)
+
+    # noinspection PyUnusedLocal
+    @mock.patch('requests.get', side_effect=mock_get_txt)
+    def test_get_page_with_session(self, mock_req_get):
+        session = mock.Mock()
+        session.get.side_effect = mock_get_txt
+        links = get_page(self.url, set(), self.output_dir, [], [], [], ['http', 'page'], session=session)
+        self.assertEqual(0, len(links))
+        self.assertTrue(session.get.called)
+        self.assertFalse(mock_req_get.called)
+
     # noinspection PyUnusedLocal
     @mock.patch('requests.get', side_effect=Exception("Boom!"))
     def test_exception(self, mock_req_get):
         self.assertRaises(Exception, get_page(self.url, set(), self.output_dir, [], [], [], ['http', 'page']))
+
+    # noinspection PyUnusedLocal
+    @mock.patch('spider.utils.download_utils.sleep')
+    @mock.patch('requests.get', side_effect=Exception("Boom!"))
+    def test_exception_with_scheduler(self, mock_req_get, mock_sleep):
+        scheduler = mock.Mock()
+        links = get_page(self.url, set(), self.output_dir, [], [], [], ['http', 'page'], scheduler=scheduler)
+        self.assertEqual(0, len(links))
+        # only host of url waits, not whole crawl
+        scheduler.backoff.assert_called_once_with(self.url, 2)
+        self.assertFalse(mock_sleep.called)
+
+    @mock.patch('spider.utils.download_utils.get_page', side_effect=mock_get_page)
+    def test_get_pages(self, mock_page):
+        downloaded_urls = set()
+        get_pages({'http://some.url'}, downloaded_urls, self.output_dir, 0, [], [], [], ['http'])
+        urls = [c[0][0] for c in mock_page.call_args_list]
+        self.assertEqual(len(site), len(urls))
+        self.assertEqual(set(site.keys()), set(urls))
+        # breadth-first order
+        self.assertEqual('http://some.url', urls[0])
+        self.assertEqual({'http://some.url/a', 'http://some.url/b'}, set(urls[1:3]))
+        self.assertEqual(set(site.keys()), downloaded_urls)
+
+    @mock.patch('spider.utils.download_utils.get_page', side_effect=mock_get_page)
+    def test_get_pages_with_scheduler(self, mock_page):
+        # new scheduler is empty (its len is 0), it is used anyway
+        scheduler = HostScheduler()
+        get_pages({'http://some.url'}, set(), self.output_dir, 0, [], [], [], ['http'], scheduler=scheduler)
+        self.assertTrue(all(c[0][9] is scheduler for c in mock_page.call_args_list))
+
+    @mock.patch('spider.utils.download_utils.get_page', side_effect=mock_get_page)
+    def test_get_pages_max_depth(self, mock_page):
+        get_pages({'http://some.url'}, set(), self.output_dir, 0, [], [], [], ['http'], max_depth=3)
+        urls = {c[0][0] for c in mock_page.call_args_list}
+        self.assertEqual({'http://some.url', 'http://some.url/a', 'http://some.url/b', 'http://some.url/c'}, urls)
+
+    def test_resume_after_crash_before_checkpoint_flush(self):
+        checkpoint_file = '{}/checkpoint.db'.format(self.output_dir)
+        manifest_file = '{}/manifest.tsv'.format(self.output_dir)
+        for file_name in (checkpoint_file, manifest_file):
+            if os.path.isfile(file_name):
+                os.remove(file_name)
+
+        with mock.patch('requests.get', side_effect=mock_get_crash_site) as mock_req_get:
+            checkpoint = CrashingCheckpoint(checkpoint_file, interval=0)
+            with OutputManifest(manifest_file) as manifest, self.assertRaises(KeyboardInterrupt):
+                get_pages({'http://some.url'}, set(), self.output_dir, 0, [], [], [], ['http'],
+                          checkpoint=checkpoint, manifest=manifest)
+            # buffered links of killed page are lost together with process
+
+            downloaded_urls = set()
+            with Checkpoint(checkpoint_file) as checkpoint, Frontier() as frontier, \
+                    OutputManifest(manifest_file) as manifest:
+                checkpoint.restore(frontier, downloaded_urls)
+                get_pages({'http://some.url'}, downloaded_urls, self.output_dir, 0, [], [], [], ['http'],
+                          frontier=frontier, checkpoint=checkpoint, manifest=manifest)
+            requested = [c[0][0] for c in mock_req_get.call_args_list]
+
+        # saved page is not downloaded again, but links from its output are queued
+        self.assertEqual(1, requested.count('http://some.url/a'))
+        self.assertEqual(set(crash_site.keys()), set(requested))
+        for file_name in (checkpoint_file, manifest_file):
+            os.remove(file_name)
+
+    def test_resume_get_pages(self):
+        checkpoint_file = '{}/checkpoint.db'.format(self.output_dir)
+        if os.path.isfile(checkpoint_file):
+            os.remove(checkpoint_file)
+
+        with mock.patch('spider.utils.download_utils.get_page', side_effect=mock_get_page_killed) as mock_page:
+            with Checkpoint(checkpoint_file, interval=0) as checkpoint:
+                with self.assertRaises(KeyboardInterrupt):
+                    get_pages({'http://some.url'}, set(), self.output_dir, 0, [], [], [], ['http'],
+                              checkpoint=checkpoint)
+            first_run = [c[0][0] for c in mock_page.call_args_list]
+
+        downloaded_urls = set()
+        with mock.patch('spider.utils.download_utils.get_page', side_effect=mock_get_page) as mock_page:
+            with Checkpoint(checkpoint_file) as checkpoint, Frontier() as frontier:
+                checkpoint.restore(frontier, downloaded_urls)
+                get_pages({'http://some.url'}, downloaded_urls, self.output_dir, 0, [], [], [], ['http'],
+                          frontier=frontier, checkpoint=checkpoint)
+            second_run = [c[0][0] for c in mock_page.call_args_list]
+
+        # killed page is downloaded again, pages downloaded before are not
+        self.assertEqual(['http://some.url/c', 'http://some.url/d'], second_run)
+        self.assertEqual(set(site.keys()), set(first_run) | set(second_run))
+        os.remove(checkpoint_file)
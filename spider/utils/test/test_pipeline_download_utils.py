@@ -0,0 +1,115 @@
+import shutil
+import threading
+import time
+from unittest import TestCase, mock
+
+from spider.benchmark.site import SiteConfig, SiteServer
+from spider.crawler.profiler import Profiler
+from spider.storage.storage import DirectoryStorage
+from spider.utils.download_utils import FetchedPage, get_pages
+from spider.utils.pipeline_download_utils import Stage, get_pages_pipeline
+
+
+def output_names(output_dir: str, kind: str) -> list:
+    return [name for record_kind, name in DirectoryStorage(output_dir).records() if record_kind == kind]
+
+
+class TestPipelineDownloadUtils(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.output_dir = 'spider/utils/test/outdir/pipeline'
+        self.sync_output_dir = 'spider/utils/test/outdir/sync'
+
+    def setUp(self):
+        for output_dir in (self.output_dir, self.sync_output_dir):
+            shutil.rmtree(output_dir, ignore_errors=True)
+            DirectoryStorage(output_dir).create_dirs()
+
+    def tearDown(self):
+        for output_dir in (self.output_dir, self.sync_output_dir):
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    def test_output_is_the_same_as_sync_output(self):
+        config = SiteConfig(pages=40, fan_out=3, depth=3, page_size=1024, pdf_ratio=0.3, zip_ratio=0.2)
+        with SiteServer(config) as server:
+            pipeline_urls, sync_urls = set(), set()
+            get_pages_pipeline({server.url}, pipeline_urls, self.output_dir, 0, [], [], [], ['127.0.0.1'],
+                               concurrency=4, workers={'text/html': 2, 'application/zip': 2}, queue_size=2)
+            get_pages({server.url}, sync_urls, self.sync_output_dir, 0, [], [], [], ['127.0.0.1'])
+
+        self.assertEqual(sync_urls, pipeline_urls)
+        for kind in ('html', 'txt', 'pdf', 'pdf2txt', 'zip'):
+            self.assertEqual(sorted(output_names(self.sync_output_dir, kind)),
+                             sorted(output_names(self.output_dir, kind)), kind)
+        self.assertGreater(len(output_names(self.output_dir, 'pdf2txt')), 0)
+
+    def test_max_depth(self):
+        with SiteServer(SiteConfig(pages=40, fan_out=3, depth=3)) as server:
+            get_pages_pipeline({server.url}, set(), self.output_dir, 0, [], [], [], ['127.0.0.1'], max_depth=2,
+                               concurrency=4)
+        # root page and its children
+        self.assertEqual(4, len(output_names(self.output_dir, 'html')))
+
+    def test_profile_of_page_which_is_not_processed(self):
+        profiler = Profiler('{}/profiles'.format(self.output_dir), every=1)
+
+        def fetch_page(url, *args):
+            # there are no workers for text/plain, page is not processed
+            return FetchedPage(url, '127.0.0.1', 'page', 'text/plain', b'text', {}, None, None, False,
+                               profiler.page(url))
+
+        with mock.patch('spider.utils.pipeline_download_utils.fetch_page', side_effect=fetch_page), \
+                self.assertLogs('spider.errors'):
+            get_pages_pipeline({'http://127.0.0.1/page'}, set(), self.output_dir, 0, [], [], [], ['127.0.0.1'],
+                               concurrency=1)
+        self.assertIsNotNone(profiler.page('http://127.0.0.1/other').profile)
+
+    def test_next_depth_waits_for_processed_pages(self):
+        site = {
+            'http://some.url': {'http://some.url/a', 'http://some.url/b'},
+            'http://some.url/a': {'http://some.url/c'},
+            'http://some.url/b': {'http://some.url/d'},
+            'http://some.url/c': set(),
+            'http://some.url/d': set(),
+        }
+        depths = {'http://some.url': 0, 'http://some.url/a': 1, 'http://some.url/b': 1, 'http://some.url/c': 2,
+                  'http://some.url/d': 2}
+        fetched, processed, early = [], [], []
+
+        def fetch_page(url, *args):
+            if any(depths[other] < depths[url] for other in fetched if other not in processed):
+                early.append(url)
+            fetched.append(url)
+            return FetchedPage(url, 'some.url', 'page', 'text/html', b'', {}, None, None, False, mock.Mock())
+
+        def process_page(page, downloaded_urls, *args):
+            # links of /a are queued long after /b is processed
+            if page.url == 'http://some.url/a':
+                time.sleep(0.2)
+            processed.append(page.url)
+            return site[page.url] - downloaded_urls
+
+        with mock.patch('spider.utils.pipeline_download_utils.fetch_page', side_effect=fetch_page), \
+                mock.patch('spider.utils.pipeline_download_utils.process_page', side_effect=process_page):
+            get_pages_pipeline({'http://some.url'}, set(), self.output_dir, 0, [], [], [], ['http'],
+                               concurrency=4, workers={'text/html': 2})
+        self.assertEqual(set(site), set(fetched))
+        # pages of depth 2 are fetched after all pages of depth 1 are processed
+        self.assertEqual([], early)
+
+    def test_stage_backpressure(self):
+        released = threading.Event()
+        processed = []
+        stage = Stage('slow', 1, 1, lambda item: released.wait() and processed.append(item))
+        stage.put(1)
+        stage.put(2)
+        producer = threading.Thread(target=stage.put, args=(3,))
+        producer.start()
+        producer.join(0.2)
+        # queue is full, producer waits for worker
+        self.assertTrue(producer.is_alive())
+        released.set()
+        producer.join()
+        stage.close()
+        self.assertEqual([1, 2, 3], processed)
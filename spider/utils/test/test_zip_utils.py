@@ -1,7 +1,8 @@
 import os
+import zipfile
 from unittest import TestCase
 
-from spider.utils.zip_utils import zip_dir, unzip_file
+from spider.utils.zip_utils import ZipArchiver, zip_dir, unzip_file
 
 
 class TestZipUtils(TestCase):
@@ -45,3 +46,20 @@ class TestZipUtils(TestCase):
         files = os.listdir(self.output_zip_dir)
         self.assertIsNotNone(files)
         self.assertEqual(2, len(files))
+
+    def test_zip_archiver(self):
+        with ZipArchiver(self.output_zip, workers=2) as archiver:
+            archiver.add("out/html/page.html", b"<html>" * 1000)
+            archiver.add("out/pdf/file.pdf", b"%PDF" * 1000)
+            with open("{}/file1.txt".format(self.input_dir), "rb") as f:
+                archiver.add_stream("out/txt/file1.txt", f)
+            archiver.add_file("{}/file2.txt".format(self.input_dir))
+
+        with zipfile.ZipFile(self.output_zip) as f:
+            self.assertIsNone(f.testzip())
+            self.assertEqual({"out/html/page.html", "out/pdf/file.pdf", "out/txt/file1.txt",
+                              "spider/utils/test/indir/file2.txt"}, set(f.namelist()))
+            self.assertEqual(b"<html>" * 1000, f.read("out/html/page.html"))
+            self.assertEqual(zipfile.ZIP_DEFLATED, f.getinfo("out/html/page.html").compress_type)
+            # pdf is compressed already
+            self.assertEqual(zipfile.ZIP_STORED, f.getinfo("out/pdf/file.pdf").compress_type)
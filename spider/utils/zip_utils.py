@@ -1,20 +1,166 @@
+import logging
 import os
+import shutil
+import threading
+import time
 import zipfile
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+from typing import IO, Optional, Tuple
 
 from spider.utils import file_utils
 
+# members with these extensions are compressed already, deflate would only waste cpu
+compressed_extensions = (".pdf", ".zip", ".gz", ".jpg", ".jpeg", ".png")
+chunk_size = 64 * 1024
+# compressed members smaller than this are kept in memory until they are written
+spool_size = 16 * 1024 * 1024
 
-def zip_dir(path: str, output_file: str) -> None:
+
+class ZipArchiver(object):
+
+    def __init__(self, output_file: str, workers: int = 4, store_compressed: bool = True, compress_level: int = 6,
+                 max_pending: Optional[int] = None):
+        """
+        Builds zip file member by member while members are produced. Members are compressed (raw deflate) in
+        thread pool, so many cores are used, and appended into zip file in order they are finished
+        :param output_file: output zip file
+        :param workers: number of threads compressing members
+        :param store_compressed: if True, pdf, zip and other compressed files are stored without compression
+        :param compress_level: deflate compression level
+        :param max_pending: max number of members waiting for compression, add blocks when there are more,
+                            4 per worker by default
+        """
+        super(ZipArchiver, self).__init__()
+        self._err_logger = logging.getLogger("spider.errors")
+        self.__zip_file = zipfile.ZipFile(output_file, "w", zipfile.ZIP_DEFLATED)
+        self.__workers = max(workers, 1)
+        self.__executor = ThreadPoolExecutor(self.__workers, "archiver")
+        self.__pending = threading.BoundedSemaphore(max_pending if max_pending else self.__workers * 4)
+        self.__store_compressed = store_compressed
+        self.__compress_level = compress_level
+        self.__lock = threading.Lock()
+
+    def add(self, arcname: str, content: bytes) -> None:
+        """
+        schedules member with content in memory
+        :param arcname: name of member
+        :param content: content of member
+        :return: None
+        """
+        self.__submit(self.__add_bytes, arcname, content)
+
+    def add_file(self, file_name: str, arcname: Optional[str] = None) -> None:
+        """
+        schedules member from file, file is read by worker
+        :param file_name: path to file
+        :param arcname: name of member, path to file by default (as ZipFile.write does)
+        :return: None
+        """
+        self.__submit(self.__add_file, file_name, arcname)
+
+    def add_stream(self, arcname: str, stream: IO[bytes]) -> None:
+        """
+        adds member from file object, which is read (and compressed) in calling thread, so caller can close it
+        when we return
+        :param arcname: name of member
+        :param stream: file object, read from its current position
+        :return: None
+        """
+        self.__append(*self.__compress(zipfile.ZipInfo(arcname, time.localtime()[:6]), stream))
+
+    def close(self) -> None:
+        """
+        waits for scheduled members and writes central directory of zip file
+        :return: None
+        """
+        self.__executor.shutdown(wait=True)
+        self.__zip_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __submit(self, fn, *args) -> None:
+        # producers wait when workers can't keep up, so members don't pile up in memory
+        self.__pending.acquire()
+        future = self.__executor.submit(fn, *args)
+        future.add_done_callback(self.__done)
+
+    def __done(self, future: Future) -> None:
+        self.__pending.release()
+        if future.exception():
+            self._err_logger.error("Can't add member into zip file: {}".format(future.exception()))
+
+    def __add_bytes(self, arcname: str, content: bytes) -> None:
+        self.__append(*self.__compress(zipfile.ZipInfo(arcname, time.localtime()[:6]), BytesIO(content)))
+
+    def __add_file(self, file_name: str, arcname: Optional[str]) -> None:
+        with open(file_name, "rb") as f:
+            self.__append(*self.__compress(zipfile.ZipInfo.from_file(file_name, arcname), f))
+
+    def __compress(self, info: zipfile.ZipInfo, source: IO[bytes]) -> Tuple[zipfile.ZipInfo, IO[bytes]]:
+        """
+        compresses member into spooled temporary file, zlib releases GIL, so members are compressed in parallel
+        :param info: member info, sizes and crc are filled
+        :param source: content of member
+        :return: member info and its compressed content
+        """
+        if self.__store_compressed and info.filename.lower().endswith(compressed_extensions):
+            info.compress_type = zipfile.ZIP_STORED
+            compressor = None
+        else:
+            info.compress_type = zipfile.ZIP_DEFLATED
+            compressor = zlib.compressobj(self.__compress_level, zlib.DEFLATED, -15)
+        if not info.external_attr:
+            info.external_attr = 0o644 << 16
+
+        data = SpooledTemporaryFile(max_size=spool_size, prefix="spider-zip-")
+        crc = 0
+        size = 0
+        for chunk in iter(lambda: source.read(chunk_size), b""):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            data.write(compressor.compress(chunk) if compressor else chunk)
+        if compressor:
+            data.write(compressor.flush())
+        info.CRC = crc
+        info.file_size = size
+        info.compress_size = data.tell()
+        data.seek(0)
+        return info, data
+
+    def __append(self, info: zipfile.ZipInfo, data: IO[bytes]) -> None:
+        # ZipFile can't write member compressed before, we write local header and data as ZipFile.write does and
+        # let ZipFile write central directory on close
+        with data, self.__lock:
+            zip_file = self.__zip_file
+            info.header_offset = zip_file.fp.tell()
+            zip_file.fp.write(info.FileHeader())
+            shutil.copyfileobj(data, zip_file.fp)
+            zip_file.filelist.append(info)
+            zip_file.NameToInfo[info.filename] = info
+            zip_file.start_dir = zip_file.fp.tell()
+            zip_file._didModify = True
+
+
+def zip_dir(path: str, output_file: str, workers: int = 1, store_compressed: bool = False) -> None:
     """
     zip files from path into zip file
     :param path: path to directory
     :param output_file: output zip file
+    :param workers: number of threads compressing files
+    :param store_compressed: if True, pdf, zip and other compressed files are stored without compression
     :return: None
     """
-    with zipfile.ZipFile(output_file, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+    with ZipArchiver(output_file, workers, store_compressed) as archiver:
         for root, dirs, files in os.walk(path):
             for file in files:
-                zip_file.write(os.path.join(root, file))
+                archiver.add_file(os.path.join(root, file))
 
 
 def unzip_file(file_name: str, output_dir: str) -> dict: